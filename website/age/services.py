@@ -1,10 +1,17 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 from age import models
 
 User = get_user_model()
 
+# Attribute on a user instance holding its minimum age for the rest of the request
+MINIMUM_AGE_ATTRIBUTE = "_minimum_registered_age"
+
+# Cache value for users without an AgeRegistration, as None means a cache miss
+NO_MINIMUM_AGE = -1
+
 
 def verify_minimum_age(user: User, minimum_age: int = 18) -> bool:
     """Verify whether someone has a certain minimum age."""
@@ -12,13 +19,52 @@ def verify_minimum_age(user: User, minimum_age: int = 18) -> bool:
     return minimum_registered_age is not None and minimum_registered_age >= minimum_age
 
 
+def minimum_age_cache_key(user_pk):
+    """Get the cache key of the minimum age of a user."""
+    return f"age_minimum_age_{user_pk}"
+
+
+def clear_minimum_age_cache(user_pk, user=None):
+    """
+    Clear the cached minimum age of a user.
+
+    :param user_pk: the primary key of the user
+    :param user: optionally, a user instance on which the minimum age is kept as well
+    """
+    cache.delete(minimum_age_cache_key(user_pk))
+    if user is not None and hasattr(user, MINIMUM_AGE_ATTRIBUTE):
+        delattr(user, MINIMUM_AGE_ATTRIBUTE)
+
+
 def get_minimum_age(user: User):
-    """Get the minimum age of a user."""
-    try:
-        age_registration = models.AgeRegistration.objects.get(user=user)
-    except models.AgeRegistration.DoesNotExist:
-        return None
-    return age_registration.minimum_age
+    """
+    Get the minimum age of a user.
+
+    The minimum age is cached until the AgeRegistration of the user changes, and kept on the user instance, such that
+    the context processor, the fridges and the age views only look it up once per request.
+
+    :param user: the user
+    :return: the registered minimum age of the user, or None if the user has no registered age
+    """
+    if hasattr(user, MINIMUM_AGE_ATTRIBUTE):
+        return getattr(user, MINIMUM_AGE_ATTRIBUTE)
+
+    key = minimum_age_cache_key(user.pk)
+    minimum_age = cache.get(key)
+    if minimum_age is None:
+        minimum_age = (
+            models.AgeRegistration.objects.filter(user=user)
+            .values_list("minimum_age", flat=True)
+            .first()
+        )
+        if minimum_age is None:
+            minimum_age = NO_MINIMUM_AGE
+        cache.set(key, minimum_age, None)
+
+    if minimum_age == NO_MINIMUM_AGE:
+        minimum_age = None
+    setattr(user, MINIMUM_AGE_ATTRIBUTE, minimum_age)
+    return minimum_age
 
 
 def construct_disclose_tree(user: User):
@@ -1,3 +1,4 @@
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from age import models
@@ -5,11 +6,20 @@ from age.models import AgeRegistration
 from age.services import (
     get_proven_attributes_from_proof_tree,
     get_highest_proven_age_from_proven_attributes,
+    clear_minimum_age_cache,
 )
 from yivi.models import Session
 from yivi.signals import attributes_verified
 
 
+@receiver(post_save, sender=AgeRegistration)
+@receiver(post_delete, sender=AgeRegistration)
+def clear_minimum_age_cache_on_change(sender, instance, **kwargs):
+    """Clear the cached minimum age of a user when their AgeRegistration changes."""
+    user = instance.user if AgeRegistration.user.is_cached(instance) else None
+    clear_minimum_age_cache(instance.user_id, user)
+
+
 @receiver(attributes_verified)
 def update_minimum_age_when_proven(sender, **kwargs):
     """Update the minimum age of someone when proven by Yivi."""
@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from age.models import AgeRegistration
+from age.services import get_minimum_age, verify_minimum_age
+
+User = get_user_model()
+
+
+class MinimumAgeTests(TestCase):
+    """Tests for the cached minimum age lookup."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="password")
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def test_minimum_age_cached(self):
+        """The minimum age is only queried once, also for other user instances."""
+        AgeRegistration.objects.create(user=self.user, minimum_age=18)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_minimum_age(self.user), 18)
+            self.assertTrue(verify_minimum_age(self.user))
+        other_instance = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_minimum_age(other_instance), 18)
+
+    def test_missing_registration_cached(self):
+        """A user without a registration is cached as having no minimum age."""
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_minimum_age(self.user))
+        other_instance = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_minimum_age(other_instance))
+            self.assertFalse(verify_minimum_age(self.user))
+
+    def test_cache_cleared_on_change(self):
+        """Saving or deleting a registration clears the cached minimum age."""
+        self.assertIsNone(get_minimum_age(self.user))
+        registration = AgeRegistration.objects.create(user=self.user, minimum_age=18)
+        self.assertEqual(get_minimum_age(self.user), 18)
+
+        registration.minimum_age = 21
+        registration.save()
+        self.assertEqual(get_minimum_age(User.objects.get(pk=self.user.pk)), 21)
+
+        registration.delete()
+        self.assertIsNone(get_minimum_age(self.user))
@@ -6,3 +6,7 @@ class AnnouncementsConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "announcements"
+
+    def ready(self):
+        """Register signals."""
+        from announcements import signals  # noqa
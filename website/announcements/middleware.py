@@ -1,9 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
 from announcements.services import (
     validate_closed_announcements,
     sanitize_closed_announcements,
     encode_closed_announcements,
+    get_app_announcements,
 )
-from django.apps import apps
 
 
 class ClosedAnnouncementsMiddleware:
@@ -14,17 +16,18 @@ class ClosedAnnouncementsMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        """Update the closed announcements' cookie."""
+        """Update the closed announcements' cookie, if it contains announcements that have ended."""
         response = self.get_response(request)
 
-        closed_announcements = validate_closed_announcements(
-            sanitize_closed_announcements(
-                request.COOKIES.get("closed-announcements", None)
-            )
-        )
-        response.set_cookie(
-            "closed-announcements", encode_closed_announcements(closed_announcements)
+        cookie = request.COOKIES.get("closed-announcements", None)
+        if cookie is None:
+            return response
+
+        encoded_closed_announcements = encode_closed_announcements(
+            validate_closed_announcements(sanitize_closed_announcements(cookie))
         )
+        if encoded_closed_announcements != cookie:
+            response.set_cookie("closed-announcements", encoded_closed_announcements)
 
         return response
 
@@ -37,11 +40,11 @@ class AppAnnouncementMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        """Call app announcement function if they exist for gathering all announcements."""
-        announcements = []
-        for app in apps.get_app_configs():
-            if hasattr(app, "announcements") and hasattr(app.announcements, "__call__"):
-                announcements += app.announcements(request)
-        setattr(request, "_app_announcements", announcements)
+        """Add the app announcements to the request, only gathering them when they are used."""
+        setattr(
+            request,
+            "_app_announcements",
+            SimpleLazyObject(lambda: get_app_announcements(request)),
+        )
 
         return self.get_response(request)
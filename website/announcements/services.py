@@ -1,7 +1,17 @@
 import json
 import urllib.parse
+import uuid
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
 
 from announcements.models import Announcement
+from tosti.cache import get_immutable, set_immutable
+
+# Cache key of the version of the announcements, changed whenever an announcement changes
+ANNOUNCEMENTS_VERSION_CACHE_KEY = "announcements_version"
 
 
 def sanitize_closed_announcements(closed_announcements) -> list:
@@ -25,15 +35,78 @@ def sanitize_closed_announcements(closed_announcements) -> list:
     return closed_announcements_list_ints
 
 
-def validate_closed_announcements(closed_announcements) -> list:
-    """Verify the integers in the list such that the ID's that in the database exist only remain."""
-    return list(
-        Announcement.objects.filter(id__in=closed_announcements).values_list(
-            "id", flat=True
+def get_announcements_version():
+    """Get the current version of the announcements."""
+    version = cache.get(ANNOUNCEMENTS_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(ANNOUNCEMENTS_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(ANNOUNCEMENTS_VERSION_CACHE_KEY)
+    return version
+
+
+def bump_announcements_version():
+    """
+    Change the version of the announcements, such that the cached announcements are no longer used.
+
+    A new version is used instead of deleting the cached announcements, so a request that read the announcements
+    before the change cannot write them back to the cache afterwards.
+    """
+    cache.set(ANNOUNCEMENTS_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+def get_current_announcements() -> list:
+    """
+    Get all announcements that have not ended yet, including those that are not visible yet.
+
+    Visibility is checked when reading from this list, so it stays valid until an announcement changes. As the list is
+    cached per version, it never changes once cached and can be kept in the local cache of each process.
+    """
+    key = f"announcements_current_{get_announcements_version()}"
+    announcements = get_immutable(key)
+    if announcements is None:
+        announcements = list(
+            Announcement.objects.filter(Q(until__gt=timezone.now()) | Q(until=None))
         )
-    )
+        set_immutable(key, announcements)
+    return announcements
+
+
+def get_visible_announcements(closed_announcements=()) -> list:
+    """
+    Get the visible announcements without querying the database.
+
+    :param closed_announcements: the ids of the announcements to leave out
+    :return: the visible announcements, in the ordering of the Announcement model
+    """
+    closed_announcements = set(closed_announcements)
+    return [
+        announcement
+        for announcement in get_current_announcements()
+        if announcement.is_visible and announcement.id not in closed_announcements
+    ]
+
+
+def validate_closed_announcements(closed_announcements) -> list:
+    """Verify the integers in the list such that only the ID's of announcements that have not ended remain."""
+    current_announcements = {
+        announcement.id for announcement in get_current_announcements()
+    }
+    return [
+        announcement_id
+        for announcement_id in closed_announcements
+        if announcement_id in current_announcements
+    ]
 
 
 def encode_closed_announcements(closed_announcements: list) -> str:
     """Encode the announcement list in URL encoding."""
     return urllib.parse.quote(json.dumps(closed_announcements))
+
+
+def get_app_announcements(request) -> list:
+    """Gather the announcements of all apps that provide them for a request."""
+    announcements = []
+    for app in apps.get_app_configs():
+        if hasattr(app, "announcements") and hasattr(app.announcements, "__call__"):
+            announcements += app.announcements(request)
+    return announcements
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from announcements.models import Announcement
+from announcements.services import bump_announcements_version
+
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+def on_announcement_changed(sender, instance, **kwargs):
+    """Stop using the cached announcements when an announcement changes."""
+    bump_announcements_version()
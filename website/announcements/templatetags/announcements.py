@@ -1,8 +1,9 @@
 from django import template
-from django.db.models import Q
 
-from announcements.models import Announcement
-from announcements.services import sanitize_closed_announcements
+from announcements.services import (
+    get_visible_announcements,
+    sanitize_closed_announcements,
+)
 
 register = template.Library()
 
@@ -16,9 +17,7 @@ def render_announcements(context):
     )
 
     return {
-        "announcements": Announcement.objects.visible().filter(
-            ~Q(id__in=closed_announcements)
-        ),
+        "announcements": get_visible_announcements(closed_announcements),
         "app_announcements": getattr(request, "_app_announcements", []),
         "closed_announcements": closed_announcements,
     }
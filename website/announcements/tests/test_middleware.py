@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from announcements import models
+from announcements.services import encode_closed_announcements
+
+
+class ClosedAnnouncementsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.announcement = models.Announcement.objects.create(
+            title="Announcement", content="blablabla"
+        )
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def test_cookie_not_set_when_missing(self):
+        response = self.client.get(reverse("index"))
+        self.assertNotIn("closed-announcements", response.cookies)
+
+    def test_cookie_not_rewritten_when_unchanged(self):
+        self.client.cookies["closed-announcements"] = encode_closed_announcements(
+            [self.announcement.id]
+        )
+        response = self.client.get(reverse("index"))
+        self.assertNotIn("closed-announcements", response.cookies)
+
+    def test_cookie_rewritten_when_changed(self):
+        self.client.cookies["closed-announcements"] = encode_closed_announcements(
+            [self.announcement.id, self.announcement.id + 1]
+        )
+        response = self.client.get(reverse("index"))
+        self.assertEqual(
+            encode_closed_announcements([self.announcement.id]),
+            response.cookies["closed-announcements"].value,
+        )
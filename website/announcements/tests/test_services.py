@@ -1,13 +1,21 @@
+from datetime import timedelta
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
 
 from announcements import models
 from announcements.services import (
+    get_visible_announcements,
     sanitize_closed_announcements,
     validate_closed_announcements,
 )
 
 
 class OrderServicesTests(TestCase):
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
     def test_sanitize_closed_announcements_none(self):
         self.assertEqual([], sanitize_closed_announcements(None))
 
@@ -60,3 +68,37 @@ class OrderServicesTests(TestCase):
             {announcement_1.id, announcement_2.id, announcement_3.id},
             set(validate_closed_announcements([1, 2, 3, 4, 5, 6])),
         )
+
+    def test_validate_closed_announcements_ended(self):
+        announcement = models.Announcement.objects.create(
+            title="Announcement", content="blablabla"
+        )
+        ended_announcement = models.Announcement.objects.create(
+            title="Ended announcement",
+            content="blablabla",
+            until=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(
+            [announcement.id],
+            validate_closed_announcements([announcement.id, ended_announcement.id]),
+        )
+
+    def test_visible_announcements_cached(self):
+        """Visible announcements are only queried once, until an announcement changes."""
+        announcement = models.Announcement.objects.create(
+            title="Announcement", content="blablabla"
+        )
+        future_announcement = models.Announcement.objects.create(
+            title="Future announcement",
+            content="blablabla",
+            since=timezone.now() + timedelta(hours=1),
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual([announcement], get_visible_announcements())
+            self.assertEqual([], get_visible_announcements([announcement.id]))
+
+        future_announcement.since = timezone.now()
+        future_announcement.save()
+        self.assertEqual(
+            {announcement, future_announcement}, set(get_visible_announcements())
+        )
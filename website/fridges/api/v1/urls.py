@@ -1,7 +1,15 @@
 from django.urls import path
 
-from fridges.api.v1.views import FridgeUnlockAPIView
+from fridges.api.v1.views import (
+    FridgeAccessListAPIView,
+    FridgeAccessLogsAPIView,
+    FridgeUnlockAPIView,
+    FridgeUserTokenAPIView,
+)
 
 urlpatterns = [
     path("unlock/", FridgeUnlockAPIView.as_view(), name="fridge_unlock"),
+    path("user-token/", FridgeUserTokenAPIView.as_view(), name="fridge_user_token"),
+    path("access-list/", FridgeAccessListAPIView.as_view(), name="fridge_access_list"),
+    path("access-logs/", FridgeAccessLogsAPIView.as_view(), name="fridge_access_logs"),
 ]
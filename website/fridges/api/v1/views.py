@@ -5,9 +5,19 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from fridges.services import user_can_open_fridge, log_access
+from fridges.services import (
+    ACCESS_LIST_VALIDITY,
+    USER_TOKEN_VALIDITY,
+    FridgeAccess,
+    build_access_list,
+    get_user_from_user_token,
+    get_user_token,
+    log_access_events,
+    log_accesses,
+    sign_access_list,
+)
 from tosti.api.openapi import CustomAutoSchema
-from users.services import get_user_from_identification_token
+from tosti.api.permissions import IsAuthenticatedOrTokenHasScopeForMethod
 
 User = get_user_model()
 
@@ -41,9 +51,9 @@ class FridgeUnlockAPIView(ClientProtectedResourceMixin, APIView):
 
     def post(self, request, *args, **kwargs):
         """Process a request to unlock."""
-        fridge_candidates = request.auth.application.fridges.all()
+        fridge_candidates = list(request.auth.application.fridges.all())
 
-        if fridge_candidates.count() == 0:
+        if len(fridge_candidates) == 0:
             return Response(
                 {"detail": "No fridges available"},
                 status=status.HTTP_401_UNAUTHORIZED,
@@ -57,21 +67,159 @@ class FridgeUnlockAPIView(ClientProtectedResourceMixin, APIView):
             )
 
         try:
-            user = get_user_from_identification_token(user_token)
+            user = get_user_from_user_token(str(user_token))
         except User.DoesNotExist, BadSignature, SignatureExpired:
             return Response(
                 {"detail": "Invalid user_token"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        response = []
-        for fridge in fridge_candidates:
-            user_can_open, how_long = user_can_open_fridge(user, fridge)
-            if user_can_open:
-                log_access(user, fridge)
-                response.append({"fridge": fridge.slug, "unlock_for": how_long})
+        unlockable_fridges = FridgeAccess(user, fridge_candidates).unlockable_fridges()
+        log_accesses(user, [fridge for fridge, _ in unlockable_fridges])
+        response = [
+            {"fridge": fridge.slug, "unlock_for": how_long}
+            for fridge, how_long in unlockable_fridges
+        ]
 
         return Response(
             {"user": user.username, "unlock": response},
             status=status.HTTP_200_OK,
         )
+
+
+class FridgeUserTokenAPIView(APIView):
+    """
+    Fridge User Token View.
+
+    Permission required: read
+
+    Use this API view to get the signed token with which the currently logged-in User identifies at a fridge.
+    """
+
+    schema = CustomAutoSchema(
+        response_schema={
+            "type": "object",
+            "properties": {
+                "token": {"type": "string"},
+                "valid_for": {"type": "integer"},
+            },
+        },
+    )
+    permission_classes = [IsAuthenticatedOrTokenHasScopeForMethod]
+    required_scopes_for_method = {
+        "GET": ["read"],
+    }
+
+    def get(self, request, *args, **kwargs):
+        """Get the user token of the currently logged in User."""
+        return Response(
+            {
+                "token": get_user_token(request.user),
+                "valid_for": int(USER_TOKEN_VALIDITY.total_seconds()),
+            }
+        )
+
+
+class FridgeAccessListAPIView(ClientProtectedResourceMixin, APIView):
+    """API view for issuing a signed access list to a fridge controller, so it can decide on unlocks offline."""
+
+    schema = CustomAutoSchema(
+        response_schema={
+            "type": "object",
+            "properties": {
+                "access_list": {"type": "string"},
+                "valid_for": {"type": "integer"},
+            },
+        },
+    )
+
+    def get(self, request, *args, **kwargs):
+        """Get the signed access list for the fridges of the client."""
+        fridges = list(request.auth.application.fridges.all())
+
+        if len(fridges) == 0:
+            return Response(
+                {"detail": "No fridges available"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        return Response(
+            {
+                "access_list": sign_access_list(build_access_list(fridges)),
+                "valid_for": int(ACCESS_LIST_VALIDITY.total_seconds()),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class FridgeAccessLogsAPIView(ClientProtectedResourceMixin, APIView):
+    """API view for uploading a batch of unlocks that a fridge controller decided on offline."""
+
+    MAX_EVENTS = 1000
+
+    schema = CustomAutoSchema(
+        request_schema={
+            "type": "object",
+            "required": ["events"],
+            "properties": {
+                "events": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "user": {
+                                "type": "string",
+                                "description": "The user token shown at the unlock",
+                            },
+                            "fridge": {"type": "string"},
+                            "timestamp": {"type": "string", "format": "date-time"},
+                        },
+                    },
+                },
+            },
+        },
+        response_schema={
+            "type": "object",
+            "properties": {
+                "logged": {"type": "integer"},
+                "rejected": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {"type": "integer"},
+                            "detail": {"type": "string"},
+                        },
+                    },
+                },
+            },
+        },
+    )
+
+    def post(self, request, *args, **kwargs):
+        """Log a batch of unlocks."""
+        fridges = list(request.auth.application.fridges.all())
+
+        if len(fridges) == 0:
+            return Response(
+                {"detail": "No fridges available"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        events = request.data.get("events", None)
+        if not isinstance(events, list):
+            return Response(
+                {"detail": "Missing events"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(events) > self.MAX_EVENTS:
+            return Response(
+                {"detail": f"At most {self.MAX_EVENTS} events can be uploaded at once"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        logged, rejected = log_access_events(fridges, events)
+        return Response(
+            {"logged": logged, "rejected": rejected},
+            status=status.HTTP_200_OK,
+        )
@@ -8,6 +8,18 @@ class FridgesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "fridges"
 
+    def ready(self):
+        """Register signals."""
+        from fridges import signals  # noqa
+
+    def blacklist(self, user):
+        """The primary keys of the fridges a user is blacklisted from, for tosti.blacklist."""
+        from fridges.models import BlacklistEntry
+
+        return frozenset(
+            BlacklistEntry.objects.filter(user=user).values_list("fridge_id", flat=True)
+        )
+
     def menu_items(self, _):
         """Register menu items."""
         return [
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from fridges.services import get_access_list_public_key
+
+
+class Command(BaseCommand):
+    """Print the public key with which fridge controllers verify access lists and user tokens."""
+
+    help = "Print the public key with which fridge controllers verify access lists and user tokens."
+
+    def handle(self, *args, **options):
+        """Print the public key in PEM format."""
+        self.stdout.write(get_access_list_public_key(), ending="")
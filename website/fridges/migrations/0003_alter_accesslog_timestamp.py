@@ -0,0 +1,19 @@
+# Generated by Django 6.0.7 on 2026-10-19 11:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fridges", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="accesslog",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
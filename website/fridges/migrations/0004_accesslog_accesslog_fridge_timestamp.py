@@ -0,0 +1,21 @@
+# Generated by Django 6.0.7 on 2026-10-19 11:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fridges", "0003_alter_accesslog_timestamp"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="accesslog",
+            index=models.Index(
+                fields=["fridge", "timestamp"], name="accesslog_fridge_timestamp"
+            ),
+        ),
+    ]
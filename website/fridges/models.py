@@ -1,9 +1,13 @@
 from datetime import timedelta
 
+from django.core.cache import cache
 from django.db import models
 from django.utils import timezone
+from django.utils.functional import cached_property
 from oauth2_provider.models import Application
 
+from fridges.schedule import FridgeSchedule
+
 
 class Fridge(models.Model):
     """A fridge."""
@@ -59,45 +63,65 @@ class Fridge(models.Model):
         except AccessLog.DoesNotExist:
             return None
 
-    @property
-    def current_opening_hours(self):
-        """Get the current opening hours."""
-        current_time = timezone.now().astimezone()
-        weekday = current_time.weekday()
-        opening_hours = self.generalopeninghours_set.filter(
-            weekday=weekday,
-            start_time__lte=current_time.time(),
-            end_time__gte=current_time.time(),
-        )
-        return opening_hours
+    @staticmethod
+    def schedule_cache_key(fridge_pk):
+        """Get the cache key for the schedule of a fridge."""
+        return f"fridge_schedule_{fridge_pk}"
+
+    @classmethod
+    def clear_schedule_cache(cls, fridge_pk):
+        """Clear the cached schedule of a fridge."""
+        cache.delete(cls.schedule_cache_key(fridge_pk))
+
+    @classmethod
+    def get_schedules(cls, fridges):
+        """
+        Get the schedules of multiple fridges.
+
+        Schedules are served from the cache. Missing schedules are compiled from the opening hours of all missing
+        fridges at once, and cached until the opening hours change (see fridges.signals).
+
+        :param fridges: a list of fridges
+        :return: a dict mapping the primary key of every fridge to its FridgeSchedule
+        """
+        keys = {cls.schedule_cache_key(fridge.pk): fridge.pk for fridge in fridges}
+        schedules = {
+            keys[key]: schedule for key, schedule in cache.get_many(keys).items()
+        }
+
+        missing = [fridge.pk for fridge in fridges if fridge.pk not in schedules]
+        if missing:
+            opening_hours = {pk: [] for pk in missing}
+            for hours in GeneralOpeningHours.objects.filter(
+                fridge__in=missing
+            ).prefetch_related("restrict_to_groups"):
+                opening_hours[hours.fridge_id].append(hours)
+            compiled = {
+                pk: FridgeSchedule.from_opening_hours(hours)
+                for pk, hours in opening_hours.items()
+            }
+            cache.set_many(
+                {cls.schedule_cache_key(pk): x for pk, x in compiled.items()}, None
+            )
+            schedules.update(compiled)
+
+        for fridge in fridges:
+            fridge.__dict__["schedule"] = schedules[fridge.pk]
+        return schedules
+
+    @cached_property
+    def schedule(self):
+        """Get the FridgeSchedule of this fridge."""
+        return Fridge.get_schedules([self])[self.pk]
 
     @property
     def can_be_opened(self):
         """Whether the Fridge can be opened."""
-        return self.current_opening_hours.filter(
-            restrict_to_groups__isnull=True,
-        ).exists()
+        return self.schedule.is_open(timezone.now().astimezone())
 
     def opens_today_at(self):
         """Return the time the fridge opens today, or None if it doesn't open today."""
-        current_time = timezone.now().astimezone()
-
-        if self.can_be_opened:
-            return current_time.time()
-
-        next_opening_times_today = (
-            self.generalopeninghours_set.filter(
-                weekday=current_time.weekday(),
-                start_time__gte=current_time.time(),
-                restrict_to_groups__isnull=True,
-            )
-            .order_by("start_time")
-            .first()
-        )
-
-        if next_opening_times_today:
-            return next_opening_times_today.start_time
-        return None
+        return self.schedule.opens_today_at(timezone.now().astimezone())
 
     class Meta:
         """Meta class."""
@@ -171,7 +195,7 @@ class AccessLog(models.Model):
 
     user = models.ForeignKey("users.User", on_delete=models.CASCADE)
     fridge = models.ForeignKey(Fridge, on_delete=models.CASCADE)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         """Convert this object to string."""
@@ -184,3 +208,8 @@ class AccessLog(models.Model):
         verbose_name_plural = "access logs"
         ordering = ["-timestamp"]
         get_latest_by = "timestamp"
+        indexes = [
+            models.Index(
+                fields=["fridge", "timestamp"], name="accesslog_fridge_timestamp"
+            )
+        ]
@@ -0,0 +1,109 @@
+"""
+Compiled weekly opening hours of fridges.
+
+A FridgeSchedule holds all GeneralOpeningHours of a fridge as a table of intervals per weekday, so checking whether a
+fridge is open does not require database queries. Schedules are cached per fridge (see Fridge.get_schedules).
+"""
+
+from collections import namedtuple
+
+OpeningInterval = namedtuple("OpeningInterval", ["start_time", "end_time", "groups"])
+
+
+class FridgeSchedule:
+    """The weekly opening hours of a fridge."""
+
+    def __init__(self, intervals_per_weekday):
+        """
+        Initialize a schedule.
+
+        :param intervals_per_weekday: a tuple with for every weekday (Monday is 0) a tuple of OpeningIntervals, sorted
+         by start time
+        """
+        self.intervals_per_weekday = intervals_per_weekday
+
+    @classmethod
+    def from_opening_hours(cls, opening_hours):
+        """
+        Compile a schedule from GeneralOpeningHours.
+
+        :param opening_hours: an iterable of GeneralOpeningHours with their restrict_to_groups prefetched
+        :return: a FridgeSchedule
+        """
+        weekdays = [[] for _ in range(7)]
+        for hours in opening_hours:
+            weekdays[hours.weekday].append(
+                OpeningInterval(
+                    hours.start_time,
+                    hours.end_time,
+                    frozenset(group.pk for group in hours.restrict_to_groups.all()),
+                )
+            )
+        return cls(
+            tuple(
+                tuple(sorted(intervals, key=lambda x: (x.start_time, x.end_time)))
+                for intervals in weekdays
+            )
+        )
+
+    def intervals_at(self, moment):
+        """
+        Get the opening intervals that contain a moment.
+
+        :param moment: a datetime in local time
+        :return: a list of OpeningIntervals
+        """
+        current_time = moment.time()
+        return [
+            interval
+            for interval in self.intervals_per_weekday[moment.weekday()]
+            if interval.start_time <= current_time <= interval.end_time
+        ]
+
+    def is_open(self, moment, groups=frozenset()):
+        """
+        Check whether the fridge is open at a moment.
+
+        :param moment: a datetime in local time
+        :param groups: the primary keys of the groups for which intervals restricted to groups also count
+        :return: True if an interval that is not restricted, or restricted to one of groups, contains moment
+        """
+        return any(
+            not interval.groups or interval.groups & groups
+            for interval in self.intervals_at(moment)
+        )
+
+    def opens_today_at(self, moment):
+        """
+        Get the time at which the fridge opens for everyone on the day of a moment.
+
+        :param moment: a datetime in local time
+        :return: the time of moment if the fridge is open, the start of the next unrestricted interval on that day, or
+         None if the fridge does not open anymore on that day
+        """
+        if self.is_open(moment):
+            return moment.time()
+
+        current_time = moment.time()
+        for interval in self.intervals_per_weekday[moment.weekday()]:
+            if not interval.groups and interval.start_time >= current_time:
+                return interval.start_time
+        return None
+
+    def export(self):
+        """
+        Export the schedule, for example to make decisions on a fridge lock without contacting the server.
+
+        :return: a list of dicts with the weekday (Monday is 0), start and end time (ISO 8601) and the primary keys of
+         the groups an interval is restricted to (empty if not restricted)
+        """
+        return [
+            {
+                "weekday": weekday,
+                "start_time": interval.start_time.isoformat(),
+                "end_time": interval.end_time.isoformat(),
+                "restrict_to_groups": sorted(interval.groups),
+            }
+            for weekday, intervals in enumerate(self.intervals_per_weekday)
+            for interval in intervals
+        ]
@@ -1,61 +1,535 @@
+import base64
+import functools
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
 from constance import config
-from django.db.models import Q
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signing import BadSignature, SignatureExpired
 from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from django.utils.dateparse import parse_datetime
+from guardian.core import ObjectPermissionChecker
+from guardian.shortcuts import get_users_with_perms
+from kombu.exceptions import OperationalError
 
+from age.models import AgeRegistration
 from age.services import verify_minimum_age
-from fridges.models import AccessLog
+from fridges.models import AccessLog, BlacklistEntry, Fridge
+from fridges.tasks import write_access_logs
+from tosti.blacklist import get_blacklist
 from tosti.metrics import emit as emit_metric
 
+User = get_user_model()
 
-def user_is_blacklisted(user, fridge):
-    """Return whether a user is blacklisted from opening a fridge."""
-    if not hasattr(fridge, "blacklist"):
-        return False
-    return fridge.blacklist.filter(user=user).exists()
+# How long an access list issued to a fridge controller is valid.
+ACCESS_LIST_VALIDITY = timedelta(hours=12)
 
+# How long a user token, with which a user identifies at a fridge controller, is valid.
+USER_TOKEN_VALIDITY = timedelta(seconds=20)
 
-def user_can_open_fridge(user, fridge):
-    """Return whether a user can open a fridge, and for how long."""
-    if user.has_perm("fridges.open_always", fridge):
-        return True, fridge.unlock_for_how_long
+# How long it is cached that a fridge was not opened yet on a day.
+NOT_OPENED_CACHE_TIMEOUT = 60
 
-    if not fridge.is_active:
-        return False, None
 
-    if user_is_blacklisted(user, fridge):
+def _opened_cache_key(fridge_pk, date):
+    """Get the cache key for whether a fridge was opened on a date."""
+    return f"fridge_opened_{fridge_pk}_{date.isoformat()}"
+
+
+def _seconds_until_end_of_day(date):
+    """Get the number of seconds until a date ends in the current time zone."""
+    end_of_day = timezone.make_aware(
+        datetime.combine(date + timedelta(days=1), time.min)
+    )
+    return max(int((end_of_day - timezone.now()).total_seconds()), 1)
+
+
+def mark_fridges_opened(fridge_pks, date):
+    """Remember that fridges were opened on a date."""
+    cache.set_many(
+        {_opened_cache_key(pk, date): True for pk in fridge_pks},
+        _seconds_until_end_of_day(date),
+    )
+
+
+def fridges_opened_on(fridges, date):
+    """
+    Get which fridges were opened on a date.
+
+    This is remembered in the cache when a fridge is opened. Fridges not in the cache are looked up with a single query
+    over the timestamp range of the day, which uses the (fridge, timestamp) index of AccessLog.
+
+    :param fridges: a list of fridges
+    :param date: the date in the current time zone
+    :return: a set with the primary keys of the fridges that were opened
+    """
+    keys = {_opened_cache_key(fridge.pk, date): fridge.pk for fridge in fridges}
+    cached = {keys[key]: opened for key, opened in cache.get_many(keys).items()}
+    opened = {pk for pk, fridge_opened in cached.items() if fridge_opened}
+
+    missing = [fridge.pk for fridge in fridges if fridge.pk not in cached]
+    if missing:
+        start_of_day = timezone.make_aware(datetime.combine(date, time.min))
+        opened_missing = set(
+            AccessLog.objects.filter(
+                fridge__in=missing,
+                timestamp__gte=start_of_day,
+                timestamp__lt=start_of_day + timedelta(days=1),
+            )
+            .values_list("fridge_id", flat=True)
+            .distinct()
+        )
+        mark_fridges_opened(opened_missing, date)
+        cache.set_many(
+            {
+                _opened_cache_key(pk, date): False
+                for pk in missing
+                if pk not in opened_missing
+            },
+            NOT_OPENED_CACHE_TIMEOUT,
+        )
+        opened |= opened_missing
+    return opened
+
+
+class FridgeAccess:
+    """
+    Decide which fridges a user can open.
+
+    All data needed for the decision (permissions, blacklist entries, age, groups and daily openings) is loaded once
+    for all fridges, and opening hours come from the cached fridge schedules. Deciding for any number of fridges
+    therefore takes a fixed number of queries.
+    """
+
+    def __init__(self, user, fridges):
+        """
+        Load the data to decide on for a user and a list of fridges.
+
+        :param user: the user
+        :param fridges: the fridges to decide on
+        """
+        self.user = user
+        self.fridges = list(fridges)
+        current_time = timezone.now().astimezone()
+
+        self.permission_checker = ObjectPermissionChecker(user)
+        self.permission_checker.prefetch_perms(self.fridges)
+        self.blacklisted_fridges = get_blacklist(user).get("fridges", frozenset())
+        self.groups = set(user.groups.values_list("pk", flat=True))
+
+        self.opening_intervals = {
+            pk: schedule.intervals_at(current_time)
+            for pk, schedule in Fridge.get_schedules(self.fridges).items()
+        }
+
+        self.require_daily_opening = config.FRIDGE_REQUIRE_DAILY_OPENING
+        self.opened_today = set()
+        if self.require_daily_opening:
+            self.opened_today = fridges_opened_on(self.fridges, timezone.localdate())
+
+    def can_open(self, fridge):
+        """Return whether the user can open a fridge, and for how long."""
+        if self.permission_checker.has_perm("open_always", fridge):
+            return True, fridge.unlock_for_how_long
+
+        if not fridge.is_active:
+            return False, None
+
+        if fridge.pk in self.blacklisted_fridges:
+            return False, None
+
+        if fridge.minimum_age is not None and not verify_minimum_age(
+            self.user, fridge.minimum_age
+        ):
+            emit_metric(
+                "fridge_age_check_failed",
+                fridge=str(fridge),
+                minimum_age=fridge.minimum_age,
+            )
+            return False, None
+
+        opening_intervals = self.opening_intervals[fridge.pk]
+        if not opening_intervals:
+            return False, None
+
+        if self.require_daily_opening and fridge.pk not in self.opened_today:
+            # This requires a daily opening by a user with the open_always permission.
+            return False, None
+
+        for interval in opening_intervals:
+            if not interval.groups or interval.groups & self.groups:
+                return True, fridge.unlock_for_how_long
+
         return False, None
 
-    if fridge.minimum_age is not None and not verify_minimum_age(
-        user, fridge.minimum_age
+    def unlockable_fridges(self):
+        """Return a list of (fridge, how long) tuples for the fridges the user can open."""
+        decisions = []
+        for fridge in self.fridges:
+            user_can_open, how_long = self.can_open(fridge)
+            if user_can_open:
+                decisions.append((fridge, how_long))
+        return decisions
+
+
+def get_user_reference(user_pk):
+    """
+    Get the reference with which fridge controllers know a user.
+
+    The reference is an HMAC of the primary key of the user with the secret key of the server, so access lists do not
+    contain usernames and a controller cannot tell to which user a reference belongs.
+
+    :param user_pk: the primary key of the user
+    """
+    return salted_hmac("fridges.user_reference", str(user_pk)).hexdigest()
+
+
+def build_access_list(fridges):
+    """
+    Build an access list with which a fridge controller can decide on unlocks without contacting the server.
+
+    The list contains the fridges with their schedules (in the local time zone), and every user that is relevant for a
+    decision: users with a registered age of at least the lowest minimum age of the fridges, members of groups that
+    opening hours are restricted to, users that can always open a fridge and blacklisted users. Users that are not on
+    the list can only open fridges without a minimum age. Users are listed by their reference (see get_user_reference),
+    which the controller gets from the signed user token a user shows, so the list does not contain usernames.
+
+    :param fridges: the fridges of the controller
+    :return: a dict that can be serialized to JSON
+    """
+    fridges = list(fridges)
+    now = timezone.now()
+    schedules = Fridge.get_schedules(fridges)
+
+    users = defaultdict(
+        lambda: {
+            "minimum_age": None,
+            "groups": [],
+            "open_always": [],
+            "blacklisted": [],
+        }
+    )
+    minimum_ages = [x.minimum_age for x in fridges if x.minimum_age is not None]
+    if minimum_ages:
+        for user_pk, minimum_age in AgeRegistration.objects.filter(
+            minimum_age__gte=min(minimum_ages)
+        ).values_list("user_id", "minimum_age"):
+            users[get_user_reference(user_pk)]["minimum_age"] = minimum_age
+
+    groups = {
+        group
+        for schedule in schedules.values()
+        for intervals in schedule.intervals_per_weekday
+        for interval in intervals
+        for group in interval.groups
+    }
+    for user_pk, group in User.groups.through.objects.filter(
+        group_id__in=groups
+    ).values_list("user_id", "group_id"):
+        users[get_user_reference(user_pk)]["groups"].append(group)
+
+    for fridge in fridges:
+        for user_pk in get_users_with_perms(
+            fridge,
+            with_superusers=True,
+            with_group_users=True,
+            only_with_perms_in=["open_always"],
+        ).values_list("pk", flat=True):
+            users[get_user_reference(user_pk)]["open_always"].append(fridge.slug)
+
+    for user_pk, slug in BlacklistEntry.objects.filter(fridge__in=fridges).values_list(
+        "user_id", "fridge__slug"
     ):
-        emit_metric(
-            "fridge_age_check_failed",
-            fridge=str(fridge),
-            minimum_age=fridge.minimum_age,
+        users[get_user_reference(user_pk)]["blacklisted"].append(slug)
+
+    return {
+        "type": "access_list",
+        "issued_at": now.isoformat(),
+        "expires_at": (now + ACCESS_LIST_VALIDITY).isoformat(),
+        "timezone": settings.TIME_ZONE,
+        "require_daily_opening": config.FRIDGE_REQUIRE_DAILY_OPENING,
+        "fridges": [
+            {
+                "slug": fridge.slug,
+                "is_active": fridge.is_active,
+                "minimum_age": fridge.minimum_age,
+                "unlock_for": int(fridge.unlock_for_how_long.total_seconds()),
+                "schedule": schedules[fridge.pk].export(),
+            }
+            for fridge in fridges
+        ],
+        "users": dict(users),
+    }
+
+
+@functools.lru_cache
+def _load_access_list_private_key(path):
+    """Load the Ed25519 private key with which access lists are signed from a PEM file."""
+    with open(path, "rb") as key_file:
+        private_key = serialization.load_pem_private_key(key_file.read(), password=None)
+    if not isinstance(private_key, Ed25519PrivateKey):
+        raise ImproperlyConfigured(
+            "FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE must contain an Ed25519 private key"
         )
-        return False, None
+    return private_key
 
-    opening_hours = fridge.current_opening_hours
-    if not opening_hours.exists():
-        return False, None
 
-    if config.FRIDGE_REQUIRE_DAILY_OPENING:
-        # This requires a daily opening by a user with the open_always permission.
-        already_opened_today = AccessLog.objects.filter(
-            fridge=fridge, timestamp__date=timezone.now().date()
-        ).exists()
-        if not already_opened_today:
-            return False, None
+def get_access_list_private_key():
+    """
+    Get the private key with which access lists are signed.
+
+    :raises ImproperlyConfigured: if FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE is not set or does not contain an Ed25519 key
+    """
+    if not settings.FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE:
+        raise ImproperlyConfigured(
+            "FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE must be set to sign fridge access lists"
+        )
+    return _load_access_list_private_key(settings.FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE)
+
+
+def get_access_list_public_key():
+    """Get the public key with which fridge controllers verify access lists, in PEM format."""
+    return (
+        get_access_list_private_key()
+        .public_key()
+        .public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode()
+    )
+
+
+def _sign(data):
+    """
+    Sign data with the Ed25519 private key of the server.
+
+    The signed data is the base64url encoded JSON of the data and the base64url encoded signature over that encoded
+    JSON, separated by a dot. Fridge controllers only need the public key to verify it, so a controller cannot sign
+    data itself.
+    """
+    payload = base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode())
+    signature = base64.urlsafe_b64encode(get_access_list_private_key().sign(payload))
+    return (payload + b"." + signature).decode()
+
+
+def _unsign(signed_data, data_type, public_key=None):
+    """
+    Verify and load data signed with _sign.
+
+    :param signed_data: the signed data
+    :param data_type: the type of the data, so data signed for another purpose is not accepted
+    :param public_key: the Ed25519 public key to verify the signature with, defaults to that of the server
+    :raises BadSignature: if the signature is invalid or the data is of another type
+    """
+    if public_key is None:
+        public_key = get_access_list_private_key().public_key()
+    try:
+        payload, signature = signed_data.encode().rsplit(b".", 1)
+        public_key.verify(base64.urlsafe_b64decode(signature), payload)
+        data = json.loads(base64.urlsafe_b64decode(payload))
+    except ValueError, TypeError, InvalidSignature:
+        raise BadSignature("Invalid signature")
+    if not isinstance(data, dict) or data.get("type") != data_type:
+        raise BadSignature(f"Not a signed {data_type}")
+    return data
+
+
+def sign_access_list(access_list):
+    """Sign an access list with the Ed25519 private key of the server, see _sign."""
+    return _sign(access_list)
+
+
+def load_access_list(signed_access_list, public_key=None):
+    """
+    Verify and load a signed access list.
+
+    :param signed_access_list: the signed access list
+    :param public_key: the Ed25519 public key to verify the signature with, defaults to that of the server
+    :raises BadSignature: if the signature is invalid
+    :raises SignatureExpired: if the access list has expired
+    """
+    access_list = _unsign(signed_access_list, "access_list", public_key)
+    try:
+        expires_at = parse_datetime(access_list["expires_at"])
+    except ValueError, TypeError, KeyError:
+        raise BadSignature("Invalid access list")
+    if expires_at is None or expires_at <= timezone.now():
+        raise SignatureExpired("Access list expired")
+    return access_list
+
+
+def get_user_token(user):
+    """
+    Get a signed token with which a user identifies at a fridge controller.
+
+    The token contains the reference of the user (see get_user_reference) and is signed with the same key as access
+    lists, so a controller can verify it with the public key and look the user up in its access list without contacting
+    the server. It is only valid for USER_TOKEN_VALIDITY, and is shown to the controller as a QR code.
+
+    :param user: the user
+    :return: the signed user token
+    """
+    now = timezone.now().replace(microsecond=0)
+    return _sign(
+        {
+            "type": "user_token",
+            "user": get_user_reference(user.pk),
+            "user_id": user.pk,
+            "issued_at": now.isoformat(),
+            "expires_at": (now + USER_TOKEN_VALIDITY).isoformat(),
+        }
+    )
+
+
+def load_user_token(user_token, public_key=None, at=None):
+    """
+    Verify and load a signed user token.
+
+    :param user_token: the signed user token
+    :param public_key: the Ed25519 public key to verify the signature with, defaults to that of the server
+    :param at: the time at which the token must be valid, defaults to now
+    :raises BadSignature: if the signature is invalid, or the token was issued after that time
+    :raises SignatureExpired: if the token has expired at that time
+    """
+    token = _unsign(user_token, "user_token", public_key)
+    try:
+        issued_at = parse_datetime(token["issued_at"])
+        expires_at = parse_datetime(token["expires_at"])
+    except ValueError, TypeError, KeyError:
+        raise BadSignature("Invalid user token")
+    if at is None:
+        at = timezone.now()
+    if issued_at is None or expires_at is None or at < issued_at:
+        raise BadSignature("Invalid user token")
+    if expires_at <= at:
+        raise SignatureExpired("User token expired")
+    return token
+
+
+def get_user_from_user_token(user_token):
+    """
+    Get the user from a signed user token.
+
+    :param user_token: the signed user token
+    :return: the user
+    :raises BadSignature: if the token is invalid
+    :raises SignatureExpired: if the token has expired
+    :raises User.DoesNotExist: if the user does not exist
+    """
+    return User.objects.get(pk=load_user_token(user_token)["user_id"])
+
+
+def log_access_events(fridges, events):
+    """
+    Log unlock events uploaded in a batch by a fridge controller.
+
+    Every event carries the user token that the user showed, which must have been valid at the time of the unlock, so
+    a controller cannot log unlocks for users that did not identify. Events that were already logged are skipped, so a
+    controller can safely upload events again.
+
+    :param fridges: the fridges of the controller
+    :param events: a list of dicts with the user token ("user"), the fridge slug ("fridge") and the ISO 8601 time
+     ("timestamp") of an unlock
+    :return: a tuple with the number of events logged and a list of dicts with the index and reason ("detail") of
+     every rejected event
+    """
+    fridges_by_slug = {fridge.slug: fridge for fridge in fridges}
+    events = [event if isinstance(event, dict) else {} for event in events]
+    # Controllers only decide on unlocks with a valid access list, so events cannot be older than that.
+    now = timezone.now()
+    earliest = now - ACCESS_LIST_VALIDITY
+
+    access_logs = {}
+    rejected = []
+    for index, event in enumerate(events):
+        fridge = fridges_by_slug.get(str(event.get("fridge")))
+        try:
+            timestamp = parse_datetime(str(event.get("timestamp")))
+        except ValueError:
+            timestamp = None
+        if timestamp is not None and timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+
+        if fridge is None:
+            rejected.append({"index": index, "detail": "Unknown fridge"})
+        elif timestamp is None:
+            rejected.append({"index": index, "detail": "Invalid timestamp"})
+        elif not earliest <= timestamp <= now:
+            rejected.append({"index": index, "detail": "Timestamp out of range"})
+        else:
+            try:
+                user_token = load_user_token(str(event.get("user")), at=timestamp)
+            except BadSignature:
+                rejected.append({"index": index, "detail": "Invalid user token"})
+                continue
+            access_logs[index] = AccessLog(
+                user_id=user_token["user_id"], fridge=fridge, timestamp=timestamp
+            )
+
+    users = set(
+        User.objects.filter(
+            pk__in={x.user_id for x in access_logs.values()}
+        ).values_list("pk", flat=True)
+    )
+    for index in [index for index, x in access_logs.items() if x.user_id not in users]:
+        rejected.append({"index": index, "detail": "Unknown user"})
+        del access_logs[index]
+    rejected.sort(key=lambda x: x["index"])
+    access_logs = list(access_logs.values())
+
+    logged = set(
+        AccessLog.objects.filter(
+            fridge__in=fridges_by_slug.values(),
+            timestamp__in={x.timestamp for x in access_logs},
+        ).values_list("user_id", "fridge_id", "timestamp")
+    )
+    new_access_logs = []
+    for access_log in access_logs:
+        key = (access_log.user_id, access_log.fridge_id, access_log.timestamp)
+        if key not in logged:
+            logged.add(key)
+            new_access_logs.append(access_log)
+
+    AccessLog.objects.bulk_create(new_access_logs)
+    for access_log in new_access_logs:
+        mark_fridges_opened(
+            [access_log.fridge_id], timezone.localdate(access_log.timestamp)
+        )
+        emit_metric("fridge_opened", fridge=str(access_log.fridge))
+    return len(new_access_logs), rejected
+
+
+def log_accesses(user, fridges):
+    """
+    Log a user opening fridges.
 
-    if opening_hours.filter(
-        Q(restrict_to_groups__in=user.groups.all()) | Q(restrict_to_groups__isnull=True)
-    ).exists():
-        return True, fridge.unlock_for_how_long
+    The access logs are written in a single batch by a Celery task, outside of the request. The fridges are marked as
+    opened today right away.
 
-    return False, None
+    :param user: the user
+    :param fridges: a list of fridges
+    """
+    if not fridges:
+        return
 
+    now = timezone.now()
+    mark_fridges_opened([fridge.pk for fridge in fridges], timezone.localdate(now))
+    for fridge in fridges:
+        emit_metric("fridge_opened", fridge=str(fridge))
 
-def log_access(user, fridge):
-    """Log a user opening a fridge."""
-    AccessLog.objects.create(user=user, fridge=fridge)
-    emit_metric("fridge_opened", fridge=str(fridge))
+    accesses = [(user.pk, fridge.pk, now.isoformat()) for fridge in fridges]
+    try:
+        write_access_logs.delay(accesses)
+    except OperationalError as e:
+        logging.warning("Failed to queue access logs, writing them directly: %s", e)
+        write_access_logs(accesses)
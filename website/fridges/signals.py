@@ -0,0 +1,75 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from fridges.models import BlacklistEntry, Fridge, GeneralOpeningHours
+from tosti.blacklist import (
+    clear_blacklist_cache_of_entry,
+    clear_blacklist_cache_of_moved_entry,
+)
+
+
+@receiver(post_save, sender=Fridge)
+@receiver(post_delete, sender=Fridge)
+def on_fridge_changed(sender, instance, **kwargs):
+    """Clear the cached schedule of a fridge."""
+    Fridge.clear_schedule_cache(instance.pk)
+
+
+@receiver(post_save, sender=GeneralOpeningHours)
+@receiver(post_delete, sender=GeneralOpeningHours)
+def on_opening_hours_changed(sender, instance, **kwargs):
+    """Clear the cached schedule of the fridge of changed opening hours."""
+    Fridge.clear_schedule_cache(instance.fridge_id)
+
+
+@receiver(m2m_changed, sender=GeneralOpeningHours.restrict_to_groups.through)
+def on_opening_hours_groups_changed(sender, instance, reverse, pk_set, **kwargs):
+    """Clear the cached schedules of fridges of which the group restrictions of opening hours changed."""
+    if not reverse:
+        Fridge.clear_schedule_cache(instance.fridge_id)
+        return
+
+    # The opening hours of a group changed, of which pk_set is None when they are all cleared.
+    opening_hours = GeneralOpeningHours.objects.all()
+    if pk_set is not None:
+        opening_hours = opening_hours.filter(pk__in=pk_set)
+    for fridge_pk in opening_hours.values_list("fridge_id", flat=True).distinct():
+        Fridge.clear_schedule_cache(fridge_pk)
+
+
+@receiver(pre_delete, sender=Group)
+def on_group_deleting(sender, instance, **kwargs):
+    """Remember the fridges with opening hours restricted to a group before its restrictions are deleted."""
+    instance._restricted_fridge_pks = list(
+        GeneralOpeningHours.objects.filter(restrict_to_groups=instance)
+        .values_list("fridge_id", flat=True)
+        .distinct()
+    )
+
+
+@receiver(post_delete, sender=Group)
+def on_group_deleted(sender, instance, **kwargs):
+    """Clear the cached schedules of fridges with opening hours restricted to a deleted group."""
+    # Deleting a group does not send m2m_changed for the group restrictions of opening hours.
+    for fridge_pk in getattr(instance, "_restricted_fridge_pks", []):
+        Fridge.clear_schedule_cache(fridge_pk)
+
+
+@receiver(post_save, sender=BlacklistEntry)
+@receiver(post_delete, sender=BlacklistEntry)
+def on_blacklist_changed(sender, instance, **kwargs):
+    """Clear the cached blacklist of the user of a changed blacklist entry."""
+    clear_blacklist_cache_of_entry(instance)
+
+
+@receiver(pre_save, sender=BlacklistEntry)
+def on_blacklist_moving(sender, instance, **kwargs):
+    """Clear the cached blacklist of the previous user of a blacklist entry that moves to another user."""
+    clear_blacklist_cache_of_moved_entry(instance)
@@ -0,0 +1,21 @@
+from celery import shared_task
+from django.utils.dateparse import parse_datetime
+
+from fridges.models import AccessLog
+
+
+@shared_task
+def write_access_logs(accesses):
+    """
+    Write a batch of access logs.
+
+    :param accesses: a list of (user pk, fridge pk, ISO 8601 timestamp) tuples
+    """
+    AccessLog.objects.bulk_create(
+        [
+            AccessLog(
+                user_id=user, fridge_id=fridge, timestamp=parse_datetime(timestamp)
+            )
+            for user, fridge, timestamp in accesses
+        ]
+    )
@@ -0,0 +1,231 @@
+import os
+import tempfile
+from datetime import time, timedelta
+from unittest.mock import patch
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.signing import TimestampSigner
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+from oauth2_provider.models import AccessToken, Application
+from rest_framework.test import APITestCase
+
+from age.models import AgeRegistration
+from fridges.api.v1.views import FridgeAccessLogsAPIView
+from fridges.models import AccessLog, Fridge, GeneralOpeningHours
+from fridges.services import (
+    get_user_reference,
+    get_user_token,
+    load_access_list,
+    load_user_token,
+)
+
+User = get_user_model()
+
+
+class FridgeAPITestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.application = Application.objects.create(
+            name="Fridge lock",
+            client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_CLIENT_CREDENTIALS,
+        )
+        cls.fridge = Fridge.objects.create(
+            name="Fridge", slug="fridge", oauth_client=cls.application
+        )
+        cls.token = AccessToken.objects.create(
+            application=cls.application,
+            token="fridge-lock-token",
+            expires=timezone.now() + timedelta(days=1),
+            scope="read write",
+        )
+        other_application = Application.objects.create(
+            name="Other",
+            client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_CLIENT_CREDENTIALS,
+        )
+        cls.other_token = AccessToken.objects.create(
+            application=other_application,
+            token="other-token",
+            expires=timezone.now() + timedelta(days=1),
+            scope="read write",
+        )
+        cls.adult = User.objects.create_user(username="adult")
+        AgeRegistration.objects.create(user=cls.adult, minimum_age=18)
+        cls.minor = User.objects.create_user(username="minor")
+        AgeRegistration.objects.create(user=cls.minor, minimum_age=16)
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        key_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(key_dir.cleanup)
+        self.private_key = Ed25519PrivateKey.generate()
+        key_file = os.path.join(key_dir.name, "access_list.key")
+        with open(key_file, "wb") as f:
+            f.write(
+                self.private_key.private_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PrivateFormat.PKCS8,
+                    encryption_algorithm=serialization.NoEncryption(),
+                )
+            )
+        settings_override = override_settings(
+            FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE=key_file
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _authenticate(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token.token}")
+
+
+class FridgeAccessListAPITests(FridgeAPITestCase):
+    def test_access_list_unauthenticated(self):
+        """Access lists are only issued to authenticated clients."""
+        response = self.client.get(reverse("v1:fridge_access_list"))
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_access_list_without_fridges(self):
+        """Clients without fridges do not get an access list."""
+        self._authenticate(self.other_token)
+        response = self.client.get(reverse("v1:fridge_access_list"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_access_list(self):
+        """The access list can be verified with the public key of the server."""
+        self._authenticate(self.token)
+        response = self.client.get(reverse("v1:fridge_access_list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["valid_for"], 12 * 60 * 60)
+        access_list = load_access_list(
+            response.data["access_list"], self.private_key.public_key()
+        )
+        self.assertEqual([f["slug"] for f in access_list["fridges"]], ["fridge"])
+        self.assertEqual(
+            access_list["users"][get_user_reference(self.adult.pk)]["minimum_age"], 18
+        )
+
+    def test_access_logs_unauthenticated(self):
+        """Access logs are only accepted from authenticated clients."""
+        response = self.client.post(
+            reverse("v1:fridge_access_logs"), {"events": []}, format="json"
+        )
+        self.assertIn(response.status_code, (401, 403))
+        self.assertFalse(AccessLog.objects.exists())
+
+    def test_access_logs_without_fridges(self):
+        """Clients without fridges cannot upload access logs."""
+        self._authenticate(self.other_token)
+        response = self.client.post(
+            reverse("v1:fridge_access_logs"), {"events": []}, format="json"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    @freeze_time("2024-01-01T13:00:00Z")
+    def test_access_logs(self):
+        """Uploaded events are logged, and invalid events are rejected."""
+        self._authenticate(self.token)
+        with freeze_time("2024-01-01T12:00:00Z"):
+            user_token = get_user_token(self.adult)
+        events = [
+            {
+                "user": user_token,
+                "fridge": "fridge",
+                "timestamp": "2024-01-01T12:00:00Z",
+            },
+            {"user": "adult", "fridge": "fridge", "timestamp": "2024-01-01T12:00:00Z"},
+        ]
+        response = self.client.post(
+            reverse("v1:fridge_access_logs"), {"events": events}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["logged"], 1)
+        self.assertEqual(
+            response.data["rejected"], [{"index": 1, "detail": "Invalid user token"}]
+        )
+        access_log = AccessLog.objects.get()
+        self.assertEqual(access_log.user, self.adult)
+        self.assertEqual(access_log.fridge, self.fridge)
+
+    @freeze_time("2024-01-01T13:00:00Z")
+    def test_access_logs_invalid(self):
+        """Requests without a list of events, or with too many events, are rejected."""
+        self._authenticate(self.token)
+        response = self.client.post(reverse("v1:fridge_access_logs"), {}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        events = [
+            {"user": "adult", "fridge": "fridge", "timestamp": "2024-01-01T12:00:00Z"}
+        ]
+        response = self.client.post(
+            reverse("v1:fridge_access_logs"),
+            {"events": events * (FridgeAccessLogsAPIView.MAX_EVENTS + 1)},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AccessLog.objects.exists())
+
+    def test_user_token_unauthenticated(self):
+        """User tokens are only issued to logged in users."""
+        response = self.client.get(reverse("v1:fridge_user_token"))
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_user_token(self):
+        """Logged in users get a user token that can be verified with the public key of the server."""
+        self.client.force_login(self.adult)
+        response = self.client.get(reverse("v1:fridge_user_token"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["valid_for"], 20)
+        user_token = load_user_token(
+            response.data["token"], self.private_key.public_key()
+        )
+        self.assertEqual(user_token["user"], get_user_reference(self.adult.pk))
+
+
+class FridgeUnlockAPITests(FridgeAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        GeneralOpeningHours.objects.create(
+            fridge=cls.fridge,
+            weekday=timezone.now().astimezone().weekday(),
+            start_time=time(0, 0),
+            end_time=time(23, 59, 59),
+        )
+
+    def _unlock(self, user_token):
+        self._authenticate(self.token)
+        return self.client.post(
+            reverse("v1:fridge_unlock"), {"user_token": user_token}, format="json"
+        )
+
+    def test_unlock(self):
+        """A user of age can open an age-restricted fridge with their user token."""
+        response = self._unlock(get_user_token(self.adult))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([x["fridge"] for x in response.data["unlock"]], ["fridge"])
+
+    def test_unlock_minor(self):
+        """A user that is too young cannot open an age-restricted fridge."""
+        response = self._unlock(get_user_token(self.minor))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["unlock"], [])
+
+    def test_unlock_forged_user_token(self):
+        """Forged or unsigned user tokens cannot open an age-restricted fridge."""
+        with patch(
+            "fridges.services.get_access_list_private_key",
+            return_value=Ed25519PrivateKey.generate(),
+        ):
+            forged = get_user_token(self.adult)
+        for user_token in (forged, TimestampSigner().sign("adult"), "adult:forged"):
+            with self.subTest(user_token=user_token):
+                response = self._unlock(user_token)
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(AccessLog.objects.exists())
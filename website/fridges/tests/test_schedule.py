@@ -0,0 +1,104 @@
+import logging
+from datetime import datetime, time
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TestCase
+from oauth2_provider.models import Application
+
+from fridges.models import Fridge, GeneralOpeningHours
+
+logging.disable()
+
+# A Monday.
+MONDAY = datetime(2024, 1, 1)
+
+
+class FridgeScheduleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        application = Application.objects.create(
+            name="Fridge lock",
+            client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_CLIENT_CREDENTIALS,
+        )
+        cls.fridge = Fridge.objects.create(
+            name="Fridge", slug="fridge", oauth_client=application
+        )
+        cls.group = Group.objects.create(name="Board")
+        GeneralOpeningHours.objects.create(
+            fridge=cls.fridge, weekday=0, start_time=time(16), end_time=time(18)
+        )
+        cls.restricted = GeneralOpeningHours.objects.create(
+            fridge=cls.fridge, weekday=0, start_time=time(12), end_time=time(14)
+        )
+        cls.restricted.restrict_to_groups.add(cls.group)
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        cache.clear()
+
+    def _schedule(self):
+        return Fridge.objects.get(pk=self.fridge.pk).schedule
+
+    def test_is_open(self):
+        """Intervals are inclusive and restricted intervals only apply to their groups."""
+        schedule = self._schedule()
+        self.assertTrue(schedule.is_open(MONDAY.replace(hour=16)))
+        self.assertTrue(schedule.is_open(MONDAY.replace(hour=18)))
+        self.assertFalse(schedule.is_open(MONDAY.replace(hour=19)))
+        self.assertFalse(schedule.is_open(MONDAY.replace(day=2, hour=17)))
+        self.assertFalse(schedule.is_open(MONDAY.replace(hour=13)))
+        self.assertTrue(
+            schedule.is_open(MONDAY.replace(hour=13), groups={self.group.pk})
+        )
+
+    def test_opens_today_at(self):
+        """The next unrestricted opening time today is found."""
+        schedule = self._schedule()
+        self.assertEqual(schedule.opens_today_at(MONDAY.replace(hour=11)), time(16))
+        self.assertEqual(schedule.opens_today_at(MONDAY.replace(hour=17)), time(17))
+        self.assertIsNone(schedule.opens_today_at(MONDAY.replace(hour=19)))
+
+    def test_schedule_cached(self):
+        """A compiled schedule is served from the cache."""
+        self._schedule()
+        fridge = Fridge.objects.get(pk=self.fridge.pk)
+        with self.assertNumQueries(0):
+            fridge.schedule
+            fridge.can_be_opened
+            fridge.opens_today_at()
+
+    def test_schedule_invalidated(self):
+        """Changing opening hours or their groups clears the cached schedule."""
+        self._schedule()
+        GeneralOpeningHours.objects.create(
+            fridge=self.fridge, weekday=1, start_time=time(10), end_time=time(11)
+        )
+        self.assertTrue(self._schedule().is_open(MONDAY.replace(day=2, hour=10)))
+        self.restricted.restrict_to_groups.clear()
+        self.assertTrue(self._schedule().is_open(MONDAY.replace(hour=13)))
+        self.group.generalopeninghours_set.add(self.restricted)
+        self.assertFalse(self._schedule().is_open(MONDAY.replace(hour=13)))
+        Group.objects.get(pk=self.group.pk).delete()
+        self.assertTrue(self._schedule().is_open(MONDAY.replace(hour=13)))
+
+    def test_export(self):
+        """The schedule is exported as a list of intervals."""
+        self.assertEqual(
+            self._schedule().export(),
+            [
+                {
+                    "weekday": 0,
+                    "start_time": "12:00:00",
+                    "end_time": "14:00:00",
+                    "restrict_to_groups": [self.group.pk],
+                },
+                {
+                    "weekday": 0,
+                    "start_time": "16:00:00",
+                    "end_time": "18:00:00",
+                    "restrict_to_groups": [],
+                },
+            ],
+        )
@@ -0,0 +1,379 @@
+import json
+import logging
+import os
+import tempfile
+from datetime import time, timedelta
+from unittest.mock import patch
+
+from constance.test import override_config
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signing import BadSignature, SignatureExpired, TimestampSigner
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+from guardian.shortcuts import assign_perm
+from kombu.exceptions import OperationalError
+from oauth2_provider.models import Application
+
+from age.models import AgeRegistration
+from fridges.models import AccessLog, BlacklistEntry, Fridge, GeneralOpeningHours
+from fridges.services import (
+    FridgeAccess,
+    build_access_list,
+    fridges_opened_on,
+    get_access_list_public_key,
+    get_user_from_user_token,
+    get_user_reference,
+    get_user_token,
+    load_access_list,
+    load_user_token,
+    log_access_events,
+    log_accesses,
+    sign_access_list,
+)
+
+User = get_user_model()
+logging.disable()
+
+
+class FridgeAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.application = Application.objects.create(
+            name="Fridge lock",
+            client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_CLIENT_CREDENTIALS,
+        )
+        cls.user = User.objects.create_user(username="user", password="password")
+        AgeRegistration.objects.create(user=cls.user, minimum_age=18)
+        cls.group = Group.objects.create(name="Board")
+        cls.fridges = [
+            Fridge.objects.create(
+                name=f"Fridge {i}", slug=f"fridge-{i}", oauth_client=cls.application
+            )
+            for i in range(4)
+        ]
+        for fridge in cls.fridges:
+            GeneralOpeningHours.objects.create(
+                fridge=fridge,
+                weekday=timezone.now().astimezone().weekday(),
+                start_time=time(0, 0),
+                end_time=time(23, 59, 59),
+            )
+
+    def _unlockable(self, user=None):
+        return [
+            fridge.slug
+            for fridge, _ in FridgeAccess(
+                user or self.user, self.fridges
+            ).unlockable_fridges()
+        ]
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        # Store the constance defaults, compile the schedules and cache the minimum age, so these are not done while
+        # counting queries.
+        FridgeAccess(self.user, self.fridges).unlockable_fridges()
+
+    def test_open_fridges(self):
+        """A user of age can open all fridges that are open, in a fixed number of queries."""
+        # Permissions (2), groups and the daily opening setting, the minimum age and blacklist are cached.
+        with self.assertNumQueries(4):
+            unlockable = self._unlockable()
+        self.assertEqual(unlockable, [fridge.slug for fridge in self.fridges])
+
+    def test_closed_inactive_and_blacklisted_fridges(self):
+        """Closed, inactive and blacklisted fridges cannot be opened."""
+        GeneralOpeningHours.objects.filter(fridge=self.fridges[0]).delete()
+        Fridge.objects.filter(pk=self.fridges[1].pk).update(is_active=False)
+        self.fridges[1].is_active = False
+        BlacklistEntry.objects.create(user=self.user, fridge=self.fridges[2])
+        self.assertEqual(self._unlockable(), ["fridge-3"])
+        self.assertEqual(
+            FridgeAccess(self.user, [self.fridges[2]]).can_open(self.fridges[2]),
+            (False, None),
+        )
+
+    def test_minimum_age(self):
+        """Users without a sufficient age registration cannot open fridges."""
+        self.fridges[0].minimum_age = 21
+        self.assertNotIn("fridge-0", self._unlockable())
+        other = User.objects.create_user(username="other", password="password")
+        with patch("fridges.services.emit_metric") as emit_metric:
+            self.assertEqual(self._unlockable(other), [])
+        self.assertEqual(emit_metric.call_count, 4)
+
+    def test_group_restricted_opening_hours(self):
+        """Opening hours restricted to groups only apply to members of those groups."""
+        hours = GeneralOpeningHours.objects.get(fridge=self.fridges[0])
+        hours.restrict_to_groups.add(self.group)
+        self.assertNotIn("fridge-0", self._unlockable())
+        self.user.groups.add(self.group)
+        self.assertIn("fridge-0", self._unlockable())
+
+    def test_open_always(self):
+        """Users that can always open a fridge can open it when it is closed or inactive."""
+        other = User.objects.create_user(username="other", password="password")
+        GeneralOpeningHours.objects.filter(fridge=self.fridges[0]).delete()
+        self.fridges[0].is_active = False
+        assign_perm("fridges.open_always", other, self.fridges[0])
+        self.assertEqual(
+            FridgeAccess(other, [self.fridges[0]]).can_open(self.fridges[0]),
+            (True, timedelta(minutes=1)),
+        )
+
+    @override_config(FRIDGE_REQUIRE_DAILY_OPENING=True)
+    def test_require_daily_opening(self):
+        """With daily opening required, only fridges opened today can be opened."""
+        AccessLog.objects.create(user=self.user, fridge=self.fridges[3])
+        self.assertEqual(self._unlockable(), ["fridge-3"])
+
+
+class FridgeAccessListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        application = Application.objects.create(
+            name="Fridge lock",
+            client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_CLIENT_CREDENTIALS,
+        )
+        cls.fridge = Fridge.objects.create(
+            name="Fridge", slug="fridge", oauth_client=application
+        )
+        cls.group = Group.objects.create(name="Board")
+        hours = GeneralOpeningHours.objects.create(
+            fridge=cls.fridge, weekday=0, start_time=time(12), end_time=time(14)
+        )
+        hours.restrict_to_groups.add(cls.group)
+
+        cls.adult = User.objects.create_user(username="adult")
+        AgeRegistration.objects.create(user=cls.adult, minimum_age=18)
+        cls.minor = User.objects.create_user(username="minor")
+        AgeRegistration.objects.create(user=cls.minor, minimum_age=16)
+        cls.member = User.objects.create_user(username="member")
+        cls.member.groups.add(cls.group)
+        cls.admin = User.objects.create_user(username="admin")
+        assign_perm("fridges.open_always", cls.admin, cls.fridge)
+        cls.blacklisted = User.objects.create_user(username="blacklisted")
+        BlacklistEntry.objects.create(user=cls.blacklisted, fridge=cls.fridge)
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        key_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(key_dir.cleanup)
+        self.private_key = Ed25519PrivateKey.generate()
+        key_file = os.path.join(key_dir.name, "access_list.key")
+        with open(key_file, "wb") as f:
+            f.write(
+                self.private_key.private_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PrivateFormat.PKCS8,
+                    encryption_algorithm=serialization.NoEncryption(),
+                )
+            )
+        settings_override = override_settings(
+            FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE=key_file
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_access_list(self):
+        """The access list contains the fridges and the users relevant for decisions."""
+        access_list = load_access_list(
+            sign_access_list(build_access_list([self.fridge]))
+        )
+        self.assertEqual(access_list["fridges"][0]["slug"], "fridge")
+        self.assertEqual(access_list["fridges"][0]["unlock_for"], 60)
+        self.assertEqual(
+            access_list["fridges"][0]["schedule"][0]["restrict_to_groups"],
+            [self.group.pk],
+        )
+        adult, member, admin, blacklisted = (
+            get_user_reference(user.pk)
+            for user in (self.adult, self.member, self.admin, self.blacklisted)
+        )
+        users = access_list["users"]
+        self.assertEqual(set(users), {adult, member, admin, blacklisted})
+        self.assertNotIn("adult", json.dumps(access_list))
+        self.assertEqual(users[adult]["minimum_age"], 18)
+        self.assertEqual(users[member]["groups"], [self.group.pk])
+        self.assertEqual(users[admin]["open_always"], ["fridge"])
+        self.assertEqual(users[blacklisted]["blacklisted"], ["fridge"])
+
+    def test_access_list_signature(self):
+        """Tampered or expired access lists are rejected."""
+        signed_access_list = sign_access_list(build_access_list([self.fridge]))
+        with self.assertRaises(BadSignature):
+            load_access_list(signed_access_list[:-1] + "x")
+        with self.assertRaises(BadSignature):
+            load_access_list(get_user_token(self.adult))
+        with freeze_time(timezone.now() + timedelta(days=1)):
+            with self.assertRaises(SignatureExpired):
+                load_access_list(signed_access_list)
+
+    def test_access_list_public_key(self):
+        """Access lists can be verified with only the public key, but not with another key."""
+        signed_access_list = sign_access_list(build_access_list([self.fridge]))
+        public_key = serialization.load_pem_public_key(
+            get_access_list_public_key().encode()
+        )
+        self.assertEqual(
+            load_access_list(signed_access_list, public_key)["fridges"][0]["slug"],
+            "fridge",
+        )
+        with self.assertRaises(BadSignature):
+            load_access_list(
+                signed_access_list, Ed25519PrivateKey.generate().public_key()
+            )
+
+    def test_access_list_without_key(self):
+        """Access lists are not signed without a dedicated key."""
+        with override_settings(FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE=None):
+            with self.assertRaises(ImproperlyConfigured):
+                sign_access_list(build_access_list([self.fridge]))
+
+    @freeze_time("2024-01-01T13:00:00Z")
+    def test_log_access_events(self):
+        """Valid events are logged once, and invalid events are rejected."""
+        with freeze_time("2024-01-01T12:00:00Z"):
+            adult = get_user_token(self.adult)
+            removed = get_user_token(User.objects.create_user(username="removed"))
+        User.objects.filter(username="removed").delete()
+        later = "2024-01-01T12:01:00Z"
+        events = [
+            {"user": adult, "fridge": "fridge", "timestamp": "2024-01-01T12:00:05Z"},
+            {"user": adult, "fridge": "other", "timestamp": "2024-01-01T12:00:05Z"},
+            {"user": "adult", "fridge": "fridge", "timestamp": "2024-01-01T12:00:05Z"},
+            {"user": adult, "fridge": "fridge", "timestamp": "yesterday"},
+            "invalid",
+            {"user": [adult], "fridge": "fridge", "timestamp": "2024-01-01T12:00:05Z"},
+            {"user": adult, "fridge": {"a": 1}, "timestamp": "2024-01-01T12:00:05Z"},
+            {"user": adult, "fridge": "fridge", "timestamp": "2024-01-02T12:00:00Z"},
+            {"user": adult, "fridge": "fridge", "timestamp": "2023-12-31T12:00:00Z"},
+            {"user": adult, "fridge": "fridge", "timestamp": later},
+            {"user": adult, "fridge": "fridge", "timestamp": "2024-01-01T11:59:00Z"},
+            {"user": removed, "fridge": "fridge", "timestamp": "2024-01-01T12:00:05Z"},
+        ]
+        logged, rejected = log_access_events([self.fridge], events)
+        self.assertEqual(logged, 1)
+        self.assertEqual(
+            rejected,
+            [
+                {"index": 1, "detail": "Unknown fridge"},
+                {"index": 2, "detail": "Invalid user token"},
+                {"index": 3, "detail": "Invalid timestamp"},
+                {"index": 4, "detail": "Unknown fridge"},
+                {"index": 5, "detail": "Invalid user token"},
+                {"index": 6, "detail": "Unknown fridge"},
+                {"index": 7, "detail": "Timestamp out of range"},
+                {"index": 8, "detail": "Timestamp out of range"},
+                {"index": 9, "detail": "Invalid user token"},
+                {"index": 10, "detail": "Invalid user token"},
+                {"index": 11, "detail": "Unknown user"},
+            ],
+        )
+        access_log = AccessLog.objects.get()
+        self.assertEqual(access_log.user, self.adult)
+        self.assertEqual(access_log.timestamp.isoformat(), "2024-01-01T12:00:05+00:00")
+
+        self.assertEqual(log_access_events([self.fridge], events[:1]), (0, []))
+        self.assertEqual(AccessLog.objects.count(), 1)
+
+    def test_user_token(self):
+        """User tokens identify a user, and can be verified with only the public key."""
+        user_token = get_user_token(self.adult)
+        public_key = serialization.load_pem_public_key(
+            get_access_list_public_key().encode()
+        )
+        self.assertEqual(
+            load_user_token(user_token, public_key)["user"],
+            get_user_reference(self.adult.pk),
+        )
+        self.assertEqual(get_user_from_user_token(user_token), self.adult)
+        with freeze_time(timezone.now() + timedelta(seconds=20)):
+            with self.assertRaises(SignatureExpired):
+                load_user_token(user_token)
+
+    def test_forged_user_token(self):
+        """Forged or unsigned user tokens are rejected, so they cannot open an age-restricted fridge offline."""
+        forged_key = Ed25519PrivateKey.generate()
+        with patch(
+            "fridges.services.get_access_list_private_key", return_value=forged_key
+        ):
+            forged = get_user_token(self.adult)
+        public_key = self.private_key.public_key()
+        for user_token in (
+            forged,
+            TimestampSigner().sign("adult"),
+            "adult:forged",
+            sign_access_list(build_access_list([self.fridge])),
+        ):
+            with self.subTest(user_token=user_token):
+                with self.assertRaises(BadSignature):
+                    load_user_token(user_token, public_key)
+
+
+class AccessLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        application = Application.objects.create(
+            name="Fridge lock",
+            client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_CLIENT_CREDENTIALS,
+        )
+        cls.fridges = [
+            Fridge.objects.create(
+                name=f"Fridge {i}", slug=f"fridge-{i}", oauth_client=application
+            )
+            for i in range(2)
+        ]
+        cls.user = User.objects.create_user(username="user")
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        cache.clear()
+
+    def test_log_accesses(self):
+        """Accesses are written in one batch and the fridges are marked as opened today."""
+        with patch("fridges.services.write_access_logs") as write_access_logs:
+            log_accesses(self.user, self.fridges)
+        write_access_logs.delay.assert_called_once()
+        self.assertEqual(len(write_access_logs.delay.call_args.args[0]), 2)
+        with self.assertNumQueries(0):
+            opened = fridges_opened_on(self.fridges, timezone.localdate())
+        self.assertEqual(opened, {fridge.pk for fridge in self.fridges})
+
+        log_accesses(self.user, self.fridges[:1])
+        self.assertEqual(AccessLog.objects.get().fridge, self.fridges[0])
+
+    def test_log_accesses_without_broker(self):
+        """Accesses are written directly if they cannot be queued."""
+        with patch(
+            "fridges.services.write_access_logs.delay",
+            side_effect=OperationalError,
+        ):
+            log_accesses(self.user, self.fridges)
+        self.assertEqual(AccessLog.objects.count(), 2)
+
+    def test_fridges_opened_on(self):
+        """Whether fridges were opened on a day is looked up once and then cached."""
+        today = timezone.localdate()
+        AccessLog.objects.create(user=self.user, fridge=self.fridges[0])
+        AccessLog.objects.create(
+            user=self.user,
+            fridge=self.fridges[1],
+            timestamp=timezone.now() - timedelta(days=1),
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                fridges_opened_on(self.fridges, today), {self.fridges[0].pk}
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                fridges_opened_on(self.fridges, today), {self.fridges[0].pk}
+            )
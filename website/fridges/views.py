@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.views.generic import ListView
 
 from fridges.models import Fridge
@@ -11,5 +12,15 @@ class IndexView(ListView):
     context_object_name = "fridges"
 
     def get_queryset(self):
-        """Get the queryset."""
-        return Fridge.objects.filter(is_active=True).order_by("name")
+        """Get the fridges, with their schedules loaded at once."""
+        fridges = list(Fridge.objects.filter(is_active=True).order_by("name"))
+        Fridge.get_schedules(fridges)
+        return fridges
+
+    def get_context_data(self, **kwargs):
+        """Add whether user tokens can be issued, which requires the access list key."""
+        context = super().get_context_data(**kwargs)
+        context["user_tokens_enabled"] = bool(
+            settings.FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE
+        )
+        return context
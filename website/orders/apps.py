@@ -61,15 +61,17 @@ class OrdersConfig(AppConfig):
             },
         ]
 
+    def blacklist(self, user):
+        """Whether a user is blacklisted for placing orders, for tosti.blacklist."""
+        from orders.models import OrderBlacklistedUser
+
+        return OrderBlacklistedUser.objects.filter(user=user).exists()
+
     def announcements(self, request):
         """Register announcements."""
-        from orders.models import OrderBlacklistedUser
+        from tosti.blacklist import get_blacklist
 
-        if (
-            request.user is not None
-            and request.user.is_authenticated
-            and OrderBlacklistedUser.objects.filter(user=request.user).exists()
-        ):
+        if request.user is not None and get_blacklist(request.user).get(self.label):
             return ["You are&nbsp;<b>blacklisted</b>&nbsp;for placing orders!"]
 
         return []
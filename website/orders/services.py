@@ -6,7 +6,8 @@ from django.utils import timezone
 from guardian.shortcuts import get_users_with_perms
 
 from orders.exceptions import OrderException
-from orders.models import Order, Product, Shift, OrderBlacklistedUser, OrderVenue
+from orders.models import Order, Product, Shift, OrderVenue
+from tosti.blacklist import get_blacklist
 from tosti.metrics import emit as emit_metric
 from users.models import User
 
@@ -20,7 +21,7 @@ def user_can_manage_shifts_in_venue(user, venue):
 
 def user_is_blacklisted(user):
     """Return if the user is on the blacklist."""
-    return OrderBlacklistedUser.objects.filter(user=user).exists()
+    return get_blacklist(user).get("orders", False)
 
 
 def user_gets_prioritized_orders(user, shift):
@@ -36,17 +37,24 @@ def user_gets_prioritized_orders(user, shift):
     )
 
 
+def data_minimisation_orders():
+    """Get the paid orders that are more than 31 days old and still linked to a user."""
+    delete_before = timezone.now() - datetime.timedelta(days=31)
+    return Order.objects.filter(created__lte=delete_before, user__isnull=False).exclude(
+        paid=False
+    )
+
+
 def execute_data_minimisation(dry_run=False):
     """
     Remove order history from users that is more than 31 days old.
 
     :param dry_run: does not really remove data if True
-    :return: list of users from who data is removed
+    :return: the number of users from who data is removed
     """
-    delete_before = timezone.now() - datetime.timedelta(days=31)
-    orders = Order.objects.filter(created__lte=delete_before).exclude(paid=False)
+    orders = data_minimisation_orders()
 
-    users = orders.values_list("user", flat=True).distinct()
+    users = orders.values("user").distinct().count()
     if not dry_run:
         orders.update(user=None)
 
@@ -1,11 +1,15 @@
 from datetime import datetime
 
 import pytz
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.conf import settings
 
-from orders.models import Order
+from orders.models import Order, OrderBlacklistedUser
+from tosti.blacklist import (
+    clear_blacklist_cache_of_entry,
+    clear_blacklist_cache_of_moved_entry,
+)
 
 
 @receiver(pre_save, sender=Order)
@@ -56,3 +60,16 @@ def copy_order_price(sender, instance, **kwargs):
     else:
         if not instance.product == obj.product:
             instance.order_price = instance.product.current_price
+
+
+@receiver(post_save, sender=OrderBlacklistedUser)
+@receiver(post_delete, sender=OrderBlacklistedUser)
+def on_blacklist_changed(sender, instance, **kwargs):
+    """Clear the cached blacklist of the user of a changed blacklist entry."""
+    clear_blacklist_cache_of_entry(instance)
+
+
+@receiver(pre_save, sender=OrderBlacklistedUser)
+def on_blacklist_moving(sender, instance, **kwargs):
+    """Clear the cached blacklist of the previous user of a blacklist entry that moves to another user."""
+    clear_blacklist_cache_of_moved_entry(instance)
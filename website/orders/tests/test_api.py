@@ -3,6 +3,7 @@ import logging
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils import timezone
 from freezegun import freeze_time
@@ -379,6 +380,7 @@ class OrderAPITests(APITestCase):
     def test_create_order_while_blacklisted(self):
         """Blacklisted users should not be able to order."""
         models.OrderBlacklistedUser.objects.create(user=self.normal_user)
+        self.addCleanup(cache.clear)
         orders_before = Order.objects.all().count()
         self.client.login(username=self.normal_user.username, password="password")
         response = self.client.post(
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from orders.models import OrderBlacklistedUser
+from orders.services import user_is_blacklisted
+
+User = get_user_model()
+
+
+class OrderBlacklistTests(TestCase):
+    """Tests for the orders blacklist in the cached per-user blacklist."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="password")
+        cls.other_user = User.objects.create_user(username="other", password="password")
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def _fresh(self, user):
+        return User.objects.get(pk=user.pk)
+
+    def test_cache_cleared_on_change(self):
+        """Adding, moving or removing blacklist entries clears the cached blacklists."""
+        self.assertFalse(user_is_blacklisted(self.user))
+        entry = OrderBlacklistedUser.objects.create(user=self.user)
+        self.assertTrue(user_is_blacklisted(self.user))
+
+        self.assertFalse(user_is_blacklisted(self.other_user))
+        entry.user = self.other_user
+        entry.save()
+        self.assertFalse(user_is_blacklisted(self._fresh(self.user)))
+        self.assertTrue(user_is_blacklisted(self._fresh(self.other_user)))
+
+        entry.delete()
+        self.assertFalse(user_is_blacklisted(self._fresh(self.other_user)))
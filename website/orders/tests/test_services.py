@@ -53,7 +53,7 @@ class OrderServicesTests(TestCase):
         order_not_paid.save()
 
         with self.subTest("Data minimisation dry run"):
-            services.execute_data_minimisation(dry_run=True)
+            self.assertEqual(services.execute_data_minimisation(dry_run=True), 1)
             self.assertTrue(
                 models.Order.objects.filter(
                     id=order_do_delete.id, user=self.normal_user
@@ -71,7 +71,7 @@ class OrderServicesTests(TestCase):
             )
 
         with self.subTest("Normal Data minimisation run"):
-            services.execute_data_minimisation()
+            self.assertEqual(services.execute_data_minimisation(), 1)
             self.assertFalse(
                 models.Order.objects.filter(
                     id=order_do_delete.id, user=self.normal_user
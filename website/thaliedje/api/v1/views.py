@@ -15,7 +15,7 @@ from thaliedje.api.v1.serializers import (
     RequestedQueueItemSerializer,
     AnonymousRequestedQueueItemSerializer,
 )
-from thaliedje.models import Player, SpotifyQueueItem
+from thaliedje.models import Player, SpotifyQueueItem, SpotifyTrack
 from thaliedje.services import request_song
 from tosti.api.openapi import CustomAutoSchema
 
@@ -114,6 +114,13 @@ class PlayerTrackSearchAPIView(APIView):
                 "required": False,
                 "schema": {"type": "integer"},
             },
+            {
+                "name": "local",
+                "in": "query",
+                "required": False,
+                "description": "Only search tracks that were requested before, without contacting Spotify.",
+                "schema": {"type": "boolean"},
+            },
         ],
         response_schema={
             "type": "object",
@@ -163,10 +170,12 @@ class PlayerTrackSearchAPIView(APIView):
         if player.can_request_playlist(request.user):
             type_to_search = "album,playlist,track"
 
-        if query != "":
-            results = player.search(query, maximum, query_type=type_to_search)
-        else:
+        if query == "":
             results = []
+        elif request.GET.get("local", "false").lower() == "true":
+            results = {"tracks": SpotifyTrack.search(query, maximum)}
+        else:
+            results = player.search(query, maximum, query_type=type_to_search)
         return Response(
             status=status.HTTP_200_OK, data={"query": query, "results": results}
         )
@@ -7,6 +7,10 @@ class ThaliedjeConfig(AppConfig):
 
     name = "thaliedje"
 
+    def ready(self):
+        """Register signals."""
+        from thaliedje import signals  # noqa
+
     def user_account_tabs(self, _):
         """Register user account tabs."""
         from thaliedje.views import AccountHistoryTabView
@@ -20,15 +24,17 @@ class ThaliedjeConfig(AppConfig):
             }
         ]
 
+    def blacklist(self, user):
+        """Whether a user is blacklisted for thaliedje, for tosti.blacklist."""
+        from thaliedje.models import ThaliedjeBlacklistedUser
+
+        return ThaliedjeBlacklistedUser.objects.filter(user=user).exists()
+
     def announcements(self, request):
         """Register announcements."""
-        from thaliedje.models import ThaliedjeBlacklistedUser
+        from tosti.blacklist import get_blacklist
 
-        if (
-            request.user is not None
-            and request.user.is_authenticated
-            and ThaliedjeBlacklistedUser.objects.filter(user=request.user).exists()
-        ):
+        if request.user is not None and get_blacklist(request.user).get(self.label):
             return ["You are&nbsp;<b>blacklisted</b>&nbsp;from thaliedje!"]
 
         return []
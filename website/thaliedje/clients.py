@@ -0,0 +1,141 @@
+"""
+Process-wide API clients for music players.
+
+Constructing a client for every API call sets up a new HTTP session (and with it a new TLS connection) and reads the
+token cache from disk each time. Instead, clients are built once per player and process and reused for as long as
+the credentials of the player do not change.
+"""
+
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from spotipy import Spotify, SpotifyOAuth
+from spotipy.cache_handler import CacheFileHandler, CacheHandler
+
+from thaliedje.marietje import CircuitBreaker, Marietje, MarietjeClientCredentials
+
+SpotifyClients = namedtuple("SpotifyClients", ["credentials", "auth", "spotify"])
+MarietjeClient = namedtuple("MarietjeClient", ["credentials", "marietje"])
+
+_spotify_clients = dict()
+_spotify_clients_lock = threading.Lock()
+
+_marietje_clients = dict()
+_marietje_clients_lock = threading.Lock()
+
+
+class SpotifyTokenCacheHandler(CacheHandler):
+    """
+    Spotipy token cache that keeps the token in memory.
+
+    The token is shared with other processes via the Django cache, so a token refreshed by one process is picked up
+    by the others. It is also still written to the token cache file, such that the refresh token survives a cache
+    flush.
+    """
+
+    def __init__(self, client_id, cache_path):
+        """Initialize the token cache handler."""
+        self.cache_key = f"thaliedje_spotify_token_{client_id}"
+        self.file_handler = CacheFileHandler(cache_path=cache_path)
+        self.token_info = None
+
+    def get_cached_token(self):
+        """Get the token, only falling back to the shared caches if the in-memory token expired."""
+        if self.token_info is not None and not SpotifyOAuth.is_token_expired(
+            self.token_info
+        ):
+            return self.token_info
+
+        token_info = cache.get(self.cache_key)
+        if token_info is None:
+            token_info = self.file_handler.get_cached_token()
+            if token_info is not None:
+                cache.set(self.cache_key, token_info, None)
+
+        if token_info is not None:
+            self.token_info = token_info
+        return self.token_info
+
+    def save_token_to_cache(self, token_info):
+        """Save a token in memory, in the Django cache and in the token cache file."""
+        self.token_info = token_info
+        cache.set(self.cache_key, token_info, None)
+        self.file_handler.save_token_to_cache(token_info)
+
+
+def get_spotify_clients(player):
+    """
+    Get the shared Spotify clients of a SpotifyPlayer.
+
+    :param player: the SpotifyPlayer
+    :return: a SpotifyClients tuple with the SpotifyOAuth manager and the Spotify client of the player
+    """
+    credentials = (player.client_id, player.client_secret, player.redirect_uri)
+    with _spotify_clients_lock:
+        clients = _spotify_clients.get(player.client_id)
+        if clients is None or clients.credentials != credentials:
+            auth = SpotifyOAuth(
+                client_id=player.client_id,
+                client_secret=player.client_secret,
+                redirect_uri=player.redirect_uri,
+                scope=player.SCOPE,
+                cache_handler=SpotifyTokenCacheHandler(
+                    player.client_id, player.cache_path
+                ),
+            )
+            clients = SpotifyClients(credentials, auth, Spotify(oauth_manager=auth))
+            _spotify_clients[player.client_id] = clients
+        return clients
+
+
+def discard_spotify_clients(client_id):
+    """Discard the shared Spotify clients for a client id."""
+    with _spotify_clients_lock:
+        _spotify_clients.pop(client_id, None)
+
+
+def get_marietje_client(player):
+    """
+    Get the shared Marietje client of a MarietjePlayer.
+
+    The client is configured with the MARIETJE_* timeout, retry and circuit breaker settings, so a slow or failing
+    Marietje server is given up on quickly.
+
+    :param player: the MarietjePlayer
+    :return: a Marietje client
+    """
+    credentials = (player.url, player.client_id, player.client_secret)
+    with _marietje_clients_lock:
+        client = _marietje_clients.get(player.pk)
+        if client is None or client.credentials != credentials:
+            auth = MarietjeClientCredentials(
+                player.url,
+                player.client_id,
+                player.client_secret,
+                requests_timeout=settings.MARIETJE_REQUESTS_TIMEOUT,
+                cache_path=player.cache_path,
+            )
+            marietje = Marietje(
+                player.url,
+                auth_manager=auth,
+                requests_timeout=settings.MARIETJE_REQUESTS_TIMEOUT,
+                retries=settings.MARIETJE_RETRIES,
+                status_retries=settings.MARIETJE_RETRIES,
+                backoff_jitter=settings.MARIETJE_BACKOFF_JITTER,
+                backoff_max=settings.MARIETJE_BACKOFF_MAX,
+                circuit_breaker=CircuitBreaker(
+                    failure_threshold=settings.MARIETJE_CIRCUIT_BREAKER_THRESHOLD,
+                    reset_timeout=settings.MARIETJE_CIRCUIT_BREAKER_TIMEOUT,
+                ),
+            )
+            client = MarietjeClient(credentials, marietje)
+            _marietje_clients[player.pk] = client
+        return client.marietje
+
+
+def discard_marietje_client(player_pk):
+    """Discard the shared Marietje client of a player."""
+    with _marietje_clients_lock:
+        _marietje_clients.pop(player_pk, None)
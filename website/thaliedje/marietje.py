@@ -2,6 +2,7 @@ import base64
 import json
 import errno
 import logging
+import threading
 import time
 
 import requests
@@ -42,6 +43,51 @@ class MarietjeException(Exception):
         )
 
 
+class CircuitBreaker:
+    """
+    Circuit breaker for requests to a server.
+
+    After failure_threshold consecutive failed requests, the circuit opens and no requests are allowed for
+    reset_timeout seconds. After that, a single request is let through to check whether the server recovered.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        """Initialize the circuit breaker."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Check whether a request is allowed."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let this request through and keep the circuit open for the others until it completes.
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        """Record a successful request, closing the circuit."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """Record a failed request, opening the circuit if there were too many failures."""
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(
+                        "Opening circuit after %s failed requests", self.failures
+                    )
+                self.opened_at = time.monotonic()
+
+
 def _make_authorization_headers(client_id, client_secret):
     """Encode authorization headers."""
     auth_header = base64.b64encode((client_id + ":" + client_secret).encode("ascii"))
@@ -151,6 +197,7 @@ class MarietjeClientCredentials(MarietjeAuthBase):
         self.client_secret = client_secret
         self.cache_handler = CacheFileHandler(cache_path=cache_path)
         self.requests_timeout = requests_timeout
+        self._token_info = None
 
     def token_url(self):
         """Get token URL."""
@@ -159,13 +206,15 @@ class MarietjeClientCredentials(MarietjeAuthBase):
     def get_access_token(self, check_cache=True):
         """Get access token."""
         if check_cache:
-            token_info = self.cache_handler.get_cached_token()
+            token_info = self._token_info or self.cache_handler.get_cached_token()
             if token_info and not self.is_token_expired(token_info):
+                self._token_info = token_info
                 return token_info["access_token"]
 
         token_info = self._request_access_token()
         token_info = self._add_custom_values_to_token_info(token_info)
         self.cache_handler.save_token_to_cache(token_info)
+        self._token_info = token_info
         return token_info["access_token"]
 
     def _request_access_token(self):
@@ -217,6 +266,9 @@ class Marietje:
         retries=3,
         status_retries=3,
         backoff_factor=0.3,
+        backoff_jitter=0.0,
+        backoff_max=120,
+        circuit_breaker=None,
     ):
         """Initialize Marietje."""
         if not base_url.endswith("/"):
@@ -227,6 +279,9 @@ class Marietje:
         self.requests_timeout = requests_timeout
         self.status_forcelist = status_forcelist or self.default_retry_codes
         self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self.backoff_max = backoff_max
+        self.circuit_breaker = circuit_breaker
         self.retries = retries
         self.status_retries = status_retries
 
@@ -258,6 +313,10 @@ class Marietje:
             allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
             status=self.status_retries,
             backoff_factor=self.backoff_factor,
+            backoff_jitter=self.backoff_jitter,
+            backoff_max=self.backoff_max,
+            # A Retry-After header could make a request wait far longer than backoff_max.
+            respect_retry_after_header=False,
             status_forcelist=self.status_forcelist,
         )
 
@@ -281,6 +340,30 @@ class Marietje:
         return {"Authorization": "Bearer {0}".format(token)}
 
     def _internal_call(self, method, url, payload, params):
+        """Do an internal request, keeping track of failures if a circuit breaker is used."""
+        if self.circuit_breaker is None:
+            return self._do_internal_call(method, url, payload, params)
+
+        if not self.circuit_breaker.allow_request():
+            raise MarietjeException(
+                503, -1, "%s:\n %s" % (url, "Circuit open"), reason="Circuit open"
+            )
+
+        try:
+            results = self._do_internal_call(method, url, payload, params)
+        except MarietjeException as e:
+            if e.http_status >= 500 or e.http_status == 429:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            raise
+        except requests.exceptions.RequestException:
+            self.circuit_breaker.record_failure()
+            raise
+        self.circuit_breaker.record_success()
+        return results
+
+    def _do_internal_call(self, method, url, payload, params):
         """Do an internal request."""
         args = dict(params=params)
         if not url.startswith("http"):
@@ -0,0 +1,21 @@
+# Generated by Django 6.0.7 on 2026-10-19 11:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("thaliedje", "0002_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="spotifyqueueitem",
+            index=models.Index(
+                fields=["requested_by", "added"], name="queue_item_requested_by_added"
+            ),
+        ),
+    ]
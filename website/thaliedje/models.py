@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import os
 import secrets
@@ -10,9 +11,10 @@ from django.core.cache import cache
 from django.core.validators import MinLengthValidator
 from django.db import models
 from django.conf import settings
-from django.db.models import F
+from django.db.models import Count, F, Q
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import cached_property
 from model_utils.managers import InheritanceManager
 from queryable_properties.managers import QueryablePropertiesManager
 from queryable_properties.properties import (
@@ -21,13 +23,28 @@ from queryable_properties.properties import (
     queryable_property,
 )
 from requests import ReadTimeout, RequestException
-from spotipy import SpotifyOAuth, SpotifyException
-from spotipy.client import Spotify
+from spotipy import SpotifyException
 
-from thaliedje.marietje import Marietje, MarietjeClientCredentials, MarietjeException
+from thaliedje.clients import get_marietje_client, get_spotify_clients
+from thaliedje.marietje import MarietjeException
+from tosti.blacklist import get_blacklist
+from tosti.cache import get_or_refresh
 from users.models import User
 from venues.models import Venue, Reservation
 
+# How long playback and queue state of a player is cached. This is longer than the interval at which
+# thaliedje.tasks.refresh_player_states refreshes the cache, so requests are served from the cache while it runs.
+PLAYER_STATE_CACHE_TIMEOUT = 10
+
+# How long Spotify search results are cached.
+SEARCH_CACHE_TIMEOUT = 15 * 60
+
+# The window over which song requests are counted for throttling.
+SONG_REQUEST_THROTTLE_WINDOW = timedelta(hours=1)
+
+# The maximum time the active control event of a player is cached. The cache is also cleared when an event changes.
+CONTROL_EVENT_CACHE_TIMEOUT = 5 * 60
+
 
 class Player(models.Model):
     """A player."""
@@ -161,6 +178,10 @@ class Player(models.Model):
         """Search for a song."""
         raise NotImplementedError
 
+    def refresh_state(self):
+        """Fetch the playback and queue state from the player and update the cache."""
+        raise NotImplementedError
+
     class Meta:
         """Meta class."""
 
@@ -186,9 +207,9 @@ class Player(models.Model):
             description=description,
         )
 
-    @property
+    @cached_property
     def active_control_event(self):
-        """Get the active control event for this player."""
+        """Get the active control event for this player, memoized on this instance."""
         return ThaliedjeControlEvent.current_event(self) or None
 
     def can_request_playlist(self, user):
@@ -209,14 +230,10 @@ class Player(models.Model):
 
     def user_is_throttled(self, user):
         """Check if a user is throttled."""
-        if (
-            SpotifyQueueItem.objects.filter(
-                requested_by=user, added__gte=timezone.now() - timedelta(hours=1)
-            ).count()
+        return (
+            len(SpotifyQueueItem.recent_request_times(user))
             >= config.THALIEDJE_MAX_SONG_REQUESTS_PER_HOUR
-        ):
-            return True
-        return False
+        )
 
     def can_request_song(self, user):
         """Check if a user can request a song."""
@@ -275,14 +292,16 @@ class MarietjePlayer(Player):
     @property
     def auth(self):
         """Get Marietje Auth credentials."""
-        return MarietjeClientCredentials(
-            self.url, self.client_id, self.client_secret, cache_path=self.cache_path
-        )
+        return self.marietje.auth_manager
 
     @property
     def marietje(self):
-        """Get a Marietje client."""
-        return Marietje(self.url, auth_manager=self.auth)
+        """
+        Get a Marietje client.
+
+        The client is shared by all uses of this player within the process, see thaliedje.clients.
+        """
+        return get_marietje_client(self)
 
     def do_marietje_request(self, func, *args, **kwargs):
         """
@@ -319,7 +338,12 @@ class MarietjePlayer(Player):
 
     @property
     def _current_playback_cache_key(self):
-        """Get the cache key for the current playback cache."""
+        """
+        Get the cache key for the current playback cache.
+
+        Marietje returns the current song and the queue in a single response, so this cache holds both and the
+        current playback and queue are always consistent with each other.
+        """
         return f"marietje_player_{self.id}_playback"
 
     def _get_current_playback(self):
@@ -333,29 +357,33 @@ class MarietjePlayer(Player):
             marietje_response["timestamp"] = int((before_call + after_call) / 2)
         return marietje_response
 
-    def _current_playback(self):
-        """Get the current playback from the Marietje API."""
-        cached_result = cache.get(self._current_playback_cache_key)
-        if cached_result is not None:
-            if cached_result == "unavailable":
-                return None
-            return cached_result
-
+    def _refresh_current_playback(self):
+        """Get the current playback and queue from the Marietje API and cache it."""
         try:
             playback = self._get_current_playback()
         except (ConnectionError, RequestException, ReadTimeout) as e:
             logging.warning(
                 f"Failed to get playback data for MarietjePlayer {self.id}: {e}"
             )
-            # Cache the failure for a shorter time to avoid hammering the API
-            cache.set(self._current_playback_cache_key, "unavailable", 30)
-            return None
+            playback = None
 
         if playback is None:
+            # Cache the failure for a longer time to avoid hammering the API
             cache.set(self._current_playback_cache_key, "unavailable", 30)
             return None
 
-        cache.set(self._current_playback_cache_key, playback, 5)
+        cache.set(
+            self._current_playback_cache_key, playback, PLAYER_STATE_CACHE_TIMEOUT
+        )
+        return playback
+
+    def _current_playback(self):
+        """Get the current playback from the Marietje API."""
+        playback = get_or_refresh(
+            self._current_playback_cache_key, self._refresh_current_playback
+        )
+        if playback == "unavailable":
+            return None
         return playback
 
     @property
@@ -419,36 +447,27 @@ class MarietjePlayer(Player):
 
         return playback["current_song"]["song"]["duration"] * 1000
 
-    @property
-    def _queue_cache_key(self):
-        """Get the cache key for the queue."""
-        return f"marietje_player_{self.id}_queue"
-
     @property
     def queue(self):
         """Get the queue for this player."""
-        cached_result = cache.get(self._queue_cache_key)
-        if cached_result is not None:
-            if cached_result == "unavailable":
-                return None
-            return cached_result
-
-        queue = self.do_marietje_request(self.marietje.queue_current)
+        playback = self._current_playback()
 
-        if queue is None:
-            cache.set(self._queue_cache_key, "unavailable", 10)
+        if playback is None:
+            return playback
 
-        queue = [
+        return [
             {
                 "track_id": item["song"]["id"],
                 "track_name": item["song"]["title"],
                 "track_artists": [item["song"]["artist"]],
                 "duration_ms": int(item["song"]["duration"]) * 1000,
             }
-            for item in queue["queue"]
+            for item in playback["queue"]
         ]
-        cache.set(self._queue_cache_key, queue, 10)
-        return queue
+
+    def refresh_state(self):
+        """Fetch the playback and queue state from Marietje and update the cache."""
+        self._refresh_current_playback()
 
     def get_absolute_url(self):
         """Get the front-end url for a Player."""
@@ -591,24 +610,22 @@ class SpotifyPlayer(Player):
         """
         Get a spotipy SpotifyOAuth object from this database object.
 
+        The object is shared by all uses of this player within the process, see thaliedje.clients.
+
         :return: a spotipy SpotifyOAuth object
         """
-        return SpotifyOAuth(
-            client_id=self.client_id,
-            client_secret=self.client_secret,
-            redirect_uri=self.redirect_uri,
-            cache_path=self.cache_path,
-            scope=self.SCOPE,
-        )
+        return get_spotify_clients(self).auth
 
     @property
     def spotify(self):
         """
         Get a Spotify object with a SpotifyOAuth manager as authentication backend.
 
+        The object is shared by all uses of this player within the process, so its connections are kept alive.
+
         :return: a Spotipy Spotify object
         """
-        return Spotify(oauth_manager=self.auth)
+        return get_spotify_clients(self).spotify
 
     def do_spotify_request(self, func, *args, **kwargs):
         """
@@ -663,21 +680,26 @@ class SpotifyPlayer(Player):
             spotify_response["timestamp"] = int((before_call + after_call) / 2)
         return spotify_response
 
-    @property
-    def _current_playback(self):
-        """Get the current playback from the Spotify API."""
-        cached_result = cache.get(self._current_playback_cache_key)
-        if cached_result is not None:
-            if cached_result == "unavailable":
-                return None
-            return cached_result
-
+    def _refresh_current_playback(self):
+        """Get the current playback from the Spotify API and cache it."""
         playback = self._get_current_playback()
         if playback is None:
             cache.set(self._current_playback_cache_key, "unavailable", 5)
             return None
 
-        cache.set(self._current_playback_cache_key, playback, 5)
+        cache.set(
+            self._current_playback_cache_key, playback, PLAYER_STATE_CACHE_TIMEOUT
+        )
+        return playback
+
+    @property
+    def _current_playback(self):
+        """Get the current playback from the Spotify API."""
+        playback = get_or_refresh(
+            self._current_playback_cache_key, self._refresh_current_playback
+        )
+        if playback == "unavailable":
+            return None
         return playback
 
     @property
@@ -685,17 +707,14 @@ class SpotifyPlayer(Player):
         """Get the cache key for the queue."""
         return f"spotify_player_{self.id}_queue"
 
-    @property
-    def queue(self):
-        """Get the current queue of a player."""
-        cached_result = cache.get(self._queue_cache_key)
-        if cached_result is not None:
-            if cached_result == "unavailable":
-                return None
-            return cached_result
-
+    def _refresh_queue(self):
+        """Get the current queue from the Spotify API and cache it."""
         queue = self.do_spotify_request(self.spotify.queue)
 
+        if queue is None:
+            cache.set(self._queue_cache_key, "unavailable", PLAYER_STATE_CACHE_TIMEOUT)
+            return None
+
         queue = [
             {
                 "track_id": item["id"],
@@ -705,14 +724,22 @@ class SpotifyPlayer(Player):
             }
             for item in queue["queue"]
         ]
+        cache.set(self._queue_cache_key, queue, PLAYER_STATE_CACHE_TIMEOUT)
+        return queue
 
-        if queue is None:
-            cache.set(self._queue_cache_key, "unavailable", 10)
+    @property
+    def queue(self):
+        """Get the current queue of a player."""
+        queue = get_or_refresh(self._queue_cache_key, self._refresh_queue)
+        if queue == "unavailable":
             return None
-
-        cache.set(self._queue_cache_key, queue, 10)
         return queue
 
+    def refresh_state(self):
+        """Fetch the playback and queue state from Spotify and update the cache."""
+        self._refresh_current_playback()
+        self._refresh_queue()
+
     def request_song(self, track_id):
         """Queue a track.
 
@@ -917,16 +944,33 @@ class SpotifyPlayer(Player):
         )
         cache.delete(self._current_playback_cache_key)
 
+    @staticmethod
+    def _search_cache_key(query, maximum, query_type):
+        """Get the cache key for the results of a search query."""
+        digest = hashlib.sha256(
+            f"{query_type}:{maximum}:{query}".encode("utf-8")
+        ).hexdigest()
+        return f"spotify_search_{digest}"
+
     def search(self, query, maximum=5, query_type="track"):
         """
         Search SpotifyTracks for a search query.
 
+        Results are cached per normalized query, so repeated searches (for example while typing) only hit the Spotify
+        API once.
+
         :param query: the search query
         :param maximum: the maximum number of results to search for
         :param query_type: the type of the spotify instance to search
         :return: a list of tracks [{"name": the trackname, "artists": [a list of artist names],
          "id": the Spotify track id}]
         """
+        query = " ".join(query.lower().split())
+        cache_key = self._search_cache_key(query, maximum, query_type)
+        cached_result = cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
+
         results = self.do_spotify_request(
             self.spotify.search, q=query, limit=maximum, type=query_type
         )
@@ -983,6 +1027,7 @@ class SpotifyPlayer(Player):
                     for x in trimmed_result_for_key
                 ]
                 trimmed_result["playlists"] = trimmed_result_for_key
+        cache.set(cache_key, trimmed_result, SEARCH_CACHE_TIMEOUT)
         return trimmed_result
 
 
@@ -1003,11 +1048,30 @@ class SpotifyArtist(models.Model):
     @classmethod
     def get_or_create_from_spotify(cls, spotify_data):
         """Create a SpotifyArtist object from Spotify data."""
-        obj, _ = cls.objects.get_or_create(artist_id=spotify_data["id"])
-        if obj.artist_name != spotify_data["name"]:
-            obj.artist_name = spotify_data["name"]
-            obj.save()
-        return obj
+        return cls.bulk_create_from_spotify([spotify_data])[0]
+
+    @classmethod
+    def bulk_create_from_spotify(cls, spotify_data_list):
+        """
+        Create or update SpotifyArtist objects from Spotify data in a single upsert.
+
+        :param spotify_data_list: a list of Spotify artist objects
+        :return: a list of SpotifyArtist objects, one per distinct artist id in order of appearance
+        """
+        names = {x["id"]: x["name"] for x in spotify_data_list if x.get("id")}
+        if not names:
+            return []
+        cls.objects.bulk_create(
+            [
+                cls(artist_id=artist_id, artist_name=name)
+                for artist_id, name in names.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["artist_id"],
+            update_fields=["artist_name"],
+        )
+        artists = cls.objects.in_bulk(names.keys(), field_name="artist_id")
+        return [artists[artist_id] for artist_id in names.keys()]
 
 
 class SpotifyTrack(models.Model):
@@ -1030,33 +1094,104 @@ class SpotifyTrack(models.Model):
         """Get queryset of track_artists."""
         return self.track_artists.all()
 
+    @classmethod
+    def search(cls, query, maximum=5):
+        """
+        Search previously requested tracks for a search query.
+
+        A track matches if a word in its name or in the name of one of its artists starts with the query. This only
+        queries the database, so it can be used to show results while a search via the Spotify API is in progress.
+
+        :param query: the search query
+        :param maximum: the maximum number of results
+        :return: a list of tracks in the same format as the tracks in SpotifyPlayer.search, most requested first
+        """
+        query = " ".join(query.split())
+        if query == "":
+            return []
+
+        track_ids = (
+            cls.objects.filter(
+                Q(track_name__istartswith=query)
+                | Q(track_name__icontains=f" {query}")
+                | Q(track_artists__artist_name__istartswith=query)
+                | Q(track_artists__artist_name__icontains=f" {query}")
+            )
+            .values("id")
+            .distinct()
+        )
+        tracks = (
+            cls.objects.filter(id__in=track_ids)
+            .annotate(requested_amount=Count("requests"))
+            .order_by("-requested_amount", "track_name")
+            .prefetch_related("track_artists")[:maximum]
+        )
+        return [
+            {
+                "type": "track",
+                "name": track.track_name,
+                "artists": [artist.artist_name for artist in track.track_artists.all()],
+                "id": track.track_id,
+                "uri": f"spotify:track:{track.track_id}",
+                "image": None,
+            }
+            for track in tracks
+        ]
+
     @classmethod
     def get_or_create_from_spotify(cls, spotify_data):
         """Create a SpotifyTrack object from Spotify data."""
-        obj, _ = cls.objects.get_or_create(track_id=spotify_data["id"])
-        updated = False
+        return cls.bulk_create_from_spotify([spotify_data])[0]
+
+    @classmethod
+    def bulk_create_from_spotify(cls, spotify_data_list):
+        """
+        Create or update SpotifyTrack objects and their artists from Spotify data.
+
+        All tracks and artists are upserted at once and the links between them are added in a single insert, so the
+        number of queries does not depend on the number of tracks (for example when importing a playlist).
 
-        if obj.track_name != spotify_data["name"]:
-            obj.track_name = spotify_data["name"]
-            updated = True
+        :param spotify_data_list: a list of Spotify track objects
+        :return: a list of SpotifyTrack objects, one per distinct track id in order of appearance
+        """
+        tracks_data = {x["id"]: x for x in spotify_data_list if x.get("id")}
+        if not tracks_data:
+            return []
 
-        artists = (
+        artists = SpotifyArtist.bulk_create_from_spotify(
             [
-                SpotifyArtist.get_or_create_from_spotify(x)
-                for x in spotify_data["artists"]
+                artist_data
+                for track_data in tracks_data.values()
+                for artist_data in track_data.get("artists", [])
             ]
-            if "artists" in spotify_data.keys()
-            else []
         )
+        artist_pks = {artist.artist_id: artist.pk for artist in artists}
 
-        if set(obj.track_artists.all()) != set(artists):
-            [obj.track_artists.add(x) for x in artists]
-            updated = True
-
-        if updated:
-            obj.save()
+        cls.objects.bulk_create(
+            [
+                cls(track_id=track_id, track_name=track_data["name"])
+                for track_id, track_data in tracks_data.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["track_id"],
+            update_fields=["track_name"],
+        )
+        tracks = cls.objects.in_bulk(tracks_data.keys(), field_name="track_id")
 
-        return obj
+        through = cls.track_artists.through
+        through.objects.bulk_create(
+            [
+                through(spotifytrack_id=tracks[track_id].pk, spotifyartist_id=pk)
+                for track_id, track_data in tracks_data.items()
+                for pk in {
+                    artist_pks[x["id"]]
+                    for x in track_data.get("artists", [])
+                    if x.get("id")
+                }
+            ],
+            ignore_conflicts=True,
+        )
+        return [tracks[track_id] for track_id in tracks_data.keys()]
 
 
 class SpotifyQueueItem(models.Model):
@@ -1088,10 +1223,47 @@ class SpotifyQueueItem(models.Model):
         track = SpotifyTrack.get_or_create_from_spotify(spotify_data)
         return cls.objects.create(track=track, player=player, requested_by=user)
 
+    @staticmethod
+    def recent_request_times_cache_key(user_pk):
+        """Get the cache key for the recent song requests of a user."""
+        return f"thaliedje_song_requests_{user_pk}"
+
+    @classmethod
+    def recent_request_times(cls, user):
+        """
+        Get the times at which a user requested songs within the throttling window.
+
+        The request times are loaded from the database once and cached. The window slides over the cached times, so
+        the cache only has to be refreshed when the requests of the user change (see thaliedje.signals).
+
+        :param user: the user
+        :return: a list of request times, newest first
+        """
+        window_start = timezone.now() - SONG_REQUEST_THROTTLE_WINDOW
+        cache_key = cls.recent_request_times_cache_key(user.pk)
+        request_times = cache.get(cache_key)
+        if request_times is None:
+            request_times = list(
+                cls.objects.filter(requested_by=user, added__gte=window_start)
+                .order_by("-added")
+                .values_list("added", flat=True)
+            )
+            cache.set(
+                cache_key,
+                request_times,
+                SONG_REQUEST_THROTTLE_WINDOW.total_seconds(),
+            )
+        return [x for x in request_times if x >= window_start]
+
     class Meta:
         """Meta class."""
 
         ordering = ["-added"]
+        indexes = [
+            models.Index(
+                fields=["requested_by", "added"], name="queue_item_requested_by_added"
+            )
+        ]
 
 
 class ThaliedjeBlacklistedUser(models.Model):
@@ -1107,7 +1279,7 @@ class ThaliedjeBlacklistedUser(models.Model):
     @classmethod
     def user_is_blacklisted(cls, user):
         """Return if the user is on the blacklist."""
-        return cls.objects.filter(user=user).exists()
+        return get_blacklist(user).get("thaliedje", False)
 
     class Meta:
         """Meta class for ThaliedjeBlacklistedUser."""
@@ -1195,7 +1367,7 @@ class ThaliedjeControlEvent(models.Model):
             return True
         if self.selected_users_can_control and user in self.selected_users.all():
             return True
-        if user in self.admins.all():
+        if user in self.admins:
             return True
         return False
 
@@ -1212,7 +1384,7 @@ class ThaliedjeControlEvent(models.Model):
             return True
         if self.selected_users_can_request and user in self.selected_users.all():
             return True
-        if user in self.admins.all():
+        if user in self.admins:
             return True
         return False
 
@@ -1232,7 +1404,7 @@ class ThaliedjeControlEvent(models.Model):
             and user in self.selected_users.all()
         ):
             return True
-        if user in self.admins.all():
+        if user in self.admins:
             return True
         return False
 
@@ -1265,24 +1437,68 @@ class ThaliedjeControlEvent(models.Model):
         """Convert this object to string."""
         return f"Control event for {self.event}"
 
+    @staticmethod
+    def current_event_cache_key(player_pk):
+        """Get the cache key for the active ThaliedjeControlEvent of a Player."""
+        return f"thaliedje_control_event_{player_pk}"
+
+    @classmethod
+    def clear_current_event_cache(cls):
+        """Clear the cached active ThaliedjeControlEvent of all Players."""
+        cache.delete_many(
+            [
+                cls.current_event_cache_key(player_pk)
+                for player_pk in Player.objects.values_list("pk", flat=True)
+            ]
+        )
+
     @classmethod
     def current_event(cls, player):
         """
         Get the active ThaliedjeControlEvent for a Player.
 
+        The result is cached until the active event ends or the next event starts, with a maximum of
+        CONTROL_EVENT_CACHE_TIMEOUT. The event is cached with its reservation, selected users and admins, such that
+        permission checks on it do not query the database.
+
         :param player: the player
         :return: the active ThaliedjeControlEvent or None
         """
+        cache_key = cls.current_event_cache_key(player.id)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            event, valid_until = cached
+            if timezone.now() < valid_until:
+                return event
+
+        now = timezone.now()
+        valid_until = now + timedelta(seconds=CONTROL_EVENT_CACHE_TIMEOUT)
         try:
-            return cls.objects.get(player=player.id, active=True)
+            event = (
+                cls.objects.select_related("event__association")
+                .prefetch_related("selected_users", "event__users_access")
+                .get(player=player.id, active=True)
+            )
+            valid_until = min(valid_until, event.event.end)
         except cls.DoesNotExist:
-            return None
+            event = None
+            next_start = (
+                cls.objects.filter(event__venue__player=player.id, event__start__gt=now)
+                .order_by("event__start")
+                .values_list("event__start", flat=True)
+                .first()
+            )
+            if next_start is not None:
+                valid_until = min(valid_until, next_start)
         except cls.MultipleObjectsReturned:
             logging.error(
                 "Multiple active ThaliedjeControlEvents found for player %s", player
             )
             return None
 
+        cache.set(cache_key, (event, valid_until), CONTROL_EVENT_CACHE_TIMEOUT)
+        return event
+
     class Meta:
         """Meta class for ThaliedjeControlEvent."""
 
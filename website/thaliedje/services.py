@@ -13,6 +13,9 @@ from tosti.metrics import emit as emit_metric
 
 User = get_user_model()
 
+# The maximum number of song requests that is anonymised in a single query.
+DATA_MINIMISATION_CHUNK_SIZE = 1000
+
 
 def request_song(player, user, track_id):
     """Request a song."""
@@ -26,22 +29,39 @@ def request_song(player, user, track_id):
     return queued_track
 
 
+def data_minimisation_requests():
+    """Get the song requests that are more than 31 days old and still linked to a user."""
+    delete_before = timezone.now() - timedelta(days=31)
+    return SpotifyQueueItem.objects.filter(
+        added__lte=delete_before, requested_by__isnull=False
+    )
+
+
 def execute_data_minimisation(dry_run=False):
     """
     Remove song-request history from users that is more than 31 days old.
 
+    Requests are anonymised in chunks of DATA_MINIMISATION_CHUNK_SIZE, each in a separate UPDATE query, so rows are
+    not locked for the duration of the whole run.
+
     :param dry_run: does not really remove data if True
-    :return: list of users from who data is removed
+    :return: the number of users from who data is removed
     """
-    delete_before = timezone.now() - timedelta(days=31)
-    requests = SpotifyQueueItem.objects.filter(added__lte=delete_before)
-
-    users = []
-    for request in requests:
-        users.append(request.requested_by)
-        request.requested_by = None
-        if not dry_run:
-            request.save()
+    requests = data_minimisation_requests()
+
+    users = requests.values("requested_by").distinct().count()
+    if dry_run:
+        return users
+
+    while True:
+        chunk = list(
+            requests.order_by("pk").values_list("pk", flat=True)[
+                :DATA_MINIMISATION_CHUNK_SIZE
+            ]
+        )
+        if not chunk:
+            break
+        SpotifyQueueItem.objects.filter(pk__in=chunk).update(requested_by=None)
     return users
 
 
@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from thaliedje.clients import discard_marietje_client, discard_spotify_clients
+from thaliedje.models import (
+    MarietjePlayer,
+    SpotifyPlayer,
+    SpotifyQueueItem,
+    ThaliedjeBlacklistedUser,
+    ThaliedjeControlEvent,
+)
+from tosti.blacklist import (
+    clear_blacklist_cache_of_entry,
+    clear_blacklist_cache_of_moved_entry,
+)
+from venues.models import Reservation
+
+
+@receiver(post_delete, sender=SpotifyPlayer)
+def on_spotify_player_deleted(sender, instance, **kwargs):
+    """Discard the shared Spotify clients of a deleted player."""
+    discard_spotify_clients(instance.client_id)
+
+
+@receiver(post_delete, sender=MarietjePlayer)
+def on_marietje_player_deleted(sender, instance, **kwargs):
+    """Discard the shared Marietje client of a deleted player."""
+    discard_marietje_client(instance.pk)
+
+
+@receiver(post_save, sender=SpotifyQueueItem)
+@receiver(post_delete, sender=SpotifyQueueItem)
+def on_queue_item_changed(sender, instance, **kwargs):
+    """Clear the cached recent song requests of the requesting user."""
+    if instance.requested_by_id is not None:
+        cache.delete(
+            SpotifyQueueItem.recent_request_times_cache_key(instance.requested_by_id)
+        )
+
+
+@receiver(post_save, sender=ThaliedjeControlEvent)
+@receiver(post_delete, sender=ThaliedjeControlEvent)
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+@receiver(m2m_changed, sender=ThaliedjeControlEvent.selected_users.through)
+@receiver(m2m_changed, sender=Reservation.users_access.through)
+def on_control_event_changed(sender, **kwargs):
+    """Clear the cached active control events when an event or its reservation changes."""
+    ThaliedjeControlEvent.clear_current_event_cache()
+
+
+@receiver(post_save, sender=ThaliedjeBlacklistedUser)
+@receiver(post_delete, sender=ThaliedjeBlacklistedUser)
+def on_blacklist_changed(sender, instance, **kwargs):
+    """Clear the cached blacklist of the user of a changed blacklist entry."""
+    clear_blacklist_cache_of_entry(instance)
+
+
+@receiver(pre_save, sender=ThaliedjeBlacklistedUser)
+def on_blacklist_moving(sender, instance, **kwargs):
+    """Clear the cached blacklist of the previous user of a blacklist entry that moves to another user."""
+    clear_blacklist_cache_of_moved_entry(instance)
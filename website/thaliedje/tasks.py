@@ -1,23 +1,74 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
 from celery import shared_task
 from constance import config
+from django.db import connection
+
+from thaliedje.models import Player, SpotifyPlayer
+from tosti.metrics import distribution as record_metric, emit as emit_metric
+
+# The maximum number of seconds the scheduled music tasks wait for all players together.
+PLAYER_ACTION_TIMEOUT = 30
+PLAYER_ACTION_MAX_WORKERS = 8
+
+
+def _run_for_players(players, action):
+    """
+    Run an action for multiple players in parallel.
+
+    Players are handled in a thread pool, so a slow player does not delay the others. Players that did not finish
+    within PLAYER_ACTION_TIMEOUT are given up on.
 
-from thaliedje.models import SpotifyPlayer
-from tosti.metrics import emit as emit_metric
+    :param players: a list of players
+    :param action: function that is called with a player
+    :return: a tuple (succeeded, failed, timed_out) with the number of players for which the action succeeded, raised
+     an exception or did not finish in time
+    """
+    if not players:
+        return 0, 0, 0
+
+    def run(player):
+        try:
+            action(player)
+        finally:
+            connection.close()
+
+    executor = ThreadPoolExecutor(
+        max_workers=min(len(players), PLAYER_ACTION_MAX_WORKERS)
+    )
+    futures = {executor.submit(run, player): player for player in players}
+    done, not_done = wait(futures, timeout=PLAYER_ACTION_TIMEOUT)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    failed = 0
+    for future in done:
+        if future.exception() is not None:
+            logging.warning(
+                "Action failed for player %s: %s", futures[future], future.exception()
+            )
+            failed += 1
+    for future in not_done:
+        logging.warning("Action timed out for player %s", futures[future])
+    return len(done) - failed, failed, len(not_done)
 
 
 @shared_task
 def thaliedje_stop_music():
     """Stop the music."""
-    stopped = 0
-    failed = 0
-    for player in SpotifyPlayer.objects.all():
-        try:
-            player.pause()
-            stopped += 1
-        except Exception:
-            # Ignore errors when stopping the music
-            failed += 1
-    emit_metric("cron_stop_music_run", stopped=stopped, failed=failed)
+    start_time = time.monotonic()
+    stopped, failed, timed_out = _run_for_players(
+        list(SpotifyPlayer.objects.all()), lambda player: player.pause()
+    )
+    emit_metric(
+        "cron_stop_music_run", stopped=stopped, failed=failed, timed_out=timed_out
+    )
+    record_metric(
+        "cron_stop_music_duration",
+        (time.monotonic() - start_time) * 1000,
+        unit="millisecond",
+    )
 
 
 @shared_task
@@ -27,22 +78,36 @@ def thaliedje_start_music():
         emit_metric("cron_start_music_run", skipped_reason="holiday")
         return
 
-    started = 0
-    failed = 0
-    for player in SpotifyPlayer.objects.all():
+    start_player_uri = config.THALIEDJE_START_PLAYER_URI
+
+    def start(player):
+        player.repeat = "context"
+        player.shuffle = True
+
+        if start_player_uri is not None and start_player_uri != "":
+            player.start_playing(start_player_uri)
+        else:
+            player.start()
+
+    start_time = time.monotonic()
+    started, failed, timed_out = _run_for_players(
+        list(SpotifyPlayer.objects.all()), start
+    )
+    emit_metric(
+        "cron_start_music_run", started=started, failed=failed, timed_out=timed_out
+    )
+    record_metric(
+        "cron_start_music_duration",
+        (time.monotonic() - start_time) * 1000,
+        unit="millisecond",
+    )
+
+
+@shared_task
+def refresh_player_states():
+    """Refresh the cached playback and queue state of all players."""
+    for player in Player.objects.select_subclasses():
         try:
-            player.repeat = "context"
-            player.shuffle = True
-
-            if (
-                config.THALIEDJE_START_PLAYER_URI is not None
-                and config.THALIEDJE_START_PLAYER_URI != ""
-            ):
-                player.start_playing(config.THALIEDJE_START_PLAYER_URI)
-            else:
-                player.start()
-            started += 1
-        except Exception:
-            # Ignore errors when starting the music
-            failed += 1
-    emit_metric("cron_start_music_run", started=started, failed=failed)
+            player.refresh_state()
+        except Exception as e:
+            logging.warning("Failed to refresh the state of player %s: %s", player, e)
@@ -0,0 +1,142 @@
+"""Tests for the shared music player API clients."""
+
+import os
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from thaliedje.clients import (
+    SpotifyTokenCacheHandler,
+    discard_marietje_client,
+    discard_spotify_clients,
+)
+from thaliedje.models import MarietjePlayer, SpotifyPlayer
+
+
+class SpotifyClientsTests(TestCase):
+    """Tests for the per-process Spotify client registry."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        settings_override = override_settings(SPOTIFY_CACHE_PATH=self.cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(cache.clear)
+        self.player = SpotifyPlayer(
+            client_id="ci",
+            client_secret="cs",
+            redirect_uri="https://example.com/cb",
+            playback_device_id="dev-1",
+        )
+        self.addCleanup(discard_spotify_clients, "ci")
+
+    def test_clients_are_reused(self):
+        """Accessing the clients twice returns the same objects."""
+        self.assertIs(self.player.spotify, self.player.spotify)
+        self.assertIs(self.player.auth, self.player.auth)
+        self.assertIs(self.player.spotify.auth_manager, self.player.auth)
+
+    def test_clients_are_shared_between_instances(self):
+        """Two model instances for the same account share their clients."""
+        other = SpotifyPlayer(
+            client_id="ci",
+            client_secret="cs",
+            redirect_uri="https://example.com/cb",
+        )
+        self.assertIs(self.player.spotify, other.spotify)
+
+    def test_clients_rebuilt_on_credentials_change(self):
+        """Changing the credentials of a player builds new clients."""
+        spotify = self.player.spotify
+        self.player.client_secret = "other"
+        self.assertIsNot(self.player.spotify, spotify)
+        self.assertEqual(self.player.auth.client_secret, "other")
+
+
+class MarietjeClientTests(TestCase):
+    """Tests for the per-process Marietje client registry."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        settings_override = override_settings(MARIETJE_CACHE_PATH=self.cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.player = MarietjePlayer.objects.create(
+            slug="marietje",
+            url="https://marietje.example.com/",
+            client_id="ci",
+            client_secret="cs",
+        )
+        self.addCleanup(discard_marietje_client, self.player.pk)
+
+    def test_client_is_reused(self):
+        """Accessing the client twice returns the same client and session."""
+        self.assertIs(self.player.marietje, self.player.marietje)
+        self.assertIs(self.player.auth, self.player.marietje.auth_manager)
+
+    def test_client_rebuilt_on_credentials_change(self):
+        """Changing the credentials of a player builds a new client."""
+        marietje = self.player.marietje
+        self.player.url = "https://other.example.com/"
+        self.assertIsNot(self.player.marietje, marietje)
+        self.assertEqual(self.player.marietje.prefix, "https://other.example.com/")
+
+    def test_client_is_bounded(self):
+        """The client uses the configured timeout and a circuit breaker."""
+        with override_settings(MARIETJE_REQUESTS_TIMEOUT=1):
+            discard_marietje_client(self.player.pk)
+            marietje = self.player.marietje
+        self.assertEqual(marietje.requests_timeout, 1)
+        self.assertEqual(marietje.auth_manager.requests_timeout, 1)
+        self.assertIsNotNone(marietje.circuit_breaker)
+
+
+class SpotifyTokenCacheHandlerTests(TestCase):
+    """Tests for the in-memory Spotify token cache."""
+
+    def setUp(self):
+        self.cache_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        self.cache_file.close()
+        self.addCleanup(os.remove, self.cache_file.name)
+        self.addCleanup(cache.clear)
+        self.handler = SpotifyTokenCacheHandler("ci", self.cache_file.name)
+
+    def _token(self, access_token="token", expires_in=3600):
+        return {
+            "access_token": access_token,
+            "refresh_token": "refresh",
+            "expires_at": int(time.time()) + expires_in,
+        }
+
+    def test_token_saved_everywhere(self):
+        """A saved token is kept in memory, in the shared cache and on disk."""
+        token = self._token()
+        self.handler.save_token_to_cache(token)
+        self.assertEqual(self.handler.token_info, token)
+        self.assertEqual(cache.get(self.handler.cache_key), token)
+        self.assertEqual(self.handler.file_handler.get_cached_token(), token)
+
+    def test_valid_token_served_from_memory(self):
+        """A valid in-memory token does not touch the shared cache."""
+        token = self._token()
+        self.handler.save_token_to_cache(token)
+        cache.set(self.handler.cache_key, self._token("other"))
+        self.assertEqual(self.handler.get_cached_token(), token)
+
+    def test_expired_token_reloaded_from_shared_cache(self):
+        """An expired in-memory token is replaced by one refreshed elsewhere."""
+        self.handler.save_token_to_cache(self._token(expires_in=0))
+        refreshed = self._token("refreshed")
+        cache.set(self.handler.cache_key, refreshed)
+        self.assertEqual(self.handler.get_cached_token(), refreshed)
+
+    def test_token_loaded_from_file(self):
+        """Without a cached token, the token cache file is used and shared."""
+        token = self._token()
+        self.handler.file_handler.save_token_to_cache(token)
+        self.assertEqual(self.handler.get_cached_token(), token)
+        self.assertEqual(cache.get(self.handler.cache_key), token)
@@ -0,0 +1,77 @@
+"""Tests for the Marietje API client."""
+
+from unittest.mock import MagicMock, patch
+
+import requests
+from django.test import SimpleTestCase
+
+from thaliedje.marietje import CircuitBreaker, Marietje, MarietjeException
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """Tests for the circuit breaker."""
+
+    def test_opens_after_consecutive_failures(self):
+        """The circuit opens after the failure threshold is reached."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+
+    def test_success_resets_failures(self):
+        """A success in between failures keeps the circuit closed."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+
+    def test_single_request_allowed_after_reset_timeout(self):
+        """After the reset timeout, a single probing request is allowed."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        with patch("thaliedje.marietje.time.monotonic", return_value=100):
+            breaker.record_failure()
+        with patch("thaliedje.marietje.time.monotonic", return_value=131):
+            self.assertTrue(breaker.allow_request())
+            self.assertFalse(breaker.allow_request())
+            breaker.record_success()
+            self.assertTrue(breaker.allow_request())
+
+
+class MarietjeCircuitBreakerTests(SimpleTestCase):
+    """Tests for the circuit breaker of the Marietje client."""
+
+    def setUp(self):
+        self.session = MagicMock(spec=requests.Session)
+        self.marietje = Marietje(
+            "https://marietje.example.com",
+            auth="token",
+            requests_session=self.session,
+            circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30),
+        )
+
+    def test_network_errors_open_circuit(self):
+        """Once the circuit is open, Marietje is not called anymore."""
+        self.session.request.side_effect = requests.exceptions.ConnectTimeout
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.ConnectTimeout):
+                self.marietje.queue_current()
+
+        with self.assertRaises(MarietjeException) as context:
+            self.marietje.queue_current()
+        self.assertEqual(context.exception.http_status, 503)
+        self.assertEqual(self.session.request.call_count, 2)
+
+    def test_client_errors_do_not_open_circuit(self):
+        """Responses with a client error status do not count as failures."""
+        response = MagicMock(status_code=404, url="url", text="Not found")
+        response.json.side_effect = ValueError
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+            response=response
+        )
+        self.session.request.return_value = response
+        for _ in range(3):
+            with self.assertRaises(MarietjeException):
+                self.marietje.queue_current()
+        self.assertEqual(self.session.request.call_count, 3)
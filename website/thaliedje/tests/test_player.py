@@ -1,10 +1,33 @@
 """Tests for the Spotify/Marietje player models."""
 
-from unittest.mock import MagicMock, PropertyMock, patch
+import threading
+from datetime import timedelta
+from unittest.mock import ANY, MagicMock, PropertyMock, patch
 
+from constance.test import override_config
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from freezegun import freeze_time
+from spotipy import SpotifyException
 
-from thaliedje.models import SpotifyPlayer
+from thaliedje.models import (
+    MarietjePlayer,
+    SpotifyArtist,
+    SpotifyPlayer,
+    SpotifyQueueItem,
+    SpotifyTrack,
+    ThaliedjeControlEvent,
+)
+from thaliedje.tasks import (
+    refresh_player_states,
+    thaliedje_start_music,
+    thaliedje_stop_music,
+)
+from users.models import User
+from venues.models import Reservation, Venue
 
 
 class SpotifyPlayerRequestSongTests(TestCase):
@@ -94,3 +117,482 @@ class SpotifyPlayerRequestSongTests(TestCase):
         )
         self.assertNotIn(spotify.start_playback, called_funcs)
         self.assertNotIn(spotify.next_track, called_funcs)
+
+
+class PlayerStateRefreshTests(TestCase):
+    """Tests for refreshing the cached player state outside of requests."""
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.player = SpotifyPlayer.objects.create(
+            slug="player",
+            client_id="ci",
+            client_secret="cs",
+            redirect_uri="https://example.com/cb",
+            playback_device_id="dev-1",
+        )
+
+    def _spotify_stub(self):
+        spotify_stub = MagicMock()
+        # ``do_spotify_request`` logs the name of the function it calls.
+        spotify_stub.current_playback.__name__ = "current_playback"
+        spotify_stub.queue.__name__ = "queue"
+        spotify_stub.current_playback.return_value = {
+            "is_playing": True,
+            "item": {"name": "Track", "artists": [{"name": "Artist"}]},
+        }
+        spotify_stub.queue.return_value = {
+            "queue": [
+                {
+                    "id": "track-id",
+                    "name": "Queued",
+                    "artists": [{"name": "Artist"}],
+                    "duration_ms": 1000,
+                }
+            ]
+        }
+        return spotify_stub
+
+    def test_refresh_state_serves_requests_from_cache(self):
+        """After a refresh, reading the player state does not call Spotify."""
+        spotify_stub = self._spotify_stub()
+        with patch.object(
+            SpotifyPlayer,
+            "spotify",
+            new_callable=PropertyMock,
+            return_value=spotify_stub,
+        ):
+            self.player.refresh_state()
+            self.assertEqual(spotify_stub.current_playback.call_count, 1)
+            self.assertEqual(spotify_stub.queue.call_count, 1)
+
+            self.assertEqual(self.player.current_track_name, "Track")
+            self.assertTrue(self.player.is_playing)
+            self.assertEqual(self.player.queue[0]["track_name"], "Queued")
+            self.assertEqual(spotify_stub.current_playback.call_count, 1)
+            self.assertEqual(spotify_stub.queue.call_count, 1)
+
+    def test_refresh_state_unavailable_queue(self):
+        """A failing queue request is cached as unavailable."""
+        spotify_stub = self._spotify_stub()
+        spotify_stub.queue.return_value = None
+        with patch.object(
+            SpotifyPlayer,
+            "spotify",
+            new_callable=PropertyMock,
+            return_value=spotify_stub,
+        ):
+            self.player.refresh_state()
+            self.assertIsNone(self.player.queue)
+            self.assertEqual(spotify_stub.queue.call_count, 1)
+
+    def test_refresh_player_states_task(self):
+        """The periodic task refreshes all players and tolerates failures."""
+        with patch.object(
+            SpotifyPlayer, "refresh_state", side_effect=[RuntimeError, None]
+        ) as refresh_state:
+            SpotifyPlayer.objects.create(
+                slug="other-player",
+                client_id="other-ci",
+                client_secret="cs",
+                redirect_uri="https://example.com/cb",
+            )
+            refresh_player_states()
+        self.assertEqual(refresh_state.call_count, 2)
+
+
+class MarietjePlayerStateTests(TestCase):
+    """Tests for the cached playback and queue state of Marietje players."""
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.player = MarietjePlayer.objects.create(
+            slug="marietje",
+            url="https://marietje.example.com/",
+            client_id="ci",
+            client_secret="cs",
+        )
+        self.marietje_stub = MagicMock()
+        self.marietje_stub.queue_current.__name__ = "queue_current"
+        self.marietje_stub.queue_current.return_value = {
+            "current_song": {
+                "played_at": None,
+                "song": {"id": 1, "title": "Current", "artist": "A", "duration": 60},
+            },
+            "queue": [
+                {"song": {"id": 2, "title": "Next", "artist": "B", "duration": 90}}
+            ],
+        }
+        marietje_patch = patch.object(
+            MarietjePlayer,
+            "marietje",
+            new_callable=PropertyMock,
+            return_value=self.marietje_stub,
+        )
+        marietje_patch.start()
+        self.addCleanup(marietje_patch.stop)
+
+    def test_playback_and_queue_share_one_request(self):
+        """The current song and the queue come from a single Marietje call."""
+        self.assertEqual(self.player.current_track_name, "Current")
+        self.assertEqual(self.player.queue[0]["track_name"], "Next")
+        self.assertEqual(self.player.queue[0]["duration_ms"], 90000)
+        self.marietje_stub.queue_current.assert_called_once()
+
+    def test_unavailable_playback_and_queue(self):
+        """A failing Marietje call makes both the playback and the queue unavailable."""
+        self.marietje_stub.queue_current.return_value = None
+        self.assertIsNone(self.player.current_track_name)
+        self.assertIsNone(self.player.queue)
+        self.marietje_stub.queue_current.assert_called_once()
+
+
+class SpotifyPlayerSearchTests(TestCase):
+    """Tests for caching Spotify search results."""
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.player = SpotifyPlayer(
+            client_id="ci",
+            client_secret="cs",
+            redirect_uri="https://example.com/cb",
+        )
+
+    def test_search_results_cached_per_normalized_query(self):
+        """Searches that only differ in case and whitespace hit Spotify once."""
+        spotify_stub = MagicMock()
+        spotify_stub.search.__name__ = "search"
+        spotify_stub.search.return_value = {
+            "tracks": {
+                "items": [
+                    {
+                        "type": "track",
+                        "name": "Track",
+                        "artists": [{"name": "Artist"}],
+                        "id": "track-id",
+                        "uri": "spotify:track:track-id",
+                        "popularity": 50,
+                        "album": {"images": [{"url": "https://example.com/a.jpg"}]},
+                    }
+                ]
+            }
+        }
+        with patch.object(
+            SpotifyPlayer,
+            "spotify",
+            new_callable=PropertyMock,
+            return_value=spotify_stub,
+        ):
+            first = self.player.search("Some  Track")
+            second = self.player.search(" some track")
+            self.player.search("some track", maximum=10)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first["tracks"][0]["id"], "track-id")
+        self.assertEqual(spotify_stub.search.call_count, 2)
+        self.assertEqual(
+            spotify_stub.search.call_args_list[0].kwargs["q"], "some track"
+        )
+
+    def test_failed_search_not_cached(self):
+        """A failed search is retried on the next search."""
+        spotify_stub = MagicMock()
+        spotify_stub.search.__name__ = "search"
+        spotify_stub.search.side_effect = SpotifyException(500, -1, "error")
+        with patch.object(
+            SpotifyPlayer,
+            "spotify",
+            new_callable=PropertyMock,
+            return_value=spotify_stub,
+        ):
+            self.assertEqual(self.player.search("track"), [])
+            self.assertEqual(self.player.search("track"), [])
+        self.assertEqual(spotify_stub.search.call_count, 2)
+
+
+class SpotifyTrackSearchTests(TestCase):
+    """Tests for searching previously requested tracks."""
+
+    @classmethod
+    def setUpTestData(cls):
+        player = SpotifyPlayer.objects.create(
+            slug="player", client_id="ci", client_secret="cs"
+        )
+        artist = SpotifyArtist.objects.create(
+            artist_name="The Beatles", artist_id="beatles"
+        )
+        cls.help = SpotifyTrack.objects.create(track_name="Help!", track_id="help")
+        cls.help.track_artists.add(artist)
+        cls.here = SpotifyTrack.objects.create(
+            track_name="Here Comes The Sun", track_id="here"
+        )
+        cls.here.track_artists.add(artist)
+        cls.other = SpotifyTrack.objects.create(
+            track_name="Bohemian Rhapsody", track_id="bohemian"
+        )
+        for _ in range(2):
+            SpotifyQueueItem.objects.create(track=cls.here, player=player)
+        SpotifyQueueItem.objects.create(track=cls.help, player=player)
+
+    def test_matches_word_prefixes(self):
+        """Tracks match on the start of any word in their name."""
+        self.assertEqual(
+            [track["id"] for track in SpotifyTrack.search("rhap")], ["bohemian"]
+        )
+        self.assertEqual(
+            [track["id"] for track in SpotifyTrack.search("SUN")], ["here"]
+        )
+        self.assertEqual(SpotifyTrack.search("elp"), [])
+
+    def test_matches_artists_most_requested_first(self):
+        """Tracks match on their artists and are ordered by the number of requests."""
+        results = SpotifyTrack.search("beat")
+        self.assertEqual([track["id"] for track in results], ["here", "help"])
+        self.assertEqual(results[0]["artists"], ["The Beatles"])
+        self.assertEqual(results[0]["uri"], "spotify:track:here")
+        self.assertEqual(len(SpotifyTrack.search("beat", maximum=1)), 1)
+
+    def test_empty_query(self):
+        """An empty query does not match anything."""
+        self.assertEqual(SpotifyTrack.search("  "), [])
+
+
+class SpotifyTrackBulkCreateTests(TestCase):
+    """Tests for upserting tracks and artists from Spotify data."""
+
+    def _track(self, track_id, name, artists):
+        return {
+            "id": track_id,
+            "name": name,
+            "artists": [{"id": x.lower(), "name": x} for x in artists],
+        }
+
+    def test_bulk_create_in_constant_queries(self):
+        """Many tracks with shared artists are created in a fixed number of queries."""
+        data = [
+            self._track(f"track-{i}", f"Track {i}", ["Artist A", f"Artist {i}"])
+            for i in range(20)
+        ]
+        with self.assertNumQueries(5):
+            tracks = SpotifyTrack.bulk_create_from_spotify(data)
+        self.assertEqual([x.track_id for x in tracks], [x["id"] for x in data])
+        self.assertEqual(SpotifyArtist.objects.count(), 21)
+        self.assertEqual(
+            sorted(tracks[3].artists.values_list("artist_name", flat=True)),
+            ["Artist 3", "Artist A"],
+        )
+
+    def test_bulk_create_updates_existing(self):
+        """Existing tracks and artists are renamed and keep their links."""
+        track = SpotifyTrack.get_or_create_from_spotify(
+            self._track("track", "Old", ["Artist"])
+        )
+        data = self._track("track", "New", ["Artist", "Other"])
+        data["artists"][0]["name"] = "Renamed"
+        self.assertEqual(SpotifyTrack.get_or_create_from_spotify(data), track)
+        track.refresh_from_db()
+        self.assertEqual(track.track_name, "New")
+        self.assertEqual(
+            sorted(track.artists.values_list("artist_name", flat=True)),
+            ["Other", "Renamed"],
+        )
+        self.assertEqual(SpotifyTrack.objects.count(), 1)
+
+    def test_bulk_create_skips_duplicates_and_local_tracks(self):
+        """Duplicate tracks are upserted once and tracks without an id are skipped."""
+        data = [
+            self._track("track", "Track", ["Artist"]),
+            self._track(None, "Local file", []),
+            self._track("track", "Track", ["Artist"]),
+        ]
+        self.assertEqual(len(SpotifyTrack.bulk_create_from_spotify(data)), 1)
+        self.assertEqual(SpotifyTrack.bulk_create_from_spotify([]), [])
+
+
+class PlayerThrottleTests(TestCase):
+    """Tests for throttling song requests per user."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = SpotifyPlayer.objects.create(
+            slug="player", client_id="ci", client_secret="cs"
+        )
+        cls.user = User.objects.create_user(username="user", password="password")
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        cache.clear()
+
+    def _request(self, added=None):
+        item = SpotifyQueueItem.objects.create(
+            player=self.player, requested_by=self.user
+        )
+        if added is not None:
+            SpotifyQueueItem.objects.filter(pk=item.pk).update(added=added)
+            cache.delete(SpotifyQueueItem.recent_request_times_cache_key(self.user.pk))
+        return item
+
+    @override_config(THALIEDJE_MAX_SONG_REQUESTS_PER_HOUR=2)
+    def test_throttled_after_maximum_requests(self):
+        """A user is throttled once they made the maximum number of requests."""
+        self._request(added=timezone.now() - timedelta(hours=2))
+        self._request()
+        self.assertFalse(self.player.user_is_throttled(self.user))
+        self._request()
+        self.assertTrue(self.player.user_is_throttled(self.user))
+
+    @override_config(THALIEDJE_MAX_SONG_REQUESTS_PER_HOUR=2)
+    def test_throttle_check_served_from_cache(self):
+        """Repeated checks do not query the requests in the database."""
+        self._request()
+        self.player.user_is_throttled(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(self.player.user_is_throttled(self.user))
+        self.assertFalse(any("thaliedje_spotifyqueueitem" in x["sql"] for x in queries))
+
+    @override_config(THALIEDJE_MAX_SONG_REQUESTS_PER_HOUR=1)
+    def test_window_slides_over_cached_requests(self):
+        """Requests that leave the window no longer count without reloading."""
+        self._request(added=timezone.now() - timedelta(minutes=59))
+        self.assertTrue(self.player.user_is_throttled(self.user))
+        with patch(
+            "thaliedje.models.timezone.now",
+            return_value=timezone.now() + timedelta(minutes=2),
+        ):
+            self.assertFalse(self.player.user_is_throttled(self.user))
+
+    @override_config(THALIEDJE_MAX_SONG_REQUESTS_PER_HOUR=1)
+    def test_deleted_request_no_longer_counts(self):
+        """Deleting a request clears the cached requests of the user."""
+        item = self._request()
+        self.assertTrue(self.player.user_is_throttled(self.user))
+        item.delete()
+        self.assertFalse(self.player.user_is_throttled(self.user))
+
+
+class PlayerControlEventTests(TestCase):
+    """Tests for the cached active control event of a player."""
+
+    fixtures = ["venues.json"]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.venue = Venue.objects.first()
+        cls.player = SpotifyPlayer.objects.create(
+            slug="player", client_id="ci", client_secret="cs", venue=cls.venue
+        )
+        cls.user = User.objects.create_user(username="user", password="password")
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        cache.clear()
+
+    def _control_event(self, start, end, **kwargs):
+        reservation = Reservation.objects.create(
+            title="Event", venue=self.venue, start=start, end=end, accepted=True
+        )
+        return ThaliedjeControlEvent.objects.create(event=reservation, **kwargs)
+
+    def _player(self):
+        return SpotifyPlayer.objects.get(pk=self.player.pk)
+
+    def test_active_event_cached_with_permissions(self):
+        """Permission checks on a cached event do not query the database."""
+        now = timezone.now()
+        event = self._control_event(
+            now - timedelta(hours=1),
+            now + timedelta(hours=1),
+            selected_users_can_request=True,
+        )
+        event.selected_users.add(self.user)
+        self.assertEqual(self._player().active_control_event, event)
+
+        player = self._player()
+        with self.assertNumQueries(0):
+            self.assertEqual(player.active_control_event, event)
+            self.assertTrue(player.active_control_event.can_request_song(self.user))
+            self.assertFalse(player.active_control_event.can_control_player(self.user))
+
+    def test_cache_cleared_on_event_change(self):
+        """Changing an event or its selected users clears the cached event."""
+        now = timezone.now()
+        event = self._control_event(
+            now - timedelta(hours=1),
+            now + timedelta(hours=1),
+            selected_users_can_request=True,
+        )
+        self.assertFalse(self._player().can_request_song(self.user))
+        event.selected_users.add(self.user)
+        self.assertTrue(self._player().can_request_song(self.user))
+        event.delete()
+        self.assertIsNone(self._player().active_control_event)
+
+    def test_cache_expires_at_event_boundaries(self):
+        """A cached event stops applying when it ends, and a new one when it starts."""
+        now = timezone.now()
+        event = self._control_event(
+            now - timedelta(hours=1), now + timedelta(minutes=1)
+        )
+        next_event = self._control_event(
+            now + timedelta(minutes=2), now + timedelta(hours=1)
+        )
+        self.assertEqual(self._player().active_control_event, event)
+        with freeze_time(now + timedelta(seconds=90)):
+            self.assertIsNone(self._player().active_control_event)
+        with freeze_time(now + timedelta(minutes=3)):
+            self.assertEqual(self._player().active_control_event, next_event)
+
+
+class MusicTaskTests(TestCase):
+    """Tests for the scheduled tasks that start and stop the music."""
+
+    def setUp(self):
+        for slug in ["ok", "failing", "slow"]:
+            SpotifyPlayer.objects.create(
+                slug=slug, client_id=f"ci-{slug}", client_secret="cs"
+            )
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def _pause(self, player):
+        if player.slug == "failing":
+            raise SpotifyException(500, -1, "error")
+        if player.slug == "slow":
+            self.release.wait(5)
+
+    def test_stop_music_bounded_by_timeout(self):
+        """A slow player does not block the others and is reported as timed out."""
+        with (
+            patch.object(SpotifyPlayer, "pause", autospec=True) as pause,
+            patch("thaliedje.tasks.PLAYER_ACTION_TIMEOUT", 0.2),
+            patch("thaliedje.tasks.emit_metric") as emit_metric,
+            patch("thaliedje.tasks.record_metric") as record_metric,
+        ):
+            pause.side_effect = self._pause
+            thaliedje_stop_music()
+        self.assertEqual(pause.call_count, 3)
+        emit_metric.assert_called_once_with(
+            "cron_stop_music_run", stopped=1, failed=1, timed_out=1
+        )
+        record_metric.assert_called_once()
+        self.assertEqual(record_metric.call_args.args[0], "cron_stop_music_duration")
+        self.assertLess(record_metric.call_args.args[1], 5000)
+        self.assertEqual(record_metric.call_args.kwargs, {"unit": "millisecond"})
+
+    @override_config(THALIEDJE_START_PLAYER_URI="spotify:playlist:start")
+    def test_start_music_starts_all_players(self):
+        """Every player is started with the configured context."""
+        with (
+            patch.object(SpotifyPlayer, "start_playing", autospec=True) as start,
+            patch.object(SpotifyPlayer, "repeat", new_callable=PropertyMock),
+            patch.object(SpotifyPlayer, "shuffle", new_callable=PropertyMock),
+            patch("thaliedje.tasks.emit_metric") as emit_metric,
+            patch("thaliedje.tasks.record_metric") as record_metric,
+        ):
+            thaliedje_start_music()
+        self.assertEqual(start.call_count, 3)
+        start.assert_called_with(ANY, "spotify:playlist:start")
+        emit_metric.assert_called_once_with(
+            "cron_start_music_run", started=3, failed=0, timed_out=0
+        )
+        self.assertEqual(record_metric.call_args.args[0], "cron_start_music_duration")
@@ -0,0 +1,51 @@
+import logging
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from thaliedje import services
+from thaliedje.models import SpotifyPlayer, SpotifyQueueItem
+
+User = get_user_model()
+logging.disable()
+
+
+class ThaliedjeServicesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = SpotifyPlayer.objects.create(
+            slug="player", client_id="ci", client_secret="cs"
+        )
+        cls.user_1 = User.objects.create_user(username="user_1", password="password")
+        cls.user_2 = User.objects.create_user(username="user_2", password="password")
+        old = timezone.now() - timedelta(days=60)
+        for user in [cls.user_1, cls.user_1, cls.user_2, None]:
+            item = SpotifyQueueItem.objects.create(player=cls.player, requested_by=user)
+            SpotifyQueueItem.objects.filter(pk=item.pk).update(added=old)
+        cls.recent = SpotifyQueueItem.objects.create(
+            player=cls.player, requested_by=cls.user_1
+        )
+
+    def test_execute_data_minimisation_dry_run(self):
+        """A dry run counts the affected users without removing data."""
+        self.assertEqual(services.execute_data_minimisation(dry_run=True), 2)
+        self.assertEqual(
+            SpotifyQueueItem.objects.filter(requested_by__isnull=False).count(), 4
+        )
+
+    def test_execute_data_minimisation(self):
+        """Old requests are anonymised in chunks and recent requests are kept."""
+        with patch.object(services, "DATA_MINIMISATION_CHUNK_SIZE", 2):
+            self.assertEqual(services.execute_data_minimisation(), 2)
+        self.assertEqual(
+            list(
+                SpotifyQueueItem.objects.filter(requested_by__isnull=False).values_list(
+                    "pk", flat=True
+                )
+            ),
+            [self.recent.pk],
+        )
+        self.assertEqual(services.execute_data_minimisation(), 0)
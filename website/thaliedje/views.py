@@ -51,7 +51,7 @@ class NowPlayingView(TemplateView):
             context["current_venue_reservation"] = venue_reservation
 
         control_event = player.active_control_event
-        if control_event and self.request.user in control_event.admins.all():
+        if control_event and self.request.user in control_event.admins:
             context["current_control_event"] = control_event
 
         if self.request.user.is_authenticated:
@@ -0,0 +1,91 @@
+from django.apps import apps
+from django.core.cache import cache
+
+# Attribute on a user instance holding its blacklist for the rest of the request
+BLACKLIST_ATTRIBUTE = "_blacklist"
+
+# Blacklist of users that are not on any blacklist
+EMPTY_BLACKLIST = {}
+
+
+def blacklist_cache_key(user_pk):
+    """Get the cache key of the blacklist of a user."""
+    return f"tosti_blacklist_{user_pk}"
+
+
+def clear_blacklist_cache(user_pk, user=None):
+    """
+    Clear the cached blacklist of a user.
+
+    :param user_pk: the primary key of the user
+    :param user: optionally, a user instance on which the blacklist is kept as well
+    """
+    cache.delete(blacklist_cache_key(user_pk))
+    if user is not None and hasattr(user, BLACKLIST_ATTRIBUTE):
+        delattr(user, BLACKLIST_ATTRIBUTE)
+
+
+def clear_blacklist_cache_of_entry(entry):
+    """
+    Clear the cached blacklist of the user of a blacklist entry, for post_save and post_delete receivers of apps.
+
+    :param entry: a model instance with a user foreign key
+    """
+    user = entry.user if type(entry).user.is_cached(entry) else None
+    clear_blacklist_cache(entry.user_id, user)
+
+
+def clear_blacklist_cache_of_moved_entry(entry):
+    """
+    Clear the cached blacklist of the previous user of a blacklist entry that moves to another user.
+
+    This is meant for pre_save receivers of apps, as the previous user is only known before the entry is saved.
+
+    :param entry: a model instance with a user foreign key
+    """
+    if entry.pk is None:
+        return
+    previous_user_pk = (
+        type(entry)
+        .objects.filter(pk=entry.pk)
+        .values_list("user_id", flat=True)
+        .first()
+    )
+    if previous_user_pk is not None and previous_user_pk != entry.user_id:
+        clear_blacklist_cache(previous_user_pk)
+
+
+def _load_blacklist(user):
+    """Load the blacklist of a user from the apps that implement the blacklist hook."""
+    return {
+        app.label: app.blacklist(user)
+        for app in apps.get_app_configs()
+        if hasattr(app, "blacklist")
+    }
+
+
+def get_blacklist(user):
+    """
+    Get on which blacklists a user is.
+
+    Apps contribute to the blacklist with a `blacklist(user)` app config hook, of which the value is kept under the
+    label of the app. The blacklist is cached until one of the blacklist entries of the user changes (the apps clear it
+    with clear_blacklist_cache_of_entry), and kept on the user instance, so it is only looked up once per request.
+
+    :param user: the user
+    :return: dict with per app label the value of its blacklist hook, which is empty for anonymous users
+    """
+    if not user.is_authenticated:
+        return EMPTY_BLACKLIST
+
+    if hasattr(user, BLACKLIST_ATTRIBUTE):
+        return getattr(user, BLACKLIST_ATTRIBUTE)
+
+    key = blacklist_cache_key(user.pk)
+    blacklist = cache.get(key)
+    if blacklist is None:
+        blacklist = _load_blacklist(user)
+        cache.set(key, blacklist, None)
+
+    setattr(user, BLACKLIST_ATTRIBUTE, blacklist)
+    return blacklist
@@ -0,0 +1,77 @@
+import time
+import uuid
+
+from django.core.cache import cache, caches
+
+# Per-process cache in front of the shared cache, for values that never change once written
+local_cache = caches["local"]
+
+
+def get_or_refresh(key, refresh, lock_timeout=10, wait_timeout=5, poll_interval=0.05):
+    """
+    Get a value from the cache, letting only a single caller refresh it when it is missing.
+
+    When the key is missing, the first caller to acquire a lock in the cache calls refresh, which is responsible for
+    writing the new value to the cache. Other callers, also in other processes, wait for that value to appear instead
+    of calling refresh themselves. This guarantees at most one refresh per key at a time, as long as refresh finishes
+    within lock_timeout.
+
+    The lock holds a token that is unique to the caller, so a caller whose refresh took longer than lock_timeout does
+    not release a lock that another caller acquired after the lock expired.
+
+    :param key: the cache key
+    :param refresh: function that computes the value, writes it to the cache under key and returns it
+    :param lock_timeout: the number of seconds after which the lock expires, in case its holder dies
+    :param wait_timeout: the maximum number of seconds to wait for another caller to refresh the value
+    :param poll_interval: the number of seconds to wait between checks of the cache while waiting
+    :return: the cached or refreshed value, or None if waiting for another caller timed out
+    """
+    lock_key = f"{key}_refresh_lock"
+    deadline = time.monotonic() + wait_timeout
+    while True:
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+        token = uuid.uuid4().hex
+        if cache.add(lock_key, token, lock_timeout):
+            try:
+                return refresh()
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(poll_interval)
+
+
+def get_immutable(key):
+    """
+    Get a value that never changes once written, from the local cache if possible.
+
+    Only use this for keys of which the value is never changed, like keys that include a version or a hash of the
+    value. Values are kept in the local cache of this process for at most its default timeout, as they may still
+    expire or be deleted from the shared cache.
+
+    :param key: the cache key
+    :return: the cached value, or None if it is not cached
+    """
+    value = local_cache.get(key)
+    if value is None:
+        value = cache.get(key)
+        if value is not None:
+            local_cache.set(key, value)
+    return value
+
+
+def set_immutable(key, value, timeout=None):
+    """
+    Set a value that never changes once written, in both the shared and the local cache.
+
+    :param key: the cache key
+    :param value: the value
+    :param timeout: the timeout in the shared cache, in seconds (None for no timeout)
+    """
+    cache.set(key, value, timeout)
+    local_cache.set(key, value)
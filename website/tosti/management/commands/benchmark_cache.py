@@ -0,0 +1,78 @@
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import BaseCommand
+
+from tosti.cache import get_immutable, set_immutable
+
+
+@contextmanager
+def _file_based_cache():
+    """Create a temporary file based cache, the cache that was used in production before."""
+    with tempfile.TemporaryDirectory() as directory:
+        yield FileBasedCache(directory, {})
+
+
+class Command(BaseCommand):
+    """Benchmark the configured caches against a file based cache."""
+
+    help = "Benchmark the configured caches against a file based cache."
+
+    def add_arguments(self, parser):
+        """Arguments for the command."""
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            dest="iterations",
+            default=1000,
+            help="Number of times every operation is run",
+        )
+
+    def _benchmark(self, operation, iterations):
+        """Return the average duration of an operation in microseconds."""
+        start = time.perf_counter()
+        for i in range(iterations):
+            operation(i)
+        return (time.perf_counter() - start) / iterations * 1_000_000
+
+    def _benchmark_cache(self, name, cache, iterations):
+        """Benchmark the common operations on a cache."""
+        value = {"playback": ["track"] * 20, "is_playing": True}
+        keys = [f"benchmark_{i}" for i in range(iterations)]
+        results = {
+            "set": self._benchmark(lambda i: cache.set(keys[i], value), iterations),
+            "get": self._benchmark(lambda i: cache.get(keys[i]), iterations),
+            "get (miss)": self._benchmark(
+                lambda i: cache.get(f"benchmark_missing_{i}"), iterations
+            ),
+        }
+        cache.delete_many(keys)
+
+        cache.set("benchmark_counter", 0)
+        results["incr"] = self._benchmark(
+            lambda i: cache.incr("benchmark_counter"), iterations
+        )
+        cache.delete("benchmark_counter")
+
+        for operation, duration in results.items():
+            self.stdout.write(f"{name:<24} {operation:<20} {duration:>10.1f} µs")
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        iterations = options["iterations"]
+        with _file_based_cache() as file_based_cache:
+            self._benchmark_cache("file based", file_based_cache, iterations)
+        for alias in settings.CACHES:
+            self._benchmark_cache(alias, caches[alias], iterations)
+
+        value = {"announcements": ["announcement"] * 5}
+        set_immutable("benchmark_immutable", value)
+        duration = self._benchmark(
+            lambda i: get_immutable("benchmark_immutable"), iterations
+        )
+        caches["default"].delete("benchmark_immutable")
+        self.stdout.write(f"{'default + local':<24} {'get':<20} {duration:>10.1f} µs")
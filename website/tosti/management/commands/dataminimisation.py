@@ -2,7 +2,7 @@ import logging
 
 from django.core.management import BaseCommand
 
-from tosti.services import data_minimisation
+from tosti.services import data_minimisation, data_minimisation_report
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +19,25 @@ class Command(BaseCommand):
             default=False,
             help="Dry run instead of saving data",
         )
+        parser.add_argument(
+            "--samples",
+            type=int,
+            dest="samples",
+            default=0,
+            help="Number of affected usernames to show per category in a dry run",
+        )
 
     def handle(self, *args, **options):
         """Execute the command."""
-        data_minimisation(options["dry-run"])
+        if options["dry-run"]:
+            report = data_minimisation_report(samples=options["samples"])
+            for category, category_report in report.items():
+                self.stdout.write(
+                    "{}: {} users affected".format(category, category_report["count"])
+                )
+                for username in category_report["samples"]:
+                    self.stdout.write("  {}".format(username))
+        else:
+            counts = data_minimisation()
+            for category, count in counts.items():
+                self.stdout.write("{}: {} users affected".format(category, count))
@@ -1,11 +1,385 @@
+"""
+Metrics, sent to Sentry and exported to Prometheus in batches.
+
+Metrics are emitted on hot paths, like every request, order and transaction. Instead of calling Sentry for every
+metric, they are aggregated in an in-process buffer per event and attribute set, which a background thread flushes
+every FLUSH_INTERVAL seconds. Emitting a metric only costs a dictionary update. Measurements of distributions are not
+kept individually, but summarised in their count, sum, minimum, maximum and histogram buckets, which are sent to Sentry
+as the `<event>_count`, `<event>_sum`, `<event>_min` and `<event>_max` metrics.
+
+On every flush, the metrics are also added to counters and histograms in the Django cache, which is shared by all
+workers (and Celery). These are served in the Prometheus text format on /metrics by the HealthCheckMiddleware. As
+workers increment the same counters concurrently, this is only done if the cache increments atomically (see
+ATOMIC_INCR_CACHE_BACKENDS).
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import PyLibMCCache, PyMemcacheCache
+from django.core.cache.backends.redis import RedisCache
+
 try:
     from sentry_sdk import metrics as _metrics
 except ImportError:
     _metrics = None
 
+logger = logging.getLogger(__name__)
+
+# The number of seconds between flushes of the buffered metrics
+FLUSH_INTERVAL = 10
+
+# The maximum number of counters and distributions that is buffered, metrics of new series are dropped beyond this
+MAX_BUFFERED = 10000
+
+# Upper bounds of the buckets of the exported histograms
+HISTOGRAM_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Cache key of the set of all exported series
+SERIES_CACHE_KEY = "metrics_series"
+
+# Prefix of the names of the exported metrics
+EXPORT_PREFIX = "tosti_"
+
+# Cache backends that increment atomically and do not cull keys when they are full, so concurrent workers do not lose
+# increments. The local memory cache is only shared by the threads of one process, which is fine for development.
+ATOMIC_INCR_CACHE_BACKENDS = (RedisCache, PyMemcacheCache, PyLibMCCache, LocMemCache)
+
+
+def _attributes_key(attributes: dict) -> tuple:
+    return tuple(sorted((k, v) for k, v in attributes.items() if v is not None))
+
+
+class DistributionSummary:
+    """Summary of the measurements of a distribution: their count, sum, minimum, maximum and histogram buckets."""
+
+    __slots__ = ("count", "sum", "min", "max", "buckets")
+
+    def __init__(self, values=()):
+        """
+        Initialize the summary.
+
+        :param values: the measurements to add to the summary
+        """
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.buckets = Counter()
+        for value in values:
+            self.add(value)
+
+    def add(self, value: float) -> None:
+        """Add a measurement."""
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.buckets[bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+
+    def __eq__(self, other):
+        if not isinstance(other, DistributionSummary):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self):
+        return f"DistributionSummary(count={self.count}, sum={self.sum}, min={self.min}, max={self.max})"
+
+
+class MetricsBuffer:
+    """
+    Buffer that aggregates metrics until they are flushed by a background thread.
+
+    Counters with the same event and attributes are summed, and measurements of distributions with the same event, unit
+    and attributes are summarised, so the memory used by the buffer only depends on the number of series. When the sink
+    cannot keep up and the buffer is full, metrics of new series are dropped instead of slowing down the callers.
+    """
+
+    def __init__(self, sinks, flush_interval=FLUSH_INTERVAL, max_buffered=MAX_BUFFERED):
+        """
+        Initialize the buffer.
+
+        :param sinks: the sinks to flush the metrics to, objects with a `write(counters, distributions)` method
+        :param flush_interval: the number of seconds between flushes
+        :param max_buffered: the maximum number of counters and distributions to buffer
+        """
+        self.sinks = list(sinks)
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._counters = dict()
+        self._distributions = dict()
+        self._buffered = 0
+        self._thread = None
+        self._stopped = threading.Event()
+        if hasattr(os, "register_at_fork"):
+            # Forked workers (like uWSGI workers) do not inherit the flush thread, nor should they flush the metrics of
+            # the parent again.
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._counters = dict()
+        self._distributions = dict()
+        self._buffered = 0
+        self.dropped = 0
+        self._thread = None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="metrics-flush", daemon=True
+            )
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def count(self, event: str, value: float, attributes: tuple) -> None:
+        """Add a value to a counter."""
+        if self._thread is None:
+            self._start()
+        key = (event, attributes)
+        with self._lock:
+            if key in self._counters:
+                self._counters[key] += value
+            elif self._buffered < self.max_buffered:
+                self._counters[key] = value
+                self._buffered += 1
+            else:
+                self.dropped += 1
+
+    def distribution(
+        self, event: str, value: float, unit: str | None, attributes: tuple
+    ) -> None:
+        """Add a measurement to a distribution."""
+        if self._thread is None:
+            self._start()
+        key = (event, unit, attributes)
+        with self._lock:
+            summary = self._distributions.get(key)
+            if summary is None:
+                if self._buffered >= self.max_buffered:
+                    self.dropped += 1
+                    return
+                summary = self._distributions[key] = DistributionSummary()
+                self._buffered += 1
+            summary.add(value)
+
+    def flush(self) -> None:
+        """Send all buffered metrics to the sinks."""
+        with self._lock:
+            counters, self._counters = self._counters, dict()
+            distributions, self._distributions = self._distributions, dict()
+            self._buffered = 0
+            dropped, self.dropped = self.dropped, 0
+
+        if dropped:
+            logger.warning("Dropped %d metrics because the buffer was full", dropped)
+        if not counters and not distributions:
+            return
+        for sink in self.sinks:
+            try:
+                sink.write(counters, distributions)
+            except Exception:  # a failing sink must never stop the flush thread
+                logger.exception("Failed to flush metrics to %s", sink)
+
+
+class SentrySink:
+    """Sink that sends metrics to Sentry."""
+
+    def write(self, counters: dict, distributions: dict) -> None:
+        """Send the counters and the summaries of the distributions to Sentry."""
+        for (event, attributes), value in counters.items():
+            _metrics.count(event, value, attributes=dict(attributes) or None)
+        for (event, unit, attributes), summary in distributions.items():
+            attributes = dict(attributes) or None
+            _metrics.count(f"{event}_count", summary.count, attributes=attributes)
+            _metrics.count(
+                f"{event}_sum", summary.sum, unit=unit, attributes=attributes
+            )
+            _metrics.gauge(
+                f"{event}_min", summary.min, unit=unit, attributes=attributes
+            )
+            _metrics.gauge(
+                f"{event}_max", summary.max, unit=unit, attributes=attributes
+            )
+
+
+class CacheMetricsStore:
+    """
+    Sink that adds metrics to counters and histograms in the Django cache, for the Prometheus export.
+
+    The cache is shared by all workers, so the exported metrics are aggregated across workers. Counters and histogram
+    buckets are integers that are only ever incremented. Sums of histograms are kept in thousandths.
+
+    Series that could not be registered for the export, because another worker was registering series at the same
+    time, are kept and registered on a following flush.
+    """
+
+    def __init__(self):
+        """Initialize the store."""
+        self._unregistered = set()
+
+    @staticmethod
+    def is_supported() -> bool:
+        """Whether the default cache increments atomically, which the store needs."""
+        return isinstance(caches["default"], ATOMIC_INCR_CACHE_BACKENDS)
+
+    @staticmethod
+    def series_key(series: tuple) -> str:
+        """Get the cache key prefix of a series."""
+        return f"metrics_{hashlib.sha1(repr(series).encode()).hexdigest()}"
+
+    @staticmethod
+    def _increment(key: str, value: int) -> None:
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            if not cache.add(key, value, None):
+                cache.incr(key, value)
+
+    def _register(self, series: set) -> None:
+        series = series | self._unregistered
+        registered = cache.get(SERIES_CACHE_KEY) or set()
+        if series <= registered:
+            self._unregistered = set()
+            return
+        lock_key = f"{SERIES_CACHE_KEY}_lock"
+        if not cache.add(lock_key, True, 10):
+            # Another worker is registering series, these are retried on the next flush.
+            self._unregistered = series - registered
+            return
+        try:
+            registered = cache.get(SERIES_CACHE_KEY) or set()
+            cache.set(SERIES_CACHE_KEY, registered | series, None)
+            self._unregistered = set()
+        finally:
+            cache.delete(lock_key)
+
+    def write(self, counters: dict, distributions: dict) -> None:
+        """Add the counters and distributions to the counters and histograms in the cache."""
+        series = set()
+        for (event, attributes), value in counters.items():
+            counter = ("counter", event, None, attributes)
+            series.add(counter)
+            self._increment(self.series_key(counter), int(value))
+
+        for (event, unit, attributes), summary in distributions.items():
+            histogram = ("histogram", event, unit, attributes)
+            series.add(histogram)
+            key = self.series_key(histogram)
+            for bucket, count in summary.buckets.items():
+                self._increment(f"{key}_bucket_{bucket}", count)
+            self._increment(f"{key}_count", summary.count)
+            self._increment(f"{key}_sum", round(summary.sum * 1000))
+
+        self._register(series)
+
+
+def _export_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _export_labels(attributes: tuple) -> str:
+    if not attributes:
+        return ""
+    labels = (
+        '{}="{}"'.format(
+            _export_name(str(name)),
+            str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\""),
+        )
+        for name, value in attributes
+    )
+    return "{" + ",".join(labels) + "}"
+
+
+def _export_series(kind, event, unit, attributes, values) -> tuple:
+    key = CacheMetricsStore.series_key((kind, event, unit, attributes))
+    name = EXPORT_PREFIX + _export_name(event)
+    if unit is not None:
+        name += f"_{_export_name(unit)}s"
+
+    if kind == "counter":
+        name += "_total"
+        return name, [f"{name}{_export_labels(attributes)} {values.get(key, 0)}"]
+
+    lines = []
+    cumulative = 0
+    for bucket, bound in enumerate(HISTOGRAM_BUCKETS + (None,)):
+        cumulative += values.get(f"{key}_bucket_{bucket}", 0)
+        le = "+Inf" if bound is None else str(float(bound))
+        lines.append(
+            f"{name}_bucket{_export_labels(attributes + (('le', le),))} {cumulative}"
+        )
+    labels = _export_labels(attributes)
+    lines.append(f"{name}_sum{labels} {values.get(f'{key}_sum', 0) / 1000}")
+    lines.append(f"{name}_count{labels} {values.get(f'{key}_count', 0)}")
+    return name, lines
+
+
+def export_prometheus() -> str:
+    """
+    Export the metrics of all workers.
+
+    :return: the metrics in the Prometheus text exposition format (version 0.0.4)
+    """
+    series = sorted(cache.get(SERIES_CACHE_KEY) or set(), key=repr)
+    keys = []
+    for kind, event, unit, attributes in series:
+        key = CacheMetricsStore.series_key((kind, event, unit, attributes))
+        if kind == "counter":
+            keys.append(key)
+        else:
+            keys += [f"{key}_bucket_{i}" for i in range(len(HISTOGRAM_BUCKETS) + 1)]
+            keys += [f"{key}_count", f"{key}_sum"]
+    values = cache.get_many(keys)
+
+    families = dict()
+    for kind, event, unit, attributes in series:
+        name, lines = _export_series(kind, event, unit, attributes, values)
+        families.setdefault((name, kind), []).extend(lines)
+
+    output = []
+    for (name, kind), lines in families.items():
+        output.append(f"# TYPE {name} {kind}")
+        output += lines
+    return "\n".join(output) + "\n"
+
+
+_sinks = []
+if CacheMetricsStore.is_supported():
+    _sinks.append(CacheMetricsStore())
+else:
+    logger.warning(
+        "Metrics are not exported on /metrics, as the default cache does not increment atomically"
+    )
+if _metrics is not None:
+    _sinks.append(SentrySink())
+_buffer = MetricsBuffer(_sinks)
+atexit.register(_buffer.flush)
+
 
 def emit(event: str, **attributes) -> None:
-    if _metrics is None:
-        return
-    cleaned = {k: v for k, v in attributes.items() if v is not None}
-    _metrics.count(event, 1, attributes=cleaned or None)
+    _buffer.count(event, 1, _attributes_key(attributes))
+
+
+def distribution(
+    event: str, value: float, unit: str | None = None, **attributes
+) -> None:
+    """Record a measurement, like a duration, of which the distribution is of interest."""
+    _buffer.distribution(event, value, unit, _attributes_key(attributes))
@@ -1,9 +1,24 @@
+import logging
+import re
+import time
+from collections import Counter, deque
+
+from django.conf import settings
 from django.db import DatabaseError, connection
 from django.http import HttpResponse
 from django.shortcuts import render
 from django.urls import resolve, Resolver404
 
-from tosti.metrics import emit as emit_metric
+from tosti.metrics import (
+    distribution as record_metric,
+    emit as emit_metric,
+    export_prometheus,
+)
+
+logger = logging.getLogger(__name__)
+
+# Reports of the last requests, shown on the request metrics debug page.
+recent_request_reports = deque(maxlen=settings.REQUEST_METRICS_DEBUG_HISTORY)
 
 
 class HealthCheckMiddleware:
@@ -16,10 +31,14 @@ class HealthCheckMiddleware:
     `/live` — liveness: is the process alive? No DB, no cache, no I/O.
     `/ready` — readiness: can the app actually serve traffic? Verifies DB
     connectivity. Fails with 503 if the DB is unreachable.
+    `/metrics` — the metrics of all workers in the Prometheus text format,
+    see `tosti.metrics`. Only meant for internal scrapers: the reverse proxy
+    does not expose it.
     """
 
     LIVE_PATHS = ("/live", "/live/")
     READY_PATHS = ("/ready", "/ready/")
+    METRICS_PATHS = ("/metrics", "/metrics/")
 
     def __init__(self, get_response):
         self.get_response = get_response
@@ -29,6 +48,10 @@ class HealthCheckMiddleware:
             return HttpResponse("ok", content_type="text/plain")
         if request.path in self.READY_PATHS:
             return self._ready()
+        if request.path in self.METRICS_PATHS:
+            return HttpResponse(
+                export_prometheus(), content_type="text/plain; version=0.0.4"
+            )
         return self.get_response(request)
 
     @staticmethod
@@ -42,6 +65,45 @@ class HealthCheckMiddleware:
         return HttpResponse("ok", content_type="text/plain")
 
 
+class QueryRecorder:
+    """Database execute wrapper that counts and times the queries of a request.
+
+    With ``record_shapes``, it also counts how often every SQL statement is
+    run, ignoring its parameters. A statement that is run many times within
+    a single request is usually an N+1 query: a query per object of a list
+    that should have been loaded in bulk.
+    """
+
+    # Lists of placeholders, like in `IN (%s, %s, %s)`, are collapsed so
+    # lists of different lengths have the same shape.
+    PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+
+    def __init__(self, record_shapes=False):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter() if record_shapes else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            if self.shapes is not None:
+                self.shapes[self.PLACEHOLDER_LIST.sub("%s, ...", sql)] += 1
+
+    def repeated_shapes(self, threshold):
+        """Return the SQL statements run at least `threshold` times, most repeated first."""
+        if self.shapes is None:
+            return []
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
 class RequestMetricsMiddleware:
     """Emit an `http_request` metric on every request.
 
@@ -57,20 +119,34 @@ class RequestMetricsMiddleware:
     - ``api_external`` — `/api/*` calls authenticated via an OAuth2 bearer
       token. These are real third-party API consumers.
     - ``api_anon`` — `/api/*` calls without authentication.
+
+    Per view, the duration of the request (`http_request_duration`), the
+    number of queries (`http_request_queries`) and the time spent in the
+    database (`http_request_db_duration`) are recorded as distributions.
+
+    With `REQUEST_METRICS_DETECT_N_PLUS_ONE`, SQL statements that are run
+    at least `REQUEST_METRICS_N_PLUS_ONE_THRESHOLD` times in a request are
+    logged and emitted as `n_plus_one_detected`, and a report of the request
+    is kept for the debug page.
     """
 
-    SKIP_PREFIXES = ("/static/", "/media/", "/live", "/ready")
+    SKIP_PREFIXES = ("/static/", "/media/", "/live", "/ready", "/metrics", "/debug/")
 
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        response = self.get_response(request)
-
         path = request.path
         for prefix in self.SKIP_PREFIXES:
             if path.startswith(prefix):
-                return response
+                return self.get_response(request)
+
+        detect_n_plus_one = settings.REQUEST_METRICS_DETECT_N_PLUS_ONE
+        recorder = QueryRecorder(record_shapes=detect_n_plus_one)
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - start) * 1000
 
         try:
             match = resolve(path)
@@ -80,7 +156,9 @@ class RequestMetricsMiddleware:
 
         status = response.status_code
         status_class = f"{status // 100}xx"
-        authenticated = hasattr(request, "user") and request.user.is_authenticated
+        # Requests authenticated with a client credentials token have no user.
+        user = getattr(request, "user", None)
+        authenticated = user is not None and user.is_authenticated
         kind = self._classify(path, request, authenticated)
 
         emit_metric(
@@ -91,8 +169,50 @@ class RequestMetricsMiddleware:
             kind=kind,
             authenticated=authenticated,
         )
+        record_metric(
+            "http_request_duration",
+            duration_ms,
+            unit="millisecond",
+            view=view,
+            method=request.method,
+        )
+        record_metric("http_request_queries", recorder.count, view=view)
+        record_metric(
+            "http_request_db_duration",
+            recorder.duration * 1000,
+            unit="millisecond",
+            view=view,
+        )
+
+        if detect_n_plus_one:
+            self._report_repeated_queries(request, view, status, duration_ms, recorder)
         return response
 
+    @staticmethod
+    def _report_repeated_queries(request, view, status, duration_ms, recorder):
+        repeated = recorder.repeated_shapes(
+            settings.REQUEST_METRICS_N_PLUS_ONE_THRESHOLD
+        )
+        for shape, count in repeated:
+            logger.warning(
+                "Query run %d times in a single request to %s: %s", count, view, shape
+            )
+            emit_metric("n_plus_one_detected", view=view, method=request.method)
+        recent_request_reports.append(
+            {
+                "path": request.path,
+                "view": view,
+                "method": request.method,
+                "status": status,
+                "duration_ms": round(duration_ms, 2),
+                "queries": recorder.count,
+                "db_duration_ms": round(recorder.duration * 1000, 2),
+                "repeated_queries": [
+                    {"sql": shape, "count": count} for shape, count in repeated
+                ],
+            }
+        )
+
     @staticmethod
     def _classify(path: str, request, authenticated: bool) -> str:
         if not path.startswith("/api/"):
@@ -51,11 +51,17 @@ class RateLimitedAnonymousDCRPermission:
     def has_permission(self, request) -> bool:
         ip = _client_ip(request)
         cache_key = _DCR_RATE_LIMIT_KEY.format(ip)
-        count = cache.get(cache_key, 0)
-        if count >= _DCR_RATE_LIMIT_PER_HOUR:
-            return False
-        cache.set(cache_key, count + 1, timeout=3600)
-        return True
+        # Count atomically, so concurrent registrations cannot slip past the
+        # cap. The window starts at the first registration of the hour.
+        if cache.add(cache_key, 1, timeout=3600):
+            return True
+        try:
+            count = cache.incr(cache_key)
+        except ValueError:
+            # The window expired between the add and the increment.
+            cache.add(cache_key, 1, timeout=3600)
+            return True
+        return count <= _DCR_RATE_LIMIT_PER_HOUR
 
 
 class DCRLandingView(View):
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 import logging
 
 import thaliedje.services
@@ -10,6 +11,45 @@ User = get_user_model()
 logger = logging.getLogger(__name__)
 
 
+def data_minimisation_report(samples=0):
+    """
+    Report which users are affected by data minimisation, without changing any data.
+
+    Only aggregate queries are used, so this is fast on large databases.
+
+    :param samples: the number of affected usernames to include per category
+    :return: dict with per category a dict with the number of affected users ("count") and a list of at most samples
+     affected usernames ("samples")
+    """
+    minimised_orders = orders.services.data_minimisation_orders()
+    minimised_requests = thaliedje.services.data_minimisation_requests()
+    affected_users = {
+        "orders": User.objects.filter(
+            Exists(minimised_orders.filter(user=OuterRef("pk")))
+        ),
+        "thaliedje": User.objects.filter(
+            Exists(minimised_requests.filter(requested_by=OuterRef("pk")))
+        ),
+        # Users are removed after their orders and song requests are anonymised, so those do not protect them.
+        "users": users.services.data_minimisation_users(
+            cleared=(minimised_orders, minimised_requests)
+        ),
+    }
+    return {
+        category: {
+            "count": queryset.count(),
+            "samples": (
+                list(
+                    queryset.order_by("pk").values_list("username", flat=True)[:samples]
+                )
+                if samples > 0
+                else []
+            ),
+        }
+        for category, queryset in affected_users.items()
+    }
+
+
 def data_minimisation(dry_run=False):
     """
     Execute data minimisation according to privacy policy.
@@ -18,17 +58,18 @@ def data_minimisation(dry_run=False):
     :return: dict with counts of records affected per category
     """
     logger.info("Executing data minimisation with dry_run={}".format(dry_run))
-    processed_orders = orders.services.execute_data_minimisation(dry_run)
-    for p in processed_orders:
-        logger.info("Removed order data for {}".format(p))
-    processed_thaliedje = thaliedje.services.execute_data_minimisation(dry_run)
-    for p in processed_thaliedje:
-        logger.info("Removed thaliedje data for {}".format(p))
-    processed_users = users.services.execute_data_minimisation(dry_run)
-    for p in processed_users:
-        logger.info("Removed user account for {}".format(p))
-    return {
-        "orders": len(processed_orders),
-        "thaliedje": len(processed_thaliedje),
-        "users": len(processed_users),
-    }
+    if dry_run:
+        counts = {
+            category: report["count"]
+            for category, report in data_minimisation_report().items()
+        }
+    else:
+        counts = {
+            "orders": orders.services.execute_data_minimisation(),
+            "thaliedje": thaliedje.services.execute_data_minimisation(),
+            "users": users.services.execute_data_minimisation(),
+        }
+    logger.info("Removed order data for {} users".format(counts["orders"]))
+    logger.info("Removed thaliedje data for {} users".format(counts["thaliedje"]))
+    logger.info("Removed {} user accounts".format(counts["users"]))
+    return counts
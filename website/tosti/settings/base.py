@@ -399,6 +399,45 @@ AGE_VERIFICATION_INSTITUTE_VALUE = "ru.nl"
 YIVI_SERVER_URL = os.environ.get("YIVI_SERVER_URL")
 YIVI_SERVER_TOKEN = os.environ.get("YIVI_SERVER_TOKEN")
 
+# Fridge access lists
+# Access lists for fridge controllers, and the user tokens with which users identify at a fridge, are signed with the
+# Ed25519 private key in this PEM file, which can be generated with `openssl genpkey -algorithm ed25519`. Controllers
+# verify both with the public key, which is printed by the `fridge_access_list_public_key` management command. Access
+# lists and user tokens cannot be issued if this is not set.
+FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE = os.environ.get("FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE")
+
+# Marietje client
+# Marietje is called while handling requests, so a slow Marietje server should be given up on quickly. Requests time
+# out after MARIETJE_REQUESTS_TIMEOUT seconds and are retried at most MARIETJE_RETRIES times with a jittered backoff.
+# After MARIETJE_CIRCUIT_BREAKER_THRESHOLD consecutive failures, Marietje is not called for
+# MARIETJE_CIRCUIT_BREAKER_TIMEOUT seconds.
+MARIETJE_REQUESTS_TIMEOUT = 3
+MARIETJE_RETRIES = 2
+MARIETJE_BACKOFF_JITTER = 0.3
+MARIETJE_BACKOFF_MAX = 2
+MARIETJE_CIRCUIT_BREAKER_THRESHOLD = 5
+MARIETJE_CIRCUIT_BREAKER_TIMEOUT = 30
+
+# Request metrics
+# Every request records its duration, number of queries and time spent in the database. If
+# REQUEST_METRICS_DETECT_N_PLUS_ONE is set, requests that run the same SQL statement (ignoring its parameters) at least
+# REQUEST_METRICS_N_PLUS_ONE_THRESHOLD times are reported as N+1 queries as well. The reports of the last
+# REQUEST_METRICS_DEBUG_HISTORY requests are kept in memory and shown on /debug/requests/ when DEBUG is on.
+REQUEST_METRICS_DETECT_N_PLUS_ONE = os.environ.get("REQUEST_METRICS_DETECT_N_PLUS_ONE", "False") == "True"
+REQUEST_METRICS_N_PLUS_ONE_THRESHOLD = 10
+REQUEST_METRICS_DEBUG_HISTORY = 50
+
 # Celery
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+
+# Periodic tasks that are not managed via the admin. The database scheduler of django-celery-beat adds these to the
+# periodic tasks on startup.
+CELERY_BEAT_SCHEDULE = {
+    # Keep the cached playback and queue state of all players warm, so requests never wait for Spotify or Marietje.
+    "thaliedje-refresh-player-states": {
+        "task": "thaliedje.tasks.refresh_player_states",
+        "schedule": 5.0,
+        "options": {"expires": 5},
+    },
+}
@@ -63,9 +63,18 @@ MARIETJE_CACHE_PATH = os.path.join(BASE_DIR, "cache/marietje")  # noqa
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-    }
+    },
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "tosti-local",
+        "TIMEOUT": 60,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
 }
 
 # Celery will execute tasks in the same process instead of sending it to a Redis server.
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
+
+# Report N+1 queries of requests on /debug/requests/.
+REQUEST_METRICS_DETECT_N_PLUS_ONE = True
@@ -130,13 +130,27 @@ if os.environ.get("SENTRY_DSN"):
     )
 
 # CACHES
+# The default cache is shared by all workers and Celery via Redis, which increments counters atomically. The local
+# cache is a small per-process LRU cache in front of it, for values that never change once written (see tosti.cache).
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
-        "LOCATION": "/app/cache",
-    }
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("DJANGO_CACHE_URL", "redis://redis:6379/1"),
+        "KEY_PREFIX": "tosti",
+    },
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "tosti-local",
+        "TIMEOUT": 60,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
 }
 
+# FRIDGE ACCESS LISTS
+FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE = os.environ.get(
+    "FRIDGE_ACCESS_LIST_PRIVATE_KEY_FILE", "/run/secrets/fridge_access_list_private_key"
+)
+
 # SAML SP SETTINGS
 SAML_SESSION_COOKIE_NAME = "saml_session"
 SESSION_COOKIE_SECURE = False
@@ -0,0 +1,54 @@
+from unittest.mock import MagicMock, patch
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+
+from tosti.blacklist import EMPTY_BLACKLIST, clear_blacklist_cache, get_blacklist
+
+User = get_user_model()
+
+
+class BlacklistTests(TestCase):
+    """Tests for the cached per-user blacklist."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="password")
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.app = MagicMock(label="app")
+        self.app.blacklist.return_value = True
+        patcher = patch(
+            "tosti.blacklist.apps.get_app_configs",
+            return_value=[apps.get_app_config("tosti"), self.app],
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_anonymous_user(self):
+        """Anonymous users are on no blacklist."""
+        self.assertEqual(get_blacklist(AnonymousUser()), EMPTY_BLACKLIST)
+        self.app.blacklist.assert_not_called()
+
+    def test_blacklist_from_app_hooks(self):
+        """The blacklist holds the value of the blacklist hook of every app that has one."""
+        self.assertEqual(get_blacklist(self.user), {"app": True})
+        self.app.blacklist.assert_called_once_with(self.user)
+
+    def test_blacklist_loaded_once(self):
+        """The blacklist is cached and kept on the user instance."""
+        blacklist = get_blacklist(self.user)
+        self.assertIs(get_blacklist(self.user), blacklist)
+        self.assertEqual(get_blacklist(User.objects.get(pk=self.user.pk)), blacklist)
+        self.app.blacklist.assert_called_once()
+
+    def test_clear_blacklist_cache(self):
+        """A cleared blacklist is loaded again."""
+        get_blacklist(self.user)
+        self.app.blacklist.return_value = False
+        clear_blacklist_cache(self.user.pk, self.user)
+        self.assertEqual(get_blacklist(self.user), {"app": False})
@@ -0,0 +1,102 @@
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from tosti.cache import get_immutable, get_or_refresh, local_cache, set_immutable
+
+
+class GetOrRefreshTests(TestCase):
+    """Tests for the single-flight cache helper."""
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def _refresh(self, value="fresh"):
+        def refresh():
+            cache.set("key", value)
+            return value
+
+        return MagicMock(side_effect=refresh)
+
+    def test_cached_value_does_not_refresh(self):
+        """A cached value is returned without refreshing."""
+        cache.set("key", "cached")
+        refresh = self._refresh()
+        self.assertEqual(get_or_refresh("key", refresh), "cached")
+        refresh.assert_not_called()
+
+    def test_missing_value_refreshes_once(self):
+        """A missing value is refreshed once and then served from the cache."""
+        refresh = self._refresh()
+        self.assertEqual(get_or_refresh("key", refresh), "fresh")
+        self.assertEqual(get_or_refresh("key", refresh), "fresh")
+        refresh.assert_called_once()
+
+    def test_lock_released_after_failed_refresh(self):
+        """A refresh that raises does not keep the lock."""
+        failing_refresh = MagicMock(side_effect=RuntimeError)
+        with self.assertRaises(RuntimeError):
+            get_or_refresh("key", failing_refresh)
+        refresh = self._refresh()
+        self.assertEqual(get_or_refresh("key", refresh), "fresh")
+
+    def test_expired_lock_of_other_caller_not_released(self):
+        """A refresh that outlasts its lock does not release the lock of the caller that acquired it next."""
+
+        def slow_refresh():
+            # The lock expired during the refresh and another caller acquired it.
+            cache.set("key_refresh_lock", "other caller")
+            cache.set("key", "fresh")
+            return "fresh"
+
+        self.assertEqual(get_or_refresh("key", slow_refresh), "fresh")
+        self.assertEqual(cache.get("key_refresh_lock"), "other caller")
+
+    def test_waits_for_concurrent_refresh(self):
+        """While another caller refreshes, the refreshed value is awaited."""
+        cache.add("key_refresh_lock", True)
+        refresh = self._refresh()
+
+        def other_caller_refreshes(_):
+            cache.set("key", "from other caller")
+
+        with patch("tosti.cache.time.sleep", side_effect=other_caller_refreshes):
+            self.assertEqual(get_or_refresh("key", refresh), "from other caller")
+        refresh.assert_not_called()
+
+    def test_wait_for_concurrent_refresh_times_out(self):
+        """Waiting for another caller gives up without refreshing."""
+        cache.add("key_refresh_lock", True)
+        refresh = self._refresh()
+        self.assertIsNone(
+            get_or_refresh("key", refresh, wait_timeout=0.1, poll_interval=0.01)
+        )
+        refresh.assert_not_called()
+
+
+class ImmutableCacheTests(TestCase):
+    """Tests for the local cache tier for values that never change."""
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.addCleanup(local_cache.clear)
+
+    def test_value_kept_locally(self):
+        """A value read from the shared cache is kept in the local cache."""
+        cache.set("key", "value")
+        self.assertEqual(get_immutable("key"), "value")
+        cache.delete("key")
+        self.assertEqual(get_immutable("key"), "value")
+
+    def test_set_in_both_caches(self):
+        """A value is written to both the shared and the local cache."""
+        set_immutable("key", "value")
+        self.assertEqual(cache.get("key"), "value")
+        self.assertEqual(local_cache.get("key"), "value")
+
+    def test_missing_value(self):
+        """A missing value is not cached locally."""
+        self.assertIsNone(get_immutable("key"))
+        cache.set("key", "value")
+        self.assertEqual(get_immutable("key"), "value")
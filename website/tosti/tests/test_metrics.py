@@ -0,0 +1,191 @@
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from tosti.metrics import (
+    CacheMetricsStore,
+    DistributionSummary,
+    MetricsBuffer,
+    SentrySink,
+    export_prometheus,
+)
+
+
+class MetricsBufferTests(SimpleTestCase):
+    """Tests for the buffer that batches metrics."""
+
+    def setUp(self):
+        self.sink = MagicMock()
+        self.buffer = MetricsBuffer([self.sink], flush_interval=3600, max_buffered=3)
+        self.addCleanup(self.buffer._stopped.set)
+
+    def test_counters_aggregated(self):
+        """Counters with the same event and attributes are summed until flushed."""
+        for _ in range(3):
+            self.buffer.count("order_placed", 1, (("venue", "Noordhes"),))
+        self.buffer.count("order_placed", 1, ())
+        self.sink.write.assert_not_called()
+
+        self.buffer.flush()
+        self.sink.write.assert_called_once_with(
+            {
+                ("order_placed", (("venue", "Noordhes"),)): 3,
+                ("order_placed", ()): 1,
+            },
+            {},
+        )
+        self.sink.reset_mock()
+        self.buffer.flush()
+        self.sink.write.assert_not_called()
+
+    def test_distributions_summarised(self):
+        """Measurements of a distribution are summarised until flushed."""
+        for value in (10, 20, 3000):
+            self.buffer.distribution("http_request_duration", value, "millisecond", ())
+        self.buffer.flush()
+        self.sink.write.assert_called_once_with(
+            {},
+            {
+                ("http_request_duration", "millisecond", ()): DistributionSummary(
+                    [10, 20, 3000]
+                )
+            },
+        )
+        summary = self.sink.write.call_args.args[1][
+            ("http_request_duration", "millisecond", ())
+        ]
+        self.assertEqual(
+            (summary.count, summary.sum, summary.min, summary.max),
+            (3, 3030, 10, 3000),
+        )
+        self.assertEqual(summary.buckets, {3: 1, 4: 1, 11: 1})
+
+    def test_full_buffer_drops_metrics(self):
+        """When the buffer is full, metrics of new series are dropped but existing series still count."""
+        self.buffer.count("a", 1, ())
+        self.buffer.distribution("b", 1, None, ())
+        self.buffer.count("c", 1, ())
+        self.buffer.distribution("b", 2, None, ())
+        self.buffer.count("a", 1, ())
+        self.buffer.count("d", 1, ())
+        self.buffer.distribution("e", 1, None, ())
+        self.assertEqual(self.buffer.dropped, 2)
+
+        self.buffer.flush()
+        self.sink.write.assert_called_once_with(
+            {("a", ()): 2, ("c", ()): 1}, {("b", None, ()): DistributionSummary([1, 2])}
+        )
+        self.assertEqual(self.buffer.dropped, 0)
+
+    def test_reset_after_fork(self):
+        """A forked worker starts with an empty buffer."""
+        self.buffer.count("a", 1, ())
+        self.buffer.count("b", 1, ())
+        self.buffer.count("c", 1, ())
+        self.buffer.count("d", 1, ())
+        self.buffer._reset()
+        self.assertEqual(self.buffer.dropped, 0)
+        self.buffer.flush()
+        self.sink.write.assert_not_called()
+
+    def test_sentry_sink(self):
+        """Distributions are sent to Sentry as their summary instead of every measurement."""
+        with patch("tosti.metrics._metrics") as metrics:
+            SentrySink().write(
+                {("order_placed", ()): 2},
+                {("duration", "millisecond", ()): DistributionSummary([5, 15])},
+            )
+        metrics.count.assert_any_call("order_placed", 2, attributes=None)
+        metrics.count.assert_any_call("duration_count", 2, attributes=None)
+        metrics.count.assert_any_call(
+            "duration_sum", 20, unit="millisecond", attributes=None
+        )
+        metrics.gauge.assert_any_call(
+            "duration_min", 5, unit="millisecond", attributes=None
+        )
+        metrics.gauge.assert_any_call(
+            "duration_max", 15, unit="millisecond", attributes=None
+        )
+        metrics.distribution.assert_not_called()
+
+    def test_failing_sink(self):
+        """A failing sink does not raise when flushing, nor stops other sinks."""
+        other_sink = MagicMock()
+        self.buffer.sinks.append(other_sink)
+        self.sink.write.side_effect = RuntimeError
+        self.buffer.count("a", 1, ())
+        self.buffer.flush()
+        other_sink.write.assert_called_once()
+
+
+class PrometheusExportTests(TestCase):
+    """Tests for the metrics aggregated in the cache and their Prometheus export."""
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        cache.clear()
+
+    def test_metrics_aggregated_across_writers(self):
+        """Metrics written by several workers are added up."""
+        for _ in range(2):
+            CacheMetricsStore().write(
+                {("order_placed", (("venue", 'Noord"hes'),)): 2},
+                {
+                    ("http_request_duration", "millisecond", ()): DistributionSummary(
+                        [4, 30, 20000]
+                    )
+                },
+            )
+
+        lines = export_prometheus().splitlines()
+        self.assertIn("# TYPE tosti_order_placed_total counter", lines)
+        self.assertIn('tosti_order_placed_total{venue="Noord\\"hes"} 4', lines)
+        self.assertIn(
+            "# TYPE tosti_http_request_duration_milliseconds histogram", lines
+        )
+        self.assertIn(
+            'tosti_http_request_duration_milliseconds_bucket{le="5.0"} 2', lines
+        )
+        self.assertIn(
+            'tosti_http_request_duration_milliseconds_bucket{le="50.0"} 4', lines
+        )
+        self.assertIn(
+            'tosti_http_request_duration_milliseconds_bucket{le="+Inf"} 6', lines
+        )
+        self.assertIn("tosti_http_request_duration_milliseconds_sum 40068.0", lines)
+        self.assertIn("tosti_http_request_duration_milliseconds_count 6", lines)
+
+    def test_unregistered_series_retried(self):
+        """Series that cannot be registered while another worker registers series are registered on the next flush."""
+        store = CacheMetricsStore()
+        cache.add("metrics_series_lock", True, 10)
+        store.write({("order_placed", ()): 1}, {})
+        self.assertNotIn("tosti_order_placed_total 1", export_prometheus())
+
+        cache.delete("metrics_series_lock")
+        store.write({("fridge_opened", ()): 1}, {})
+        lines = export_prometheus().splitlines()
+        self.assertIn("tosti_order_placed_total 1", lines)
+        self.assertIn("tosti_fridge_opened_total 1", lines)
+
+    def test_atomic_incr_required(self):
+        """The store is only used with a cache that increments atomically."""
+        self.assertTrue(CacheMetricsStore.is_supported())
+        with self.settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": "/tmp/tosti-metrics-test",
+                }
+            }
+        ):
+            self.assertFalse(CacheMetricsStore.is_supported())
+
+    def test_metrics_endpoint(self):
+        """The metrics are served on /metrics, regardless of the host."""
+        CacheMetricsStore().write({("fridge_opened", ()): 1}, {})
+        response = self.client.get("/metrics", HTTP_HOST="internal")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4")
+        self.assertIn(b"tosti_fridge_opened_total 1", response.content)
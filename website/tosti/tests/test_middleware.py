@@ -0,0 +1,96 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from tosti.middleware import (
+    QueryRecorder,
+    RequestMetricsMiddleware,
+    recent_request_reports,
+)
+
+User = get_user_model()
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+    """Tests for the request metrics and N+1 query detection."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            User.objects.create_user(username=f"user-{i}")
+
+    def setUp(self):
+        self.addCleanup(recent_request_reports.clear)
+
+    def _view(self, request):
+        for user in User.objects.all():
+            User.objects.filter(pk=user.pk).exists()
+        return HttpResponse()
+
+    def _request(self):
+        middleware = RequestMetricsMiddleware(self._view)
+        with (
+            patch("tosti.middleware.emit_metric") as emit_metric,
+            patch("tosti.middleware.record_metric") as record_metric,
+        ):
+            middleware(RequestFactory().get(reverse("privacy")))
+        return emit_metric, record_metric
+
+    def test_placeholder_lists_collapsed(self):
+        """Statements that only differ in the length of a list of parameters have the same shape."""
+        recorder = QueryRecorder(record_shapes=True)
+
+        def execute(sql, params, many, context):
+            return None
+
+        recorder(execute, "SELECT 1 WHERE id IN (%s, %s)", [1, 2], False, {})
+        recorder(execute, "SELECT 1 WHERE id IN (%s,%s, %s)", [1, 2, 3], False, {})
+        self.assertEqual(recorder.count, 2)
+        self.assertEqual(
+            recorder.repeated_shapes(2), [("SELECT 1 WHERE id IN (%s, ...)", 2)]
+        )
+
+    @override_settings(REQUEST_METRICS_DETECT_N_PLUS_ONE=False)
+    def test_queries_recorded(self):
+        """The duration, number of queries and database time are recorded per view."""
+        emit_metric, record_metric = self._request()
+        self.assertEqual(emit_metric.call_args.args, ("http_request",))
+        recorded = {call.args[0]: call for call in record_metric.call_args_list}
+        self.assertEqual(
+            set(recorded),
+            {
+                "http_request_duration",
+                "http_request_queries",
+                "http_request_db_duration",
+            },
+        )
+        self.assertEqual(recorded["http_request_queries"].args[1], 4)
+        self.assertEqual(recorded["http_request_queries"].kwargs["view"], "privacy")
+        self.assertEqual(len(recent_request_reports), 0)
+
+    @override_settings(
+        REQUEST_METRICS_DETECT_N_PLUS_ONE=True, REQUEST_METRICS_N_PLUS_ONE_THRESHOLD=3
+    )
+    def test_n_plus_one_detected(self):
+        """Statements that are repeated within a request are reported."""
+        emit_metric, _ = self._request()
+        emit_metric.assert_any_call("n_plus_one_detected", view="privacy", method="GET")
+        report = recent_request_reports[-1]
+        self.assertEqual(report["view"], "privacy")
+        self.assertEqual(report["queries"], 4)
+        self.assertEqual(len(report["repeated_queries"]), 1)
+        self.assertEqual(report["repeated_queries"][0]["count"], 3)
+
+    @override_settings(REQUEST_METRICS_DETECT_N_PLUS_ONE=True)
+    def test_debug_view_only_with_debug(self):
+        """The debug page is only available when DEBUG is on."""
+        response = self.client.get(reverse("request-metrics-debug"))
+        self.assertEqual(response.status_code, 404)
+        with override_settings(DEBUG=True):
+            self._request()
+            response = self.client.get(reverse("request-metrics-debug"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["requests"][0]["view"], "privacy")
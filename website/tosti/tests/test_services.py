@@ -0,0 +1,87 @@
+import logging
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from orders.models import Order, OrderVenue, Product, Shift
+from thaliedje.models import SpotifyPlayer, SpotifyQueueItem
+from tosti.services import data_minimisation, data_minimisation_report
+from venues.models import Venue
+
+User = get_user_model()
+logging.disable()
+
+
+class DataMinimisationReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        long_ago = timezone.now() - timedelta(days=400)
+        cls.inactive_users = [
+            User.objects.create_user(username=f"inactive_{i}", last_login=long_ago)
+            for i in range(3)
+        ]
+        player = SpotifyPlayer.objects.create(
+            slug="player", client_id="ci", client_secret="cs"
+        )
+        for user in cls.inactive_users[:2] + cls.inactive_users[:1]:
+            item = SpotifyQueueItem.objects.create(player=player, requested_by=user)
+            SpotifyQueueItem.objects.filter(pk=item.pk).update(added=long_ago)
+
+    def test_report_counts_and_samples(self):
+        """The report counts affected users per category and includes samples."""
+        with self.assertNumQueries(6):
+            report = data_minimisation_report(samples=2)
+        self.assertEqual(report["orders"], {"count": 0, "samples": []})
+        self.assertEqual(
+            report["thaliedje"],
+            {"count": 2, "samples": ["inactive_0", "inactive_1"]},
+        )
+        self.assertEqual(report["users"]["count"], 3)
+        self.assertEqual(len(report["users"]["samples"]), 2)
+
+    def test_dry_run_does_not_change_data(self):
+        """A dry run reports the same counts as a real run without removing data."""
+        self.assertEqual(
+            data_minimisation(dry_run=True), {"orders": 0, "thaliedje": 2, "users": 3}
+        )
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(
+            data_minimisation(dry_run=False), {"orders": 0, "thaliedje": 2, "users": 3}
+        )
+        self.assertEqual(User.objects.count(), 0)
+
+    def test_command_dry_run(self):
+        """The management command prints the report in a dry run."""
+        out = StringIO()
+        call_command("dataminimisation", "--dry-run", "--samples", "1", stdout=out)
+        self.assertIn("thaliedje: 2 users affected\n  inactive_0\n", out.getvalue())
+        self.assertEqual(User.objects.count(), 3)
+
+    def test_dry_run_with_old_paid_order(self):
+        """Users whose only protected references are old paid orders are counted, as those are anonymised first."""
+        venue = OrderVenue.objects.create(venue=Venue.objects.create(name="Venue"))
+        shift = Shift.objects.create(
+            venue=venue, start=timezone.now(), end=timezone.now() + timedelta(hours=4)
+        )
+        product = Product.objects.create(name="Tosti", current_price=1.0)
+        for user, paid in (
+            (self.inactive_users[0], True),
+            (self.inactive_users[1], False),
+        ):
+            order = Order.objects.create(
+                shift=shift, product=product, user=user, paid=paid
+            )
+            Order.objects.filter(pk=order.pk).update(
+                created=timezone.now() - timedelta(days=60)
+            )
+
+        dry_run_counts = data_minimisation(dry_run=True)
+        self.assertEqual(dry_run_counts, {"orders": 1, "thaliedje": 2, "users": 2})
+        self.assertEqual(data_minimisation(dry_run=False), dry_run_counts)
+        self.assertEqual(
+            list(User.objects.values_list("username", flat=True)), ["inactive_1"]
+        )
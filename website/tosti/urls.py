@@ -27,6 +27,7 @@ from .views import (
     AfterLoginRedirectView,
     LogoutView,
     StatisticsView,
+    RequestMetricsDebugView,
 )
 
 # Compose the /oauth/ subpatterns from the library's parts, excluding
@@ -104,6 +105,11 @@ urlpatterns = [
     path("documentation/", DocumentationView.as_view(), name="documentation"),
     path("explainers/", ExplainerView.as_view(), name="explainers"),
     path("statistics/", StatisticsView.as_view(), name="statistics"),
+    path(
+        "debug/requests/",
+        RequestMetricsDebugView.as_view(),
+        name="request-metrics-debug",
+    ),
     path(
         "users/",
         include(("users.urls", "users"), namespace="users"),
@@ -1,9 +1,15 @@
 from django.apps import apps
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator
-from django.http import HttpResponseNotFound, HttpResponseRedirect
+from django.http import (
+    Http404,
+    HttpResponseNotFound,
+    HttpResponseRedirect,
+    JsonResponse,
+)
 from django.shortcuts import render, redirect
 from django.template.loader import render_to_string
 from django.urls import reverse
@@ -21,6 +27,7 @@ from oauth2_provider.models import (
 from oauth2_provider.scopes import get_scopes_backend
 
 from tosti.forms import OAuthCredentialsForm
+from tosti.middleware import recent_request_reports
 
 
 def _list_authorised_apps_for_user(user):
@@ -569,6 +576,21 @@ class OAuthCredentialsRequestView(TemplateView):
             return HttpResponseNotFound()
 
 
+class RequestMetricsDebugView(View):
+    """Show the query reports of the last requests, only available when DEBUG is on."""
+
+    def get(self, request, **kwargs):
+        """GET the reports of the last requests, newest first."""
+        if not settings.DEBUG:
+            raise Http404()
+        return JsonResponse(
+            {
+                "detect_n_plus_one": settings.REQUEST_METRICS_DETECT_N_PLUS_ONE,
+                "requests": list(reversed(recent_request_reports)),
+            }
+        )
+
+
 def handler403(request, exception):
     """
     Handle a 403 (permission denied) exception.
@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TransactionHistoryPagination(CursorPagination):
+    """
+    Keyset pagination over an account's transaction history.
+
+    Pages are addressed by an opaque cursor encoding the position in the (timestamp, id) ordering instead of an
+    offset, so every page is a single range scan on the (account, timestamp, id) index regardless of its depth.
+    """
+
+    ordering = ("-timestamp", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 100
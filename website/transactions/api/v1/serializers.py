@@ -40,3 +40,24 @@ class TransactionSerializer(WritableModelSerializer):
             "timestamp",
             "processor",
         )
+
+
+class TransactionHistorySerializer(serializers.ModelSerializer):
+    """Transaction serializer for listing the history of a single account."""
+
+    balance_after = serializers.DecimalField(
+        source="_balance_after", max_digits=10, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        """Meta class."""
+
+        model = models.Transaction
+        fields = [
+            "id",
+            "amount",
+            "timestamp",
+            "description",
+            "balance_after",
+        ]
+        read_only_fields = fields
@@ -1,9 +1,16 @@
 from django.urls import path
-from transactions.api.v1.views import AccountRetrieveAPIView, TransactionCreateAPIView
+from transactions.api.v1.views import (
+    AccountRetrieveAPIView,
+    TransactionCreateAPIView,
+    TransactionHistoryListAPIView,
+)
 
 urlpatterns = [
     path("", TransactionCreateAPIView.as_view(), name="transaction_create"),
     path(
         "retrieve-account/", AccountRetrieveAPIView.as_view(), name="account_retrieve"
     ),
+    path(
+        "history/", TransactionHistoryListAPIView.as_view(), name="transaction_history"
+    ),
 ]
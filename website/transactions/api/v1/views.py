@@ -1,13 +1,18 @@
 from oauth2_provider.contrib.rest_framework import IsAuthenticatedOrTokenHasScope
 from rest_framework import status
-from rest_framework.generics import CreateAPIView
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import CreateAPIView, ListAPIView
 from rest_framework.response import Response
 
 from tosti.api.openapi import CustomAutoSchema
+from transactions.api.v1.pagination import TransactionHistoryPagination
 from transactions.api.v1.serializers import AccountSerializer
-from transactions.models import Account
+from transactions.models import Account, Transaction
 from users.services import verify_identification_token
-from transactions.api.v1.serializers import TransactionSerializer
+from transactions.api.v1.serializers import (
+    TransactionSerializer,
+    TransactionHistorySerializer,
+)
 
 
 class AccountRetrieveAPIView(CreateAPIView):
@@ -73,3 +78,28 @@ class TransactionCreateAPIView(CreateAPIView):
             return Response(status=status.HTTP_401_UNAUTHORIZED)
 
         return super(TransactionCreateAPIView, self).create(request, *args, **kwargs)
+
+
+class TransactionHistoryListAPIView(ListAPIView):
+    """
+    Transaction History List API View.
+
+    Permissions required: None
+
+    Use this endpoint to page through the transaction history of your own account, newest first. Follow the `next`
+    and `previous` links of a response to get the adjacent pages.
+    """
+
+    serializer_class = TransactionHistorySerializer
+    permission_classes = [IsAuthenticatedOrTokenHasScope]
+    required_scopes = ["read"]
+    pagination_class = TransactionHistoryPagination
+    queryset = Transaction.objects.all()
+
+    def get_queryset(self):
+        """Get the transactions of the account of the request user."""
+        try:
+            account = self.request.user.account
+        except Account.DoesNotExist:
+            raise NotFound("You do not have an account.")
+        return self.queryset.filter(account=account)
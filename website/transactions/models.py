@@ -175,3 +175,11 @@ class Transaction(models.Model):
         verbose_name_plural = "transactions"
         ordering = ["timestamp"]
         get_latest_by = "timestamp"
+        indexes = [
+            # Supports walking an account's history in (timestamp, id) order, used for the balance lookup and the
+            # cursor-paginated history API.
+            models.Index(
+                fields=["account", "timestamp", "id"],
+                name="transaction_account_history",
+            ),
+        ]
@@ -0,0 +1,66 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from transactions.models import Account
+
+User = get_user_model()
+logging.disable()
+
+
+class TransactionHistoryAPITests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="password")
+        cls.account = Account.objects.create(user=cls.user)
+        cls.other_user = User.objects.create_user(username="other", password="password")
+        cls.other_account = Account.objects.create(user=cls.other_user)
+        for i in range(5):
+            cls.account.transactions.create(
+                amount=i + 1, description=f"Transaction {i}", processor=cls.user
+            )
+        cls.other_account.transactions.create(
+            amount=100, description="Other transaction", processor=cls.other_user
+        )
+
+    def test_history_not_logged_in(self):
+        """Listing the transaction history should fail if not logged in."""
+        response = self.client.get(reverse("v1:transaction_history"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_history_without_account(self):
+        """Listing the transaction history without an account returns a 404."""
+        User.objects.create_user(username="noaccount", password="password")
+        self.client.login(username="noaccount", password="password")
+        response = self.client.get(reverse("v1:transaction_history"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_history_paginated_by_cursor(self):
+        """The history is returned newest first and can be walked with cursors."""
+        self.client.login(username="test", password="password")
+        response = self.client.get(reverse("v1:transaction_history"), {"page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data["previous"])
+
+        descriptions = []
+        while True:
+            descriptions.extend(
+                transaction["description"] for transaction in response.data["results"]
+            )
+            if response.data["next"] is None:
+                break
+            self.assertLessEqual(len(response.data["results"]), 2)
+            response = self.client.get(response.data["next"])
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(descriptions, [f"Transaction {i}" for i in reversed(range(5))])
+
+    def test_history_balance_after(self):
+        """Every transaction in the history includes the balance after it."""
+        self.client.login(username="test", password="password")
+        response = self.client.get(reverse("v1:transaction_history"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["balance_after"], "15.00")
+        self.assertEqual(len(response.data["results"]), 5)
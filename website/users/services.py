@@ -1,14 +1,21 @@
+import logging
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
 from django.core.signing import TimestampSigner, SignatureExpired, BadSignature
-from django.db.models import Count, ProtectedError
+from django.db import models, transaction
+from django.db.models import Count, Exists, OuterRef, ProtectedError
 from django.utils import timezone
 
 from associations.models import Association
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
+# The maximum number of users that is deleted in a single transaction.
+DATA_MINIMISATION_CHUNK_SIZE = 500
+
 
 def get_identification_token(user):
     """Get the identification token for a user."""
@@ -55,27 +62,111 @@ def update_staff_status(user):
         user.save()
 
 
-def execute_data_minimisation(dry_run=False):
+def _protected_references(model, path="", seen=frozenset()):
     """
-    Remove accounts for users that have not been used for longer than 365 days.
+    Get the references that prevent deleting instances of a model.
 
-    :param dry_run: does not really remove data if True
-    :return: list of users from who data is removed
+    Besides references that directly protect the model, this also includes references that protect objects that are
+    deleted together with the model through a cascade.
+
+    :param model: the model
+    :param path: the lookup from the model to the object that is deleted, used when recursing through cascades
+    :param seen: the models already visited, to stop at cycles
+    :return: a list of (model, lookup) tuples, where lookup filters the protecting model on the primary key of the
+     deleted object
     """
-    delete_before = timezone.now() - timedelta(days=365)
-    users = User.objects.filter(last_login__lte=delete_before)
+    references = []
+    for relation in model._meta.related_objects:
+        if relation.many_to_many:
+            continue
+        lookup = f"{relation.field.name}{path}"
+        if relation.on_delete in (models.PROTECT, models.RESTRICT):
+            references.append((relation.related_model, lookup))
+        elif (
+            relation.on_delete == models.CASCADE and relation.related_model not in seen
+        ):
+            references.extend(
+                _protected_references(
+                    relation.related_model,
+                    f"__{lookup}",
+                    seen | {model, relation.related_model},
+                )
+            )
+    return references
+
+
+def _delete_users(pks):
+    """
+    Delete users in a single transaction, falling back to deleting them one by one if any of them is protected.
 
-    processed = []
-    for user in users:
-        if not user.is_superuser:
+    :param pks: the primary keys of the users
+    :return: the number of users deleted
+    """
+    try:
+        with transaction.atomic():
+            User.objects.filter(pk__in=pks).delete()
+        return len(pks)
+    except ProtectedError:
+        deleted = 0
+        for pk in pks:
             try:
-                if not dry_run:
-                    user.delete()
-                processed.append(user)
+                with transaction.atomic():
+                    User.objects.filter(pk=pk).delete()
+                deleted += 1
             except ProtectedError:
                 # Skip users with protected references
                 continue
-    return processed
+        return deleted
+
+
+def data_minimisation_users(cleared=()):
+    """
+    Get the users that have not been used for longer than 365 days and can be removed.
+
+    :param cleared: querysets of objects of which the reference to their user is cleared before the users are removed,
+     these do not prevent removing a user
+    :return: a queryset of the users
+    """
+    delete_before = timezone.now() - timedelta(days=365)
+    users = User.objects.filter(last_login__lte=delete_before, is_superuser=False)
+    for related_model, lookup in _protected_references(User):
+        references = related_model._base_manager.filter(**{lookup: OuterRef("pk")})
+        for queryset in cleared:
+            if queryset.model is related_model:
+                references = references.exclude(pk__in=queryset.values("pk"))
+        users = users.filter(~Exists(references))
+    return users
+
+
+def execute_data_minimisation(dry_run=False):
+    """
+    Remove accounts for users that have not been used for longer than 365 days.
+
+    Users with protected references (for example an account or orders) are filtered out with a single query. The
+    remaining users are deleted in chunks of DATA_MINIMISATION_CHUNK_SIZE.
+
+    :param dry_run: does not really remove data if True
+    :return: the number of users removed
+    """
+    users = data_minimisation_users()
+
+    if dry_run:
+        return users.count()
+
+    total = users.count()
+    deleted = 0
+    last_pk = None
+    while True:
+        chunk = users.order_by("pk")
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        chunk = list(chunk.values_list("pk", flat=True)[:DATA_MINIMISATION_CHUNK_SIZE])
+        if not chunk:
+            break
+        last_pk = chunk[-1]
+        deleted += _delete_users(chunk)
+        logger.info("Removed {} of {} user accounts".format(deleted, total))
+    return deleted
 
 
 def generate_users_per_association():
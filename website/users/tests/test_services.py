@@ -0,0 +1,67 @@
+import logging
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from transactions.models import Account
+from users import services
+
+User = get_user_model()
+logging.disable()
+
+
+class DataMinimisationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        long_ago = timezone.now() - timedelta(days=400)
+        cls.inactive_users = [
+            User.objects.create_user(username=f"inactive_{i}", last_login=long_ago)
+            for i in range(5)
+        ]
+        cls.with_account = User.objects.create_user(
+            username="with_account", last_login=long_ago
+        )
+        Account.objects.create(user=cls.with_account)
+        cls.superuser = User.objects.create_superuser(
+            username="superuser", last_login=long_ago
+        )
+        cls.active_user = User.objects.create_user(
+            username="active", last_login=timezone.now()
+        )
+        cls.never_logged_in = User.objects.create_user(username="never")
+
+    def _remaining_usernames(self):
+        return set(User.objects.values_list("username", flat=True))
+
+    def test_execute_data_minimisation_dry_run(self):
+        """A dry run counts the users that would be removed without removing them."""
+        self.assertEqual(services.execute_data_minimisation(dry_run=True), 5)
+        self.assertEqual(User.objects.count(), 9)
+
+    def test_execute_data_minimisation(self):
+        """Inactive users are removed in chunks, except protected users and superusers."""
+        with patch.object(services, "DATA_MINIMISATION_CHUNK_SIZE", 2):
+            self.assertEqual(services.execute_data_minimisation(), 5)
+        self.assertEqual(
+            self._remaining_usernames(),
+            {"with_account", "superuser", "active", "never"},
+        )
+
+    def test_execute_data_minimisation_protected_in_chunk(self):
+        """A protected user that is not filtered out in advance does not stop the others from being removed."""
+        with patch.object(services, "_protected_references", return_value=[]):
+            self.assertEqual(services.execute_data_minimisation(), 5)
+        self.assertIn("with_account", self._remaining_usernames())
+
+    def test_protected_references_include_cascades(self):
+        """References that protect objects deleted in cascade with a user are found."""
+        references = {
+            (model._meta.label, lookup)
+            for model, lookup in services._protected_references(User)
+        }
+        self.assertIn(("transactions.Account", "user"), references)
+        self.assertIn(("orders.Order", "user"), references)
+        self.assertIn(("fridges.Fridge", "oauth_client__user"), references)